@@ -1,42 +1,125 @@
 """Flask API for StyleSense.AI"""
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, abort, stream_with_context
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, send_file
+from werkzeug.security import safe_join
+from werkzeug.http import parse_options_header
+from werkzeug.wsgi import get_input_stream
+from werkzeug.exceptions import RequestEntityTooLarge
 from pathlib import Path
+from io import BytesIO
 import logging
+import mimetypes
+import shutil
 import sys
+import threading
 import os
+import json
+import time
+import uuid
 from datetime import datetime
+import cv2
+import numpy as np
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from backend.config import Config
 from backend.database import db
+from backend.storage import StorageManager, delete_blob, hash_bytes, content_address
+from backend.result_cache import ResultCache, cache_key
+from backend.jobs import JobQueue, TERMINAL_STATUSES
+from backend.bulk_upload import BulkUploadReceiver, process_parts
+from backend.image_response import (
+    negotiate_format, parse_output_options, encode_image, data_url, decode_data_url
+)
+from backend.catalogue import ProductCatalogue
+from backend.sessions import SessionStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class InMemoryUploadRequest(Request):
+    """Request that keeps multipart uploads in memory instead of spooling them to disk"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Uploads are bounded by MAX_CONTENT_LENGTH, so a BytesIO is safe and
+        # lets the endpoints decode straight from its buffer
+        return BytesIO()
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.config.from_object(Config)
 Config.init_app()
 
 # Enable CORS
-CORS(app, origins=Config.CORS_ORIGINS)
+CORS(app, origins=Config.CORS_ORIGINS,
+     expose_headers=['X-Result-Method', 'X-Result-Cached', 'X-Result-Tryon-Session-Id',
+                     'X-Result-Region', 'X-Result-Update-Ms', 'X-Result-Render-Id',
+                     'X-Result-Preview-Ms', 'X-Result-Render-Ms', 'Content-Location'])
 
 # Import ML modules (with fallback if not available)
 try:
-    from ml_models.body_detection import detect_body_shape, detect_body_pose, extract_body_measurements, remove_background
+    from ml_models.body_detection import (
+        detect_body_shape, detect_body_pose, analyze_pose, cached_pose,
+        configure_pose, remove_background, background_removal_backend
+    )
     from ml_models.recommendation_engine import generate_recommendations
-    from ml_models.ar_tryon import apply_virtual_tryon
+    from ml_models.ar_tryon import apply_virtual_tryon, apply_layered_tryon
     from ml_models.segmentation import segment_clothing
+    from ml_models.mask_codec import encode_mask
+    from ml_models.image_io import load_image
+    from ml_models.garment_assets import GarmentAssetStore
+    from ml_models.live_tryon import LiveTryOnSession, PoseTracker
+    from ml_models.tryon_session import TryOnSession
+    from ml_models.person_analysis import PersonAnalysis
+    from ml_models.progressive_tryon import ProgressiveTryOn
+    from ml_models.preprocessing import configure_working_resolution
+    configure_working_resolution(
+        pose=Config.POSE_MAX_SIDE,
+        grabcut=Config.GRABCUT_MAX_SIDE,
+        tryon=Config.TRYON_MAX_SIDE,
+        live=Config.LIVE_TRYON_MAX_SIDE,
+        preview=Config.TRYON_PREVIEW_MAX_SIDE
+    )
+    configure_pose(model_complexity=Config.POSE_MODEL_COMPLEXITY, cache_size=Config.POSE_CACHE_SIZE)
+    from ml_models.grabcut import configure_grabcut
+    configure_grabcut(
+        max_iterations=Config.GRABCUT_MAX_ITERATIONS,
+        min_iterations=Config.GRABCUT_MIN_ITERATIONS,
+        tolerance=Config.GRABCUT_TOLERANCE,
+        refine_band=Config.GRABCUT_REFINE_BAND
+    )
+    from ml_models.deeplab import configure_batching, configure_profile, configure_runtime
+    configure_batching(
+        max_batch_size=Config.DEEPLAB_MAX_BATCH,
+        max_wait_ms=Config.DEEPLAB_MAX_WAIT_MS
+    )
+    configure_runtime(
+        runtime=Config.DEEPLAB_RUNTIME,
+        quantize=Config.DEEPLAB_QUANTIZE,
+        model_dir=Config.MODEL_CACHE_DIR / 'onnx',
+        threads=Config.DEEPLAB_ONNX_THREADS
+    )
+    configure_profile(Config.SEGMENTATION_PROFILE)
     ML_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"ML modules not available: {e}. Using fallback implementations.")
     ML_AVAILABLE = False
 
+# WebSocket support for live try-on (optional)
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+    sock = Sock(app)
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    logger.warning("flask-sock not available, live try-on streaming disabled")
+    sock = None
+    WEBSOCKETS_AVAILABLE = False
+
 # Import user profile management
 try:
     from backend.models.user_profile import UserProfileManager
@@ -60,6 +143,267 @@ def validate_image(file):
     
     return True, "Valid"
 
+def upload_buffer(file):
+    """Bytes of an uploaded file; a zero-copy view when the upload is in memory"""
+    stream = file.stream
+    if hasattr(stream, 'getbuffer'):
+        return stream.getbuffer()
+    stream.seek(0)
+    return stream.read()
+
+def read_upload_image(file):
+    """
+    Decode an uploaded image directly from the request buffer (ML modules
+    required).
+    
+    Returns:
+        np.ndarray: BGR image, or None if the upload is not a decodable image
+    """
+    return load_image(upload_buffer(file))
+
+_storage = None
+_background_cache = None
+
+def get_storage():
+    """Storage manager for UPLOAD_FOLDER; starts the garbage collector on first use"""
+    global _storage
+    if _storage is None or _storage.root != Config.UPLOAD_FOLDER:
+        if _storage is not None:
+            _storage.stop_gc()
+        _storage = StorageManager(
+            Config.UPLOAD_FOLDER,
+            ttl_hours=Config.ARTIFACT_TTL_HOURS,
+            quota_bytes=Config.STORAGE_QUOTA_BYTES
+        )
+        _storage.start_gc(Config.STORAGE_GC_INTERVAL)
+    return _storage
+
+def upload_url(path):
+    """Public URL of a file stored under UPLOAD_FOLDER"""
+    return f"/api/uploads/{get_storage().relative_path(path)}"
+
+def record_blob_result(content_hash, name, value):
+    """
+    Remember a processing result on the wardrobe blob with this content, so
+    uploads of the same photo return it as 'processing'. Best effort.
+    """
+    if db.db is None:
+        return
+    try:
+        db.set_blob_result(content_hash, name, value)
+    except Exception as e:
+        logger.warning(f"Could not record {name} result for blob {content_hash}: {e}")
+
+def get_background_cache():
+    """Result cache for background removal, stored in the 'cache' artifact class"""
+    global _background_cache
+    directory = get_storage().class_dir('cache') / 'nobg'
+    if _background_cache is None or _background_cache.directory != directory:
+        _background_cache = ResultCache(directory, Config.RESULT_CACHE_MAX_BYTES)
+    return _background_cache
+
+_catalogue = None
+_garment_store = None
+
+# Layered try-ons that the fit sliders adjust without re-warping
+tryon_sessions = SessionStore(Config.TRYON_SESSION_MAX, Config.TRYON_SESSION_TTL)
+
+# Previewed try-ons awaiting their full-resolution render
+progressive_renders = SessionStore(Config.TRYON_SESSION_MAX, Config.TRYON_SESSION_TTL)
+
+# Analysed person photos (pose, mask, measurements) reused across try-ons
+person_sessions = SessionStore(Config.PERSON_SESSION_MAX, Config.PERSON_SESSION_TTL)
+
+def get_catalogue():
+    """Product catalogue in CATALOGUE_DIR"""
+    global _catalogue
+    if _catalogue is None or _catalogue.directory != Path(Config.CATALOGUE_DIR):
+        _catalogue = ProductCatalogue(Config.CATALOGUE_DIR)
+    return _catalogue
+
+def get_garment_store():
+    """Prepared catalogue garments, kept in memory and in the 'cache' artifact class"""
+    global _garment_store
+    directory = get_storage().class_dir('cache') / 'garments'
+    if _garment_store is None or _garment_store.directory != directory:
+        _garment_store = GarmentAssetStore(directory, Config.GARMENT_ASSET_CACHE_SIZE)
+    return _garment_store
+
+def find_catalogue_garment(product_id):
+    """
+    Look up a catalogue product and its garment image.
+    
+    Returns:
+        tuple: (product, image path, error message); the error is set and
+            the others are None when the product or its image is missing
+            
+    Raises:
+        ValueError: The product's category cannot be tried on
+    """
+    product = get_catalogue().get(product_id)
+    if product is None:
+        return None, None, f"Product not found: {product_id}"
+    if get_catalogue().region(product) is None:
+        raise ValueError(f"Products in category '{product.get('category')}' cannot be tried on")
+    image_path = get_catalogue().image_path(product)
+    if image_path is None:
+        return None, None, f"Product has no garment image: {product_id}"
+    return product, image_path, None
+
+def catalogue_garment_asset(product, image_path):
+    """Prepared garment asset of a catalogue product, prepared on first use"""
+    return get_garment_store().get_or_create(
+        get_catalogue().asset_key(product, image_path),
+        lambda: cv2.imread(str(image_path), cv2.IMREAD_COLOR),
+        get_catalogue().region(product)
+    )
+
+def uploaded_garment_asset(data, region):
+    """Prepared asset of an uploaded garment, keyed by content and region"""
+    return get_garment_store().get_or_create(
+        f"{hash_bytes(data)}-{region}", lambda: load_image(data), region
+    )
+
+def remove_background_cached(source, content_hash, method=None):
+    """
+    Remove the background through the result cache.
+    
+    Results are keyed by (content hash, method, model version), so a repeat
+    request for the same photo skips decoding and inference entirely. A
+    result is only cached under the backend that produced it: if DeepLabV3
+    fails, GrabCut runs and is cached under its own key.
+    
+    Args:
+        source: Encoded image buffer or path to the input image
+        content_hash: Hash of the encoded input
+        method: 'deeplabv3', 'grabcut' or None for the best available
+        
+    Returns:
+        tuple: (output_path, cached)
+    """
+    def compute_with(backend):
+        def compute(output_path):
+            image = load_image(source)
+            if image is None:
+                raise ValueError('Could not decode image')
+            return remove_background(image, output_path, method=backend, strict=True) == str(output_path)
+        return compute
+    
+    backend, version = background_removal_backend(method)
+    try:
+        output_path, cached = get_background_cache().get_or_create(
+            cache_key(content_hash, backend, version), compute_with(backend)
+        )
+    except Exception as e:
+        if backend == 'grabcut':
+            raise
+        logger.warning(f"DeepLabV3 background removal failed, using GrabCut: {e}")
+        backend, version = background_removal_backend('grabcut')
+        output_path, cached = get_background_cache().get_or_create(
+            cache_key(content_hash, backend, version), compute_with(backend)
+        )
+    
+    record_blob_result(content_hash, 'background_removal', {
+        'url': upload_url(output_path),
+        'method': backend,
+        'version': version
+    })
+    return output_path, cached
+
+def request_person():
+    """
+    Person of a try-on request: a person session or an uploaded person_image.
+    
+    Returns:
+        tuple: (PersonAnalysis or None, person_image FileStorage or None,
+            name for result files)
+            
+    Raises:
+        LookupError: Unknown or expired person_session_id
+        ValueError: No person given, or an invalid upload
+    """
+    session_id = request.form.get('person_session_id')
+    if session_id:
+        person = person_sessions.get(session_id)
+        if person is None:
+            raise LookupError('Person session not found or expired')
+        return person, None, f"{session_id}.png"
+    
+    if 'person_image' not in request.files:
+        raise ValueError('person_image or person_session_id required')
+    person_file = request.files['person_image']
+    valid, message = validate_image(person_file)
+    if not valid:
+        raise ValueError(message)
+    return None, person_file, person_file.filename
+
+def person_keypoints(image):
+    """Pose landmarks of the person in a try-on photo, or None if no pose is found"""
+    pose = detect_body_pose(image)
+    return pose['keypoints'] if pose else None
+
+def resolve_pose_reference(data):
+    """
+    Expand a profile update's pose_reference given only as {"pose_id": ...}
+    (from detect-pose or analyze) with the cached keypoints, measurements
+    and mask, so clients need not resubmit pose data.
+    
+    Raises:
+        LookupError: The pose is not (or no longer) cached
+    """
+    reference = data.get('pose_reference')
+    if not (isinstance(reference, dict) and reference.get('pose_id') and 'keypoints' not in reference):
+        return data
+    pose, measurements = cached_pose(reference['pose_id']) if ML_AVAILABLE else (None, None)
+    if pose is None:
+        raise LookupError('Pose not found or expired; detect the pose again')
+    mask = pose.get('segmentation_mask')
+    return {**data, 'pose_reference': {
+        **reference,
+        'keypoints': pose['keypoints'],
+        'body_measurements': measurements,
+        'method': pose.get('method'),
+        'confidence': pose.get('confidence'),
+        'segmentation_mask': encode_mask(mask) if mask is not None else None
+    }}
+
+def output_options():
+    """Inline output options (output, format, quality, max_dim) from form or query values"""
+    return parse_output_options(request.values, Config.RESULT_IMAGE_QUALITY, Config.RESULT_MAX_DIMENSION)
+
+def inline_result(image, options, payload, location=None):
+    """
+    Return a result image in the response itself.
+    
+    With output=image the encoded image is the response body and the JSON
+    fields move to X-Result-* headers; with output=base64 it is embedded in
+    the JSON as a data URL. The format is negotiated from Accept.
+    """
+    has_alpha = image.ndim == 3 and image.shape[2] == 4
+    image_format = negotiate_format(request.accept_mimetypes, has_alpha, options['format'])
+    data, mimetype = encode_image(image, image_format, options['quality'], options['max_dimension'])
+    
+    if options['output'] == 'base64':
+        response = jsonify({**payload, 'format': image_format, 'image': data_url(data, mimetype)})
+    else:
+        response = Response(data, mimetype=mimetype)
+        for key, value in payload.items():
+            if key != 'success':
+                value = ','.join(map(str, value)) if isinstance(value, (list, tuple)) else str(value).lower()
+                response.headers[f"X-Result-{key.replace('_', '-').title()}"] = value
+        if location:
+            response.headers['Content-Location'] = location
+    
+    response.vary.add('Accept')
+    return response
+
+def result_filename(prefix, filename, extension='png'):
+    """Build a unique file name for a generated artifact"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    stem = Path(secure_filename(filename)).stem or 'image'
+    # The random part keeps same-second results for the same upload name apart
+    return f"{prefix}_{timestamp}_{uuid.uuid4().hex[:12]}_{stem}.{extension}"
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """System health check endpoint"""
@@ -88,12 +432,10 @@ def upload_wardrobe_item():
         if not valid:
             return jsonify({'error': message}), 400
         
-        # Secure filename and save
+        # Hash while saving; identical photos are stored once under their hash
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = Config.UPLOAD_FOLDER / unique_filename
-        file.save(str(filepath))
+        extension = filename.rsplit('.', 1)[1].lower()
+        blob = get_storage().store_content(file.stream, extension, hold=True)
         
         # Get additional metadata from form
         user_id = request.form.get('user_id', 'default_user')
@@ -102,30 +444,153 @@ def upload_wardrobe_item():
         
         # Store in database
         item_data = {
-            'filename': unique_filename,
+            'filename': blob.filename,
+            'storage_path': get_storage().relative_path(blob.path),
+            'url': upload_url(blob.path),
             'original_filename': filename,
+            'content_hash': blob.content_hash,
+            'size': blob.size,
             'category': category,
             'color': color,
             'upload_date': datetime.utcnow(),
-            'file_path': str(filepath)
+            'file_path': str(blob.path)
         }
+        duplicate = not blob.created
         
         if db.db is not None:
-            item_id = db.insert_wardrobe_item(user_id, item_data)
+            item_id, created = db.upsert_wardrobe_item(user_id, item_data)
             item_data['id'] = item_id
+            duplicate = not created
+            
+            if created:
+                blob_record = db.acquire_blob(blob.content_hash, {
+                    'filename': blob.filename,
+                    'storage_path': item_data['storage_path'],
+                    'size': blob.size,
+                    'created_at': datetime.utcnow()
+                })
+            else:
+                blob_record = db.get_blob(blob.content_hash)
+            
+            # Results computed for this content before are reused as-is
+            item_data['processing'] = (blob_record or {}).get('results', {})
         
-        logger.info(f"Uploaded wardrobe item: {unique_filename}")
+        # Referenced now; restores the file if a delete removed it meanwhile
+        get_storage().settle(blob)
+        
+        logger.info(f"Uploaded wardrobe item: {blob.filename} (duplicate={duplicate})")
         
         return jsonify({
             'success': True,
-            'message': 'File uploaded successfully',
+            'message': 'File already uploaded' if duplicate else 'File uploaded successfully',
+            'duplicate': duplicate,
             'data': item_data
-        }), 201
+        }), 200 if duplicate else 201
         
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/wardrobe/bulk-upload', methods=['POST'])
+def bulk_upload_wardrobe():
+    """
+    Upload many wardrobe photos in one multipart request.
+    
+    File parts are streamed straight to storage while they are hashed and
+    validated; thumbnails are generated in parallel and all records are
+    written with a single insert. Every file gets its own status.
+    """
+    started = time.monotonic()
+    try:
+        mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+        if mimetype != 'multipart/form-data' or not options.get('boundary'):
+            return jsonify({'error': 'Expected multipart/form-data'}), 400
+        
+        # Read the raw body; request.files would buffer every part first.
+        # The per-file limit is MAX_CONTENT_LENGTH; the request may be larger.
+        storage = get_storage()
+        receiver = BulkUploadReceiver(
+            storage,
+            Config.ALLOWED_EXTENSIONS,
+            max_files=Config.BULK_UPLOAD_MAX_FILES,
+            max_file_size=Config.MAX_CONTENT_LENGTH
+        )
+        stream = get_input_stream(request.environ, max_content_length=Config.BULK_UPLOAD_MAX_BYTES)
+        parts = receiver.receive(stream, options['boundary'])
+        if not parts:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        process_parts(storage, parts, Config.THUMBNAIL_MAX_SIDE, Config.BULK_UPLOAD_WORKERS)
+        
+        user_id = receiver.fields.get('user_id', 'default_user')
+        category = receiver.fields.get('category', 'uncategorized')
+        color = receiver.fields.get('color', 'unknown')
+        
+        stored = [part for part in parts if part.status == 'stored']
+        now = datetime.utcnow()
+        items = [{
+            'filename': part.blob.filename,
+            'storage_path': storage.relative_path(part.blob.path),
+            'url': upload_url(part.blob.path),
+            'original_filename': part.original_filename,
+            'content_hash': part.blob.content_hash,
+            'size': part.blob.size,
+            'category': category,
+            'color': color,
+            'upload_date': now,
+            'file_path': str(part.blob.path),
+            **part.metadata
+        } for part in stored]
+        
+        if db.db is not None and items:
+            results = db.insert_wardrobe_items(user_id, items)
+            db.acquire_blobs([
+                (item['content_hash'], {
+                    'filename': item['filename'],
+                    'storage_path': item['storage_path'],
+                    'size': item['size'],
+                    'created_at': now
+                })
+                for item, (_, created) in zip(items, results) if created
+            ])
+            blob_records = db.get_blobs(item['content_hash'] for item in items)
+            for item, (item_id, created) in zip(items, results):
+                item['id'] = item_id
+                item['duplicate'] = not created
+                item['processing'] = blob_records.get(item['content_hash'], {}).get('results', {})
+        else:
+            for item, part in zip(items, stored):
+                item['duplicate'] = not part.blob.created
+        for part in stored:
+            storage.settle(part.blob)
+        
+        files = [part.to_dict() for part in parts]
+        for part, item in zip(stored, items):
+            status = files[part.index]
+            status['status'] = 'duplicate' if item.pop('duplicate') else 'created'
+            status['data'] = item
+        
+        summary = {
+            status: sum(1 for f in files if f['status'] == status)
+            for status in ('created', 'duplicate', 'rejected')
+        }
+        elapsed = time.monotonic() - started
+        logger.info(f"Bulk upload for {user_id}: {summary} in {elapsed:.2f}s")
+        
+        return jsonify({
+            'success': True,
+            'count': len(files),
+            **summary,
+            'elapsed': round(elapsed, 3),
+            'files': files
+        }), 201 if summary['created'] else 200
+        
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logger.error(f"Error in bulk upload: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/wardrobe/<user_id>', methods=['GET'])
 def get_wardrobe(user_id):
     """Get all wardrobe items for a user"""
@@ -145,6 +610,42 @@ def get_wardrobe(user_id):
         logger.error(f"Error fetching wardrobe: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/wardrobe/<user_id>/<item_id>', methods=['DELETE'])
+def delete_wardrobe_item(user_id, item_id):
+    """Delete a wardrobe item and release its stored file"""
+    try:
+        if db.db is None:
+            return jsonify({'error': 'Database not connected'}), 503
+        
+        item = db.delete_wardrobe_item(user_id, item_id)
+        if not item:
+            return jsonify({'error': 'Item not found'}), 404
+        
+        # The file is shared by every item with the same content hash
+        file_deleted = False
+        content_hash = item.get('content_hash')
+        if content_hash and db.release_blob(content_hash) == 0:
+            # A concurrent upload of the same content may reference it again
+            # before the file is gone; the file is then kept
+            def still_referenced():
+                return (db.get_blob(content_hash) or {}).get('refcount', 0) > 0
+            
+            # Items stored before the sharded layout only have a flat filename
+            relative_path = item.get('storage_path') or item['filename']
+            file_deleted = delete_blob(Config.UPLOAD_FOLDER / relative_path, still_referenced)
+            if file_deleted and item.get('thumbnail_path'):
+                delete_blob(Config.UPLOAD_FOLDER / item['thumbnail_path'], still_referenced)
+        
+        return jsonify({
+            'success': True,
+            'id': item_id,
+            'file_deleted': file_deleted
+        })
+        
+    except Exception as e:
+        logger.error(f"Error deleting wardrobe item: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/recommendations', methods=['GET'])
 def get_recommendations():
     """Generate outfit recommendations"""
@@ -196,14 +697,13 @@ def analyze_body_shape():
         if not valid:
             return jsonify({'error': message}), 400
         
-        # Save temporarily
-        filename = secure_filename(file.filename)
-        temp_path = Config.UPLOAD_FOLDER / f"temp_{filename}"
-        file.save(str(temp_path))
-        
         # Analyze body shape
         if ML_AVAILABLE:
-            analysis = detect_body_shape(str(temp_path))
+            image = read_upload_image(file)
+            if image is None:
+                return jsonify({'error': 'Could not decode image'}), 400
+            
+            analysis = detect_body_shape(image)
         else:
             # Fallback: basic analysis
             analysis = {
@@ -217,9 +717,6 @@ def analyze_body_shape():
                 'method': 'fallback'
             }
         
-        # Clean up temp file
-        temp_path.unlink()
-        
         return jsonify({
             'success': True,
             'analysis': analysis
@@ -231,48 +728,329 @@ def analyze_body_shape():
 
 @app.route('/api/ar-tryon', methods=['POST'])
 def ar_tryon():
-    """Apply AR virtual try-on"""
+    """Apply AR virtual try-on to an uploaded garment or a catalogue product"""
     try:
-        if 'person_image' not in request.files or 'garment_image' not in request.files:
-            return jsonify({'error': 'Both person_image and garment_image required'}), 400
-        
-        person_file = request.files['person_image']
-        garment_file = request.files['garment_image']
-        
-        # Validate both files
-        for file in [person_file, garment_file]:
-            valid, message = validate_image(file)
+        product_id = request.form.get('product_id')
+        if not (product_id or 'garment_image' in request.files):
+            return jsonify({'error': 'garment_image or product_id required'}), 400
+        
+        adjustable = request.form.get('adjustable', 'false').lower() in ('true', '1', 't')
+        progressive = request.form.get('progressive', 'false').lower() in ('true', '1', 't')
+        if adjustable and progressive:
+            return jsonify({'error': 'adjustable and progressive cannot be combined'}), 400
+        
+        try:
+            person, person_file, person_name = request_person()
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        
+        garment_file = None if product_id else request.files['garment_image']
+        if garment_file is not None:
+            valid, message = validate_image(garment_file)
             if not valid:
                 return jsonify({'error': message}), 400
         
-        # Save temporarily
-        person_path = Config.UPLOAD_FOLDER / f"temp_person_{secure_filename(person_file.filename)}"
-        garment_path = Config.UPLOAD_FOLDER / f"temp_garment_{secure_filename(garment_file.filename)}"
+        if product_id:
+            product, garment_path, error = find_catalogue_garment(product_id)
+            if error:
+                return jsonify({'error': error}), 404
+        
+        options = output_options()
+        inline = options['output'] != 'url'
+        payload = {'success': True, 'method': 'ml'}
         
-        person_file.save(str(person_path))
-        garment_file.save(str(garment_path))
+        # Results are rendered at TRYON_MAX_SIDE unless full resolution is requested
+        full_resolution = request.form.get('full_resolution', 'false').lower() in ('true', '1', 't')
         
         # Apply virtual try-on
         if ML_AVAILABLE:
-            result_path = apply_virtual_tryon(str(person_path), str(garment_path))
+            if person is not None:
+                # Analysed once at session creation; only the garment is processed
+                person_image = person.person_image(full_resolution)
+            else:
+                person_image = read_upload_image(person_file)
+            if product_id:
+                # Catalogue garments are prepared once (mask, trim, control points)
+                garment_image = catalogue_garment_asset(product, garment_path)
+                garment_key = garment_image.key
+            elif request.form.get('region', 'upper') != 'upper':
+                # Lower-body and full-length garments need their region's anchors
+                garment_image = uploaded_garment_asset(upload_buffer(garment_file), request.form['region'])
+                garment_key = garment_image.key
+            else:
+                garment_image = read_upload_image(garment_file)
+                garment_key = hash_bytes(upload_buffer(garment_file))
+            if person_image is None or garment_image is None:
+                return jsonify({'error': 'Could not decode image'}), 400
+            
+            # Pose landmarks drive the thin-plate-spline garment fit; warp grids
+            # are cached per garment content and pose
+            tryon_args = {
+                'keypoints': person.keypoints if person is not None else person_keypoints(person_image),
+                'garment_key': garment_key,
+                'full_resolution': full_resolution
+            }
+            
+            if adjustable:
+                # Keep person and garment layers so the fit can be adjusted later
+                session = TryOnSession.create(person_image, garment_image, **tryon_args)
+                payload['tryon_session_id'] = tryon_sessions.create(session)
+                if inline:
+                    return inline_result(session.composite, options, payload)
+                result_path = get_storage().path_for('tryon', result_filename('tryon_result', person_name))
+                cv2.imwrite(str(result_path), session.composite)
+            elif progressive:
+                # Preview now; the full render reuses its warp on the next call
+                render = ProgressiveTryOn(person_image, garment_image, **tryon_args)
+                preview = render.preview()
+                payload['render_id'] = progressive_renders.create(render)
+                payload['preview_ms'] = render.timings['preview_ms']
+                if inline:
+                    return inline_result(preview, options, payload)
+                result_path = get_storage().path_for('tryon', result_filename('tryon_preview', person_name))
+                cv2.imwrite(str(result_path), preview)
+            elif inline:
+                # Encoded straight into the response; nothing is written to disk
+                result = apply_virtual_tryon(person_image, garment_image, return_image=True, **tryon_args)
+                if result is None:
+                    return jsonify({'error': 'Virtual try-on failed'}), 500
+                return inline_result(result, options, payload)
+            else:
+                # Only the composited result is written to disk
+                output_path = get_storage().path_for('tryon', result_filename('tryon_result', person_name))
+                result_path = apply_virtual_tryon(person_image, garment_image, output_path=output_path, **tryon_args)
+                if not result_path:
+                    return jsonify({'error': 'Virtual try-on failed'}), 500
+        elif inline:
+            # Fallback: return original person image
+            person_image = read_upload_image(person_file)
+            if person_image is None:
+                return jsonify({'error': 'Could not decode image'}), 400
+            return inline_result(person_image, options, {'success': True, 'method': 'fallback'})
         else:
             # Fallback: return original person image
-            result_path = str(person_path)
-        
-        # Clean up temp files
-        person_path.unlink()
-        garment_path.unlink()
+            extension = person_file.filename.rsplit('.', 1)[1].lower()
+            result_path = get_storage().path_for('tryon', result_filename('tryon_result', person_file.filename, extension))
+            person_file.save(str(result_path))
         
         return jsonify({
-            'success': True,
-            'result_url': f'/api/uploads/{Path(result_path).name}',
+            **payload,
+            'result_url': upload_url(result_path),
             'method': 'ml' if ML_AVAILABLE else 'fallback'
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in AR try-on: {e}")
         return jsonify({'error': str(e)}), 500
 
+def outfit_garments(specs):
+    """
+    Resolve an outfit's garment list from the request.
+    
+    Args:
+        specs: Decoded 'garments' field, bottom layer first; each entry is
+            {"product_id": ...} or {"file": <form field>, "region": ...}
+            
+    Returns:
+        list: (kind, value, region) with kind 'product' (value: (product,
+            image path)) or 'upload' (value: FileStorage)
+            
+    Raises:
+        ValueError: Invalid list; LookupError: unknown product
+    """
+    if not isinstance(specs, list) or not specs:
+        raise ValueError('garments must be a non-empty JSON list')
+    if len(specs) > Config.TRYON_MAX_GARMENTS:
+        raise ValueError(f"At most {Config.TRYON_MAX_GARMENTS} garments per outfit")
+    
+    garments = []
+    for spec in specs:
+        if not isinstance(spec, dict):
+            raise ValueError('Each garment must be an object with product_id or file')
+        if spec.get('product_id'):
+            product, garment_path, error = find_catalogue_garment(spec['product_id'])
+            if error:
+                raise LookupError(error)
+            garments.append(('product', (product, garment_path), get_catalogue().region(product)))
+        elif spec.get('file'):
+            file = request.files.get(spec['file'])
+            valid, message = validate_image(file)
+            if not valid:
+                raise ValueError(f"{spec['file']}: {message}")
+            region = spec.get('region', 'upper')
+            if region not in ('upper', 'lower', 'full'):
+                raise ValueError('region must be one of: upper, lower, full')
+            garments.append(('upload', file, region))
+        else:
+            raise ValueError('Each garment needs a product_id or a file')
+    return garments
+
+@app.route('/api/ar-tryon/renders/<render_id>', methods=['POST'])
+def render_progressive_tryon(render_id):
+    """Full-resolution render of a progressive try-on, reusing its preview's garment warp"""
+    try:
+        render = progressive_renders.get(render_id)
+        if render is None:
+            return jsonify({'error': 'Try-on render not found or expired'}), 404
+        options = output_options()
+        
+        image = render.render()
+        payload = {'success': True, 'method': 'ml', 'render_ms': render.timings['render_ms']}
+        if options['output'] != 'url':
+            return inline_result(image, options, payload)
+        
+        result_path = get_storage().path_for('tryon', result_filename('tryon_result', render_id))
+        cv2.imwrite(str(result_path), image)
+        return jsonify({**payload, 'timings': render.timings, 'result_url': upload_url(result_path)})
+        
+    except Exception as e:
+        logger.error(f"Error rendering try-on {render_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ar-tryon/outfit', methods=['POST'])
+def ar_tryon_outfit():
+    """Try on several garments (e.g. trousers, shirt, jacket) in one composition pass"""
+    try:
+        try:
+            person, person_file, person_name = request_person()
+            garments = outfit_garments(json.loads(request.form.get('garments', '')))
+        except json.JSONDecodeError:
+            return jsonify({'error': 'garments must be a JSON list'}), 400
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        
+        options = output_options()
+        full_resolution = request.form.get('full_resolution', 'false').lower() in ('true', '1', 't')
+        if person is not None:
+            person_image = person.person_image(full_resolution)
+        else:
+            person_image = read_upload_image(person_file)
+        if person_image is None:
+            return jsonify({'error': 'Could not decode image'}), 400
+        
+        if ML_AVAILABLE:
+            assets = [
+                catalogue_garment_asset(*value) if kind == 'product' else uploaded_garment_asset(upload_buffer(value), region)
+                for kind, value, region in garments
+            ]
+            keypoints = person.keypoints if person is not None else person_keypoints(person_image)
+            result = apply_layered_tryon(person_image, assets, keypoints,
+                                         full_resolution=full_resolution, return_image=True)
+            method = 'ml'
+        else:
+            # Fallback: return original person image
+            result, method = person_image, 'fallback'
+        
+        payload = {'success': True, 'method': method, 'garments': len(garments)}
+        if options['output'] != 'url':
+            return inline_result(result, options, payload)
+        
+        result_path = get_storage().path_for('tryon', result_filename('tryon_result', person_name))
+        cv2.imwrite(str(result_path), result)
+        return jsonify({**payload, 'result_url': upload_url(result_path)})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in outfit try-on: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/person-sessions', methods=['POST'])
+def create_person_session():
+    """
+    Upload a person photo once for many try-ons.
+    
+    Pose, segmentation mask, body measurements and the working-resolution
+    image are computed here; try-ons given the returned person_session_id
+    only warp and blend the garment.
+    """
+    try:
+        if 'person_image' not in request.files:
+            return jsonify({'error': 'person_image required'}), 400
+        person_file = request.files['person_image']
+        valid, message = validate_image(person_file)
+        if not valid:
+            return jsonify({'error': message}), 400
+        if not ML_AVAILABLE:
+            return jsonify({'error': 'Person analysis requires the ML modules'}), 503
+        
+        person = PersonAnalysis.analyze(upload_buffer(person_file))
+        session_id = person_sessions.create(person)
+        return jsonify({'success': True, 'person_session_id': session_id, 'analysis': person.to_dict()}), 201
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error creating person session: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/person-sessions/<session_id>', methods=['GET'])
+def get_person_session(session_id):
+    """Stored analysis of a person session"""
+    person = person_sessions.get(session_id)
+    if person is None:
+        return jsonify({'error': 'Person session not found or expired'}), 404
+    return jsonify({'success': True, 'person_session_id': session_id, 'analysis': person.to_dict()})
+
+@app.route('/api/person-sessions/<session_id>', methods=['DELETE'])
+def delete_person_session(session_id):
+    """Release a person session's image and analysis"""
+    if not person_sessions.delete(session_id):
+        return jsonify({'error': 'Person session not found or expired'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/ar-tryon/sessions/<session_id>/adjust', methods=['POST'])
+def adjust_tryon(session_id):
+    """
+    Move, scale or rotate the garment of an adjustable try-on.
+    
+    Values are absolute (relative to the fitted garment): x and y in pixels
+    of the result image, scale as a factor, rotation in degrees. Only the
+    garment's region is re-composited.
+    """
+    try:
+        session = tryon_sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Try-on session not found or expired'}), 404
+        
+        values = request.values
+        position = None
+        if 'x' in values or 'y' in values:
+            current = session.adjustment['position']
+            position = (float(values.get('x', current[0])), float(values.get('y', current[1])))
+        scale = float(values['scale']) if 'scale' in values else None
+        rotation = float(values['rotation']) if 'rotation' in values else None
+        options = output_options()
+        
+        image, region = session.adjust(position=position, scale=scale, rotation=rotation)
+        payload = {
+            'success': True,
+            'region': list(region) if region else None,
+            'update_ms': round(session.last_update_ms, 2)
+        }
+        
+        if options['output'] != 'url':
+            return inline_result(image, options, payload)
+        
+        adjusted_path = get_storage().path_for('adjusted', result_filename('adjusted', session_id))
+        cv2.imwrite(str(adjusted_path), image)
+        return jsonify({**payload, 'adjustment': session.adjustment, 'result_url': upload_url(adjusted_path)})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error adjusting try-on {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ar-tryon/sessions/<session_id>', methods=['DELETE'])
+def delete_tryon_session(session_id):
+    """Release an adjustable try-on's layers"""
+    if not tryon_sessions.delete(session_id):
+        return jsonify({'error': 'Try-on session not found or expired'}), 404
+    return jsonify({'success': True})
+
 @app.route('/api/product-catalogue', methods=['GET'])
 def get_product_catalogue():
     """Get product catalogue with images and metadata"""
@@ -305,6 +1083,140 @@ def get_product_catalogue():
         logger.error(f"Error fetching catalogue: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/product-catalogue/<product_id>/garment', methods=['POST'])
+def prepare_catalogue_garment(product_id):
+    """Prepare a catalogue product's garment asset ahead of its first try-on"""
+    try:
+        product, garment_path, error = find_catalogue_garment(product_id)
+        if error:
+            return jsonify({'error': error}), 404
+        if not ML_AVAILABLE:
+            return jsonify({'error': 'Garment preparation requires the ML modules'}), 503
+        
+        asset = catalogue_garment_asset(product, garment_path)
+        return jsonify({
+            'success': True,
+            'product_id': product_id,
+            'asset': asset.to_dict()
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error preparing garment {product_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def live_tryon_garment(settings):
+    """
+    Prepared garment for a live try-on session from its setup message.
+    
+    Returns:
+        tuple: (GarmentAsset, None) or (None, error message)
+    """
+    product_id = settings.get('product_id')
+    if product_id:
+        product, garment_path, error = find_catalogue_garment(product_id)
+        if error:
+            return None, error
+        return catalogue_garment_asset(product, garment_path), None
+    
+    if settings.get('garment_image'):
+        data = decode_data_url(settings['garment_image'])
+        # Uploaded garments are prepared once per content, like catalogue ones
+        return uploaded_garment_asset(data, settings.get('region', 'upper')), None
+    
+    return None, 'product_id or garment_image required'
+
+def live_tryon_stream(ws):
+    """
+    Live try-on over a WebSocket.
+    
+    The client first sends a JSON setup message ({"product_id": ...} or
+    {"garment_image": <base64>, "region": ...}, plus optional target_fps,
+    format and quality), then encoded camera frames as binary messages. Each rendered
+    frame is sent back as a binary message; JSON metrics messages report
+    FPS, latency and dropped frames. Frames that arrive while the previous
+    one is still rendering are dropped so the stream stays live.
+    """
+    def send_json(message):
+        ws.send(json.dumps(message))
+    
+    if not ML_AVAILABLE:
+        send_json({'type': 'error', 'error': 'Live try-on requires the ML modules'})
+        return
+    
+    try:
+        message = ws.receive(timeout=10)
+        settings = json.loads(message) if isinstance(message, str) else None
+        if not isinstance(settings, dict):
+            send_json({'type': 'error', 'error': 'Expected a JSON setup message'})
+            return
+        
+        garment, error = live_tryon_garment(settings)
+        if error:
+            send_json({'type': 'error', 'error': error})
+            return
+        target_fps = min(float(settings.get('target_fps', Config.LIVE_TRYON_TARGET_FPS)), Config.LIVE_TRYON_MAX_FPS)
+        image_format = negotiate_format(None, False, settings.get('format') or 'jpeg')
+        quality = int(settings.get('quality', Config.LIVE_TRYON_QUALITY))
+        if not 1 <= quality <= 100:
+            raise ValueError('quality must be between 1 and 100')
+    except (ValueError, TypeError) as e:
+        send_json({'type': 'error', 'error': str(e)})
+        return
+    
+    tracker = PoseTracker(model_complexity=Config.LIVE_TRYON_POSE_COMPLEXITY)
+    session = LiveTryOnSession(garment, target_fps=target_fps, tracker=tracker)
+    send_json({'type': 'ready', 'target_fps': session.target_fps, 'format': image_format})
+    
+    def read_frames():
+        # Runs beside the renderer so frames keep arriving (and stale ones
+        # are dropped) while a frame is being rendered
+        try:
+            while True:
+                message = ws.receive()
+                if isinstance(message, str):
+                    control = json.loads(message)
+                    if isinstance(control, dict) and control.get('type') == 'close':
+                        break
+                elif message:
+                    session.submit(message)
+        except (ConnectionClosed, ValueError):
+            pass
+        finally:
+            session.close()
+    
+    reader = threading.Thread(target=read_frames, name='live-tryon-reader', daemon=True)
+    reader.start()
+    
+    last_metrics = time.monotonic()
+    try:
+        while True:
+            result = session.next_result(timeout=1.0)
+            if result is not None:
+                ws.send(encode_image(result, image_format, quality)[0])
+            elif session.closed:
+                break
+            
+            if time.monotonic() - last_metrics >= Config.LIVE_TRYON_METRICS_INTERVAL:
+                send_json({'type': 'metrics', **session.metrics()})
+                last_metrics = time.monotonic()
+        send_json({'type': 'metrics', 'final': True, **session.metrics()})
+    except ConnectionClosed:
+        pass
+    finally:
+        session.close()
+        tracker.close()
+        logger.info(f"Live try-on session ended: {session.metrics()}")
+
+if WEBSOCKETS_AVAILABLE:
+    sock.route('/api/ar-tryon/live')(live_tryon_stream)
+else:
+    @app.route('/api/ar-tryon/live')
+    def live_tryon_unavailable():
+        """Live try-on needs flask-sock; explain instead of a bare 404"""
+        return jsonify({'error': 'Live try-on streaming requires flask-sock'}), 501
+
 @app.route('/api/profile/create', methods=['POST'])
 def create_user_profile():
     """Create a new user profile"""
@@ -367,6 +1279,11 @@ def update_user_profile(user_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        try:
+            data = resolve_pose_reference(data)
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        
         profile = profile_manager.update_profile(user_id, data)
         
         return jsonify({
@@ -382,7 +1299,13 @@ def update_user_profile(user_id):
 
 @app.route('/api/body-shape/detect-pose', methods=['POST'])
 def detect_pose():
-    """Detect body pose and return keypoints"""
+    """
+    Detect body pose and return keypoints.
+    
+    The segmentation mask, when detected, is returned compactly encoded:
+    mask_encoding is 'rle' (COCO RLE, default), 'png' (base64 data URL) or
+    'none' to leave it out.
+    """
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -393,19 +1316,36 @@ def detect_pose():
         if not valid:
             return jsonify({'error': message}), 400
         
-        # Save temporarily
-        filename = secure_filename(file.filename)
-        temp_path = Config.UPLOAD_FOLDER / f"temp_{filename}"
-        file.save(str(temp_path))
+        mask_encoding = request.form.get('mask_encoding', 'rle')
+        if mask_encoding not in ('rle', 'png', 'none'):
+            return jsonify({'error': 'mask_encoding must be rle, png or none'}), 400
         
         # Detect pose
         if ML_AVAILABLE:
-            pose_data = detect_body_pose(str(temp_path))
-            measurements = None
+            data = upload_buffer(file)
+            image = load_image(data)
+            if image is None:
+                return jsonify({'error': 'Could not decode image'}), 400
+            
+            # Cached by image content: a selfie already analysed needs no inference
+            pose_data, measurements = analyze_pose(image)
             
             if pose_data and pose_data.get('keypoints'):
-                measurements = extract_body_measurements(pose_data['keypoints'])
                 pose_data['body_measurements'] = measurements
+                record_blob_result(hash_bytes(data), 'pose', {
+                    'pose_id': pose_data.get('pose_id'),
+                    'method': pose_data.get('method'),
+                    'confidence': pose_data.get('confidence'),
+                    'keypoints': pose_data['keypoints'],
+                    'body_measurements': measurements
+                })
+            
+            # A raw mask is a full-size array; encode it (or drop it) for JSON
+            if pose_data and pose_data.get('segmentation_mask') is not None:
+                if mask_encoding == 'none':
+                    pose_data['segmentation_mask'] = None
+                else:
+                    pose_data['segmentation_mask'] = encode_mask(pose_data['segmentation_mask'], mask_encoding)
         else:
             # Fallback
             pose_data = {
@@ -414,9 +1354,6 @@ def detect_pose():
                 'method': 'fallback'
             }
         
-        # Clean up temp file
-        temp_path.unlink()
-        
         return jsonify({
             'success': True,
             'pose_data': pose_data
@@ -439,35 +1376,328 @@ def remove_image_background():
         if not valid:
             return jsonify({'error': message}), 400
         
-        # Save temporarily
-        filename = secure_filename(file.filename)
-        temp_path = Config.UPLOAD_FOLDER / f"temp_{filename}"
-        file.save(str(temp_path))
+        method = request.form.get('method') or None
+        if method not in (None, 'deeplabv3', 'grabcut'):
+            return jsonify({'error': 'method must be deeplabv3 or grabcut'}), 400
+        
+        options = output_options()
         
         # Remove background
+        cached = False
         if ML_AVAILABLE:
-            output_path = remove_background(str(temp_path))
+            data = upload_buffer(file)
+            output_path, cached = remove_background_cached(data, hash_bytes(data), method)
+            if options['output'] != 'url':
+                result = cv2.imread(str(output_path), cv2.IMREAD_UNCHANGED)
+                return inline_result(
+                    result, options,
+                    {'success': True, 'cached': cached, 'method': 'ml'},
+                    location=upload_url(output_path)
+                )
+        elif options['output'] != 'url':
+            # Fallback: return original (decoded here, as load_image is an ML module)
+            data = upload_buffer(file)
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if len(data) else None
+            if image is None:
+                return jsonify({'error': 'Could not decode image'}), 400
+            return inline_result(image, options, {'success': True, 'cached': False, 'method': 'fallback'})
         else:
             # Fallback: return original
-            output_path = str(temp_path)
-        
-        # Return the file
-        output_filename = Path(output_path).name
+            extension = file.filename.rsplit('.', 1)[1].lower()
+            output_path = get_storage().path_for('nobg', result_filename('nobg', file.filename, extension))
+            file.save(str(output_path))
         
         return jsonify({
             'success': True,
-            'image_url': f'/api/uploads/{output_filename}',
+            'image_url': upload_url(output_path),
+            'cached': cached,
             'method': 'ml' if ML_AVAILABLE else 'fallback'
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error removing background: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/uploads/<filename>')
+def run_tryon_job(payload):
+    """Job handler: virtual try-on from persisted inputs"""
+    person_path = Path(payload['person_path'])
+    garment_path = Path(payload['garment_path'])
+    output_path = Path(payload['output_path'])
+    
+    try:
+        if ML_AVAILABLE:
+            result_path = apply_virtual_tryon(
+                str(person_path), str(garment_path),
+                keypoints=person_keypoints(str(person_path)),
+                output_path=output_path,
+                full_resolution=payload.get('full_resolution', False)
+            )
+            if not result_path or Path(result_path) != output_path:
+                raise RuntimeError('Virtual try-on failed')
+        else:
+            # Fallback: return original person image
+            shutil.copyfile(person_path, output_path)
+    finally:
+        person_path.unlink(missing_ok=True)
+        garment_path.unlink(missing_ok=True)
+    
+    return {
+        'result_url': upload_url(output_path),
+        'method': 'ml' if ML_AVAILABLE else 'fallback'
+    }
+
+def run_background_remove_job(payload):
+    """Job handler: background removal from a persisted input"""
+    input_path = Path(payload['input_path'])
+    output_path = Path(payload['output_path'])
+    cached = False
+    
+    try:
+        if ML_AVAILABLE:
+            content_hash = hash_bytes(input_path.read_bytes())
+            output_path, cached = remove_background_cached(input_path, content_hash, payload.get('method'))
+        else:
+            # Fallback: return original
+            shutil.copyfile(input_path, output_path)
+    finally:
+        input_path.unlink(missing_ok=True)
+    
+    return {
+        'image_url': upload_url(output_path),
+        'cached': cached,
+        'method': 'ml' if ML_AVAILABLE else 'fallback'
+    }
+
+job_queue = JobQueue(
+    handlers={
+        'ar_tryon': run_tryon_job,
+        'background_remove': run_background_remove_job
+    },
+    workers=Config.JOB_WORKERS,
+    lease_seconds=Config.JOB_LEASE_SECONDS
+)
+
+def get_job_queue():
+    """
+    Open the job queue on first use.
+    
+    With JOB_RUNNER=worker jobs are run by worker.py; web processes only
+    queue and read them, so a slow or killed web worker cannot take running
+    jobs down with it.
+    """
+    if Config.JOB_RUNNER == 'worker':
+        if job_queue.db_path is None:
+            job_queue.db_path = Config.JOB_DATABASE
+    elif not job_queue.started:
+        job_queue.start(Config.JOB_DATABASE)
+    return job_queue
+
+def save_job_input(file, token, role):
+    """Persist an uploaded job input so queued work survives a restart"""
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    path = get_storage().path_for('job_input', f"job_{token}_{role}.{extension}")
+    file.save(str(path))
+    return path
+
+def parse_priority():
+    """Read the optional job priority (-10 to 10, higher runs first)"""
+    try:
+        priority = int(request.form.get('priority', 0))
+    except ValueError:
+        raise ValueError('priority must be an integer')
+    return max(-10, min(10, priority))
+
+def job_links(job):
+    """Polling and Server-Sent Events URLs for a job"""
+    return {
+        'status_url': f"/api/jobs/{job['id']}",
+        'events_url': f"/api/jobs/{job['id']}/events"
+    }
+
+@app.route('/api/jobs/ar-tryon', methods=['POST'])
+def submit_ar_tryon_job():
+    """Queue an AR virtual try-on and return a job ID immediately"""
+    try:
+        if 'person_image' not in request.files or 'garment_image' not in request.files:
+            return jsonify({'error': 'Both person_image and garment_image required'}), 400
+        
+        person_file = request.files['person_image']
+        garment_file = request.files['garment_image']
+        
+        for file in [person_file, garment_file]:
+            valid, message = validate_image(file)
+            if not valid:
+                return jsonify({'error': message}), 400
+        
+        priority = parse_priority()
+        full_resolution = request.form.get('full_resolution', 'false').lower() in ('true', '1', 't')
+        
+        token = uuid.uuid4().hex
+        output_path = get_storage().path_for('tryon', result_filename('tryon_result', person_file.filename))
+        payload = {
+            'person_path': str(save_job_input(person_file, token, 'person')),
+            'garment_path': str(save_job_input(garment_file, token, 'garment')),
+            'output_path': str(output_path),
+            'full_resolution': full_resolution
+        }
+        
+        job = get_job_queue().submit('ar_tryon', payload, priority)
+        
+        return jsonify({'success': True, 'job': job, **job_links(job)}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error queueing AR try-on: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/background-remove', methods=['POST'])
+def submit_background_remove_job():
+    """Queue background removal and return a job ID immediately"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        valid, message = validate_image(file)
+        
+        if not valid:
+            return jsonify({'error': message}), 400
+        
+        priority = parse_priority()
+        method = request.form.get('method') or None
+        if method not in (None, 'deeplabv3', 'grabcut'):
+            return jsonify({'error': 'method must be deeplabv3 or grabcut'}), 400
+        
+        # With ML available the result path comes from the result cache
+        token = uuid.uuid4().hex
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        output_path = get_storage().path_for('nobg', result_filename('nobg', file.filename, extension))
+        payload = {
+            'input_path': str(save_job_input(file, token, 'input')),
+            'output_path': str(output_path),
+            'method': method
+        }
+        
+        job = get_job_queue().submit('background_remove', payload, priority)
+        
+        return jsonify({'success': True, 'job': job, **job_links(job)}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error queueing background removal: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll the status of a background job"""
+    try:
+        job = get_job_queue().get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({'success': True, 'job': job, **job_links(job)})
+        
+    except Exception as e:
+        logger.error(f"Error fetching job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream job status changes as Server-Sent Events until the job finishes"""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def format_event(job):
+        return f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+    
+    def stream():
+        # Streams end after JOB_EVENTS_TIMEOUT, below the worker timeout;
+        # EventSource clients reconnect after the retry delay
+        current = job
+        deadline = time.monotonic() + Config.JOB_EVENTS_TIMEOUT
+        yield "retry: 2000\n\n"
+        yield format_event(current)
+        
+        while current['status'] not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            remaining = deadline - time.monotonic()
+            updated = queue.wait_for_update(job_id, current['updated_at'], timeout=min(15, max(remaining, 0)))
+            if updated is None:
+                break
+            if updated['updated_at'] > current['updated_at']:
+                current = updated
+                yield format_event(current)
+            else:
+                # Keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/storage/metrics', methods=['GET'])
+def storage_metrics():
+    """Bytes and file counts per artifact class in the upload folder"""
+    try:
+        refresh = request.args.get('refresh', 'false').lower() in ('true', '1', 't')
+        metrics = get_storage().metrics(refresh=refresh)
+        metrics['result_cache'] = get_background_cache().stats()
+        
+        return jsonify({'success': True, 'storage': metrics})
+        
+    except Exception as e:
+        logger.error(f"Error reading storage metrics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/uploads/<path:filename>')
 def serve_upload(filename):
-    """Serve uploaded files"""
-    return send_from_directory(Config.UPLOAD_FOLDER, filename)
+    """
+    Serve uploaded files with conditional GET and byte ranges.
+    
+    Content-addressed files (wardrobe blobs, thumbnails, cached results) never
+    change, so they get a strong ETag and an immutable Cache-Control. With
+    UPLOAD_SENDFILE set the bytes are handed off to the front proxy.
+    """
+    path = safe_join(str(Config.UPLOAD_FOLDER), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    
+    identity = content_address(Path(path).name)
+    
+    if Config.UPLOAD_SENDFILE == 'x-accel-redirect':
+        # nginx serves the bytes (and ranges) from an internal location
+        stat = os.stat(path)
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.set_etag(identity or f"{stat.st_mtime}-{stat.st_size}")
+        response.last_modified = stat.st_mtime
+        response.headers['X-Accel-Redirect'] = f"{Config.UPLOAD_ACCEL_PREFIX.rstrip('/')}/{filename}"
+        response = response.make_conditional(request)
+    else:
+        response = send_file(
+            path,
+            request.environ,
+            conditional=True,
+            etag=identity or True,
+            use_x_sendfile=Config.UPLOAD_SENDFILE == 'x-sendfile',
+            response_class=app.response_class
+        )
+    
+    if identity:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.UPLOAD_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Generated results may be replaced; revalidate with the validators
+        response.cache_control.no_cache = True
+    return response
 
 @app.errorhandler(413)
 def file_too_large(e):
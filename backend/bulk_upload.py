@@ -0,0 +1,232 @@
+"""Streaming multi-file upload parsing and parallel post-processing"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+
+from backend.storage import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the image formats accepted for upload
+IMAGE_SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',),
+}
+EXTENSION_FORMATS = {'png': 'png', 'jpg': 'jpeg', 'jpeg': 'jpeg', 'gif': 'gif', 'webp': 'webp'}
+
+# Bytes needed before the format of a part can be checked
+SNIFF_BYTES = 12
+
+def sniff_image_format(head):
+    """Image format named by a file's leading bytes, or None"""
+    for image_format, signatures in IMAGE_SIGNATURES.items():
+        if head.startswith(signatures):
+            if image_format == 'webp' and head[8:12] != b'WEBP':
+                continue
+            return image_format
+    return None
+
+class UploadPart:
+    """One file part of a bulk upload and what happened to it"""
+
+    def __init__(self, index, original_filename):
+        self.index = index
+        self.original_filename = original_filename
+        self.extension = None
+        self.status = 'pending'
+        self.error = None
+        self.blob = None
+        self.metadata = {}
+        self._incoming = None
+        self._head = b''
+
+    def reject(self, error):
+        self.status = 'rejected'
+        self.error = error
+        if self._incoming is not None:
+            self._incoming.discard()
+            self._incoming = None
+
+    def to_dict(self):
+        result = {
+            'index': self.index,
+            'original_filename': self.original_filename,
+            'status': self.status
+        }
+        if self.error:
+            result['error'] = self.error
+        return result
+
+class BulkUploadReceiver:
+    """
+    Parse a multipart body incrementally, streaming each file part to storage.
+
+    Parts are validated as they arrive: the extension when the part headers
+    are read, the format signature once the first bytes are in and the size
+    on every chunk. A rejected part stops being written immediately, so a bad
+    file never reaches its final location.
+    """
+
+    def __init__(self, storage, allowed_extensions, max_files, max_file_size, max_field_size=64 * 1024):
+        self.storage = storage
+        self.allowed_extensions = allowed_extensions
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self.max_field_size = max_field_size
+        self.fields = {}
+        self.parts = []
+
+    def receive(self, stream, boundary):
+        """
+        Read a multipart body to the end.
+
+        Args:
+            stream: Readable request body stream
+            boundary: Multipart boundary from the Content-Type header
+
+        Returns:
+            list: UploadPart for every file part, in request order
+        """
+        decoder = MultipartDecoder(boundary.encode('latin-1'), self.max_field_size)
+        current = None
+        field_name = None
+        field_data = []
+
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+
+                event = decoder.next_event()
+                while not isinstance(event, (NeedData, Epilogue)):
+                    if isinstance(event, Field):
+                        field_name, field_data = event.name, []
+                        current = None
+                    elif isinstance(event, File):
+                        current = self._start_part(event.filename)
+                        field_name = None
+                    elif isinstance(event, Data):
+                        if current is not None:
+                            self._write(current, event.data)
+                            if not event.more_data:
+                                self._finish(current)
+                                current = None
+                        elif field_name is not None:
+                            field_data.append(event.data)
+                            if not event.more_data:
+                                self.fields[field_name] = b''.join(field_data).decode('utf-8', 'replace')
+                                field_name = None
+                    event = decoder.next_event()
+
+                if isinstance(event, Epilogue) or not chunk:
+                    break
+
+        finally:
+            # Parts cut off by a truncated or oversized body are dropped
+            for part in self.parts:
+                if part.status == 'pending':
+                    part.reject('Upload interrupted')
+
+        return self.parts
+
+    def _start_part(self, filename):
+        part = UploadPart(len(self.parts), filename)
+        self.parts.append(part)
+
+        name = secure_filename(filename or '')
+        extension = name.rsplit('.', 1)[1].lower() if '.' in name else ''
+        if len(self.parts) > self.max_files:
+            part.reject(f"Too many files (max {self.max_files})")
+        elif extension not in self.allowed_extensions:
+            part.reject(f"Invalid file type. Allowed: {', '.join(sorted(self.allowed_extensions))}")
+        else:
+            part.original_filename = name
+            part.extension = extension
+            part._incoming = self.storage.open_incoming(extension)
+        return part
+
+    def _write(self, part, data):
+        if part.status != 'pending' or not data:
+            return
+
+        if len(part._head) < SNIFF_BYTES:
+            part._head += data[:SNIFF_BYTES - len(part._head)]
+            if len(part._head) >= SNIFF_BYTES and \
+                    sniff_image_format(part._head) != EXTENSION_FORMATS[part.extension]:
+                part.reject('File content does not match its image type')
+                return
+
+        if part._incoming.size + len(data) > self.max_file_size:
+            part.reject(f"File exceeds {self.max_file_size // (1024 * 1024)}MB limit")
+            return
+
+        part._incoming.write(data)
+
+    def _finish(self, part):
+        if part.status != 'pending':
+            return
+        if sniff_image_format(part._head) != EXTENSION_FORMATS[part.extension]:
+            part.reject('File content does not match its image type')
+            return
+        # Reused blobs keep this upload's copy until the route records the
+        # reference (StorageManager.settle)
+        part.blob = part._incoming.commit(hold=True)
+        part._incoming = None
+        part.status = 'stored'
+
+def make_thumbnail(storage, part, max_side):
+    """
+    Decode a stored upload, record its dimensions and write a JPEG thumbnail.
+
+    JPEGs are decoded at reduced scale (Image.draft), so a thumbnail costs a
+    fraction of a full decode. Thumbnails are named by content hash, so
+    duplicates reuse the existing one.
+    """
+    with Image.open(part.blob.path) as image:
+        w, h = image.size
+        part.metadata = {'width': w, 'height': h}
+
+        thumbnail_path = storage.path_for('thumbnail', f"{part.blob.content_hash}.jpg", key=part.blob.content_hash)
+        if not thumbnail_path.exists():
+            image.draft('RGB', (max_side, max_side))
+            image.thumbnail((max_side, max_side))
+            temp_path = thumbnail_path.with_name(f".tmp_{uuid.uuid4().hex}_{thumbnail_path.name}")
+            image.convert('RGB').save(temp_path, 'JPEG', quality=85)
+            temp_path.replace(thumbnail_path)
+
+    part.metadata['thumbnail_path'] = storage.relative_path(thumbnail_path)
+    return True
+
+def process_parts(storage, parts, max_side, workers):
+    """
+    Create thumbnails for the stored parts in parallel.
+
+    Parts that cannot be decoded are rejected and, if this upload created
+    their blob, the file is removed again.
+    """
+    stored = [part for part in parts if part.status == 'stored']
+
+    def process(part):
+        try:
+            return make_thumbnail(storage, part, max_side)
+        except Exception as e:
+            logger.error(f"Thumbnail failed for {part.original_filename}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(process, stored))
+
+    for part, ok in zip(stored, results):
+        if not ok:
+            if part.blob.created and not any(
+                    other is not part and other.blob is not None and other.blob.path == part.blob.path
+                    for other in stored):
+                part.blob.path.unlink(missing_ok=True)
+            storage.settle(part.blob, restore=False)
+            part.blob = None
+            part.reject('File is not a valid image')
@@ -0,0 +1,79 @@
+"""Product catalogue lookups for try-on by product ID"""
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Body region a garment of each catalogue category is fitted to; categories
+# not listed (shoes, bags, accessories) cannot be tried on
+CATEGORY_REGIONS = {
+    'tops': 'upper',
+    'outerwear': 'upper',
+    'bottoms': 'lower',
+    'dresses': 'full',
+}
+
+class ProductCatalogue:
+    """
+    Products from a catalogue directory's metadata.json, with their images
+    under images/. The metadata is re-read when the file changes.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.metadata_path = self.directory / 'metadata.json'
+        self.images_dir = self.directory / 'images'
+        self._products = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = self.metadata_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._products, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.metadata_path) as f:
+                products = json.load(f).get('products', [])
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read catalogue metadata {self.metadata_path}: {e}")
+            return
+        self._products = {product['id']: product for product in products if 'id' in product}
+        self._mtime = mtime
+
+    def get(self, product_id):
+        """Product metadata by ID, or None"""
+        with self._lock:
+            self._refresh()
+            return self._products.get(product_id)
+
+    def image_path(self, product):
+        """Path of a product's garment image, or None if it is missing"""
+        filename = product.get('image_filename')
+        if not filename:
+            return None
+        path = self.images_dir / Path(filename).name
+        return path if path.is_file() else None
+
+    @staticmethod
+    def region(product):
+        """Body region of a product's garment, or None if it cannot be tried on"""
+        return CATEGORY_REGIONS.get(product.get('category', 'tops'))
+
+    def asset_key(self, product, image_path):
+        """
+        Garment asset key for a product image.
+
+        Includes the image's size and modification time, so replacing the
+        image yields a new key and the asset is prepared again, and the
+        garment's body region.
+        """
+        stat = Path(image_path).stat()
+        identity = f"{product['id']}:{stat.st_size}:{stat.st_mtime_ns}:{self.region(product)}"
+        return hashlib.sha256(identity.encode()).hexdigest()
@@ -25,6 +25,18 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
+    # Bulk wardrobe upload (onboarding): whole-request cap, file count and thumbnail workers
+    BULK_UPLOAD_MAX_BYTES = int(os.getenv('BULK_UPLOAD_MAX_MB', 1024)) * 1024 * 1024
+    BULK_UPLOAD_MAX_FILES = int(os.getenv('BULK_UPLOAD_MAX_FILES', 200))
+    BULK_UPLOAD_WORKERS = int(os.getenv('BULK_UPLOAD_WORKERS', 4))
+    THUMBNAIL_MAX_SIDE = int(os.getenv('THUMBNAIL_MAX_SIDE', 256))
+    
+    # Serving /api/uploads: 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd)
+    # hands the bytes to the front proxy; empty serves them from Flask
+    UPLOAD_SENDFILE = os.getenv('UPLOAD_SENDFILE', '').lower()
+    UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+    UPLOAD_IMMUTABLE_MAX_AGE = int(os.getenv('UPLOAD_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
+    
     # CORS settings
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
     
@@ -32,6 +44,92 @@ class Config:
     USE_GPU = os.getenv('USE_GPU', 'False').lower() in ('true', '1', 't')
     MODEL_CACHE_DIR = Path(__file__).parent.parent / 'ml-models' / 'cache'
     
+    # MediaPipe Pose model complexity (0-2) and pose results kept by image content hash
+    POSE_MODEL_COMPLEXITY = int(os.getenv('POSE_MODEL_COMPLEXITY', 2))
+    POSE_CACHE_SIZE = int(os.getenv('POSE_CACHE_SIZE', 256))
+    
+    # Longest image side fed to each model; larger uploads are downsized first
+    POSE_MAX_SIDE = int(os.getenv('POSE_MAX_SIDE', 1024))
+    GRABCUT_MAX_SIDE = int(os.getenv('GRABCUT_MAX_SIDE', 800))
+    TRYON_MAX_SIDE = int(os.getenv('TRYON_MAX_SIDE', 1280))
+    TRYON_PREVIEW_MAX_SIDE = int(os.getenv('TRYON_PREVIEW_MAX_SIDE', 384))  # progressive try-on previews
+    
+    # GrabCut background removal: iteration limits, convergence tolerance (fraction
+    # of pixels changing label) and full-resolution boundary band (working pixels, 0 = off)
+    GRABCUT_MIN_ITERATIONS = int(os.getenv('GRABCUT_MIN_ITERATIONS', 2))
+    GRABCUT_MAX_ITERATIONS = int(os.getenv('GRABCUT_MAX_ITERATIONS', 5))
+    GRABCUT_TOLERANCE = float(os.getenv('GRABCUT_TOLERANCE', 0.001))
+    GRABCUT_REFINE_BAND = int(os.getenv('GRABCUT_REFINE_BAND', 2))
+    
+    # DeepLabV3 micro-batching: concurrent requests share one forward pass
+    DEEPLAB_MAX_BATCH = int(os.getenv('DEEPLAB_MAX_BATCH', 8))
+    DEEPLAB_MAX_WAIT_MS = float(os.getenv('DEEPLAB_MAX_WAIT_MS', 5))
+    
+    # DeepLabV3 runtime: 'torch' (eager PyTorch) or 'onnx' (ONNX Runtime on CPU,
+    # exported once under MODEL_CACHE_DIR/onnx), optionally with int8 weights
+    DEEPLAB_RUNTIME = os.getenv('DEEPLAB_RUNTIME', 'torch')
+    DEEPLAB_QUANTIZE = os.getenv('DEEPLAB_QUANTIZE', 'False').lower() in ('true', '1', 't')
+    DEEPLAB_ONNX_THREADS = int(os.getenv('DEEPLAB_ONNX_THREADS', 0))  # 0 = one per core
+    
+    # Segmentation latency/quality profile: 'quality' (DeepLabV3 ResNet),
+    # 'balanced' (DeepLabV3 MobileNetV3) or 'fast' (LR-ASPP MobileNetV3, smaller input)
+    SEGMENTATION_PROFILE = os.getenv('SEGMENTATION_PROFILE', 'quality')
+    
+    # Product catalogue (metadata.json + images/) and prepared garment assets kept in memory
+    CATALOGUE_DIR = Path(os.getenv('CATALOGUE_DIR', Path(__file__).parent.parent / 'datasets' / 'product_catalogue'))
+    GARMENT_ASSET_CACHE_SIZE = int(os.getenv('GARMENT_ASSET_CACHE_SIZE', 64))
+    
+    # Most garments composited by one outfit try-on
+    TRYON_MAX_GARMENTS = int(os.getenv('TRYON_MAX_GARMENTS', 5))
+    
+    # Adjustable try-on sessions kept in memory (layers for the fit sliders)
+    TRYON_SESSION_MAX = int(os.getenv('TRYON_SESSION_MAX', 64))
+    TRYON_SESSION_TTL = int(os.getenv('TRYON_SESSION_TTL', 1800))  # seconds idle
+    
+    # Analysed person photos reused across try-ons (person sessions)
+    PERSON_SESSION_MAX = int(os.getenv('PERSON_SESSION_MAX', 32))
+    PERSON_SESSION_TTL = int(os.getenv('PERSON_SESSION_TTL', 3600))  # seconds idle
+    
+    # Live try-on WebSocket: default and highest frame rate, frame size cap,
+    # MediaPipe model complexity, result quality and metrics message interval
+    LIVE_TRYON_TARGET_FPS = float(os.getenv('LIVE_TRYON_TARGET_FPS', 15))
+    LIVE_TRYON_MAX_FPS = float(os.getenv('LIVE_TRYON_MAX_FPS', 30))
+    LIVE_TRYON_MAX_SIDE = int(os.getenv('LIVE_TRYON_MAX_SIDE', 640))
+    LIVE_TRYON_POSE_COMPLEXITY = int(os.getenv('LIVE_TRYON_POSE_COMPLEXITY', 1))
+    LIVE_TRYON_QUALITY = int(os.getenv('LIVE_TRYON_QUALITY', 70))
+    LIVE_TRYON_METRICS_INTERVAL = float(os.getenv('LIVE_TRYON_METRICS_INTERVAL', 1.0))
+    
+    # Inline result images (output=image/base64): default quality and longest side (0 = unlimited)
+    RESULT_IMAGE_QUALITY = int(os.getenv('RESULT_IMAGE_QUALITY', 85))
+    RESULT_MAX_DIMENSION = int(os.getenv('RESULT_MAX_DIMENSION', 0))
+    
+    # Background job settings (async try-on / background removal)
+    JOB_DATABASE = Path(os.getenv('JOB_DATABASE', Path(__file__).parent / 'jobs.db'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    # Where jobs run: 'web' (threads in each web process, for development) or
+    # 'worker' (a separate `python worker.py` process; web processes only queue)
+    JOB_RUNNER = os.getenv('JOB_RUNNER', 'web')
+    # Max SSE stream length (seconds); keep it below the gunicorn worker
+    # timeout. Clients reconnect to continue following the job.
+    JOB_EVENTS_TIMEOUT = int(os.getenv('JOB_EVENTS_TIMEOUT', 60))
+    # Seconds a claimed job stays reserved without a heartbeat before
+    # another process re-queues it
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+    
+    # Result cache for derived images (background removal), LRU-evicted by size
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+    
+    # Upload folder lifecycle: per-class TTLs, total quota and GC interval
+    ARTIFACT_TTL_HOURS = {
+        'temp': float(os.getenv('TEMP_TTL_HOURS', 1)),
+        'job_input': float(os.getenv('JOB_INPUT_TTL_HOURS', 24)),
+        'tryon': float(os.getenv('TRYON_TTL_HOURS', 24)),
+        'adjusted': float(os.getenv('ADJUSTED_TTL_HOURS', 24)),
+        'nobg': float(os.getenv('NOBG_TTL_HOURS', 24)),
+    }
+    STORAGE_QUOTA_BYTES = int(os.getenv('STORAGE_QUOTA_MB', 5120)) * 1024 * 1024
+    STORAGE_GC_INTERVAL = int(os.getenv('STORAGE_GC_INTERVAL', 600))  # seconds, 0 disables
+    
     @staticmethod
     def init_app():
         """Initialize application directories"""
@@ -1,6 +1,8 @@
 """MongoDB database connection and operations"""
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo import MongoClient, ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, DuplicateKeyError, BulkWriteError
+from bson import ObjectId
+from bson.errors import InvalidId
 import logging
 from config import Config
 
@@ -26,6 +28,7 @@ class Database:
             # Get database name from URI or use default
             db_name = Config.MONGODB_URI.split('/')[-1].split('?')[0] or 'stylesense'
             self.db = self.client[db_name]
+            self.ensure_indexes()
             
             logger.info(f"Connected to MongoDB database: {db_name}")
             return True
@@ -46,6 +49,15 @@ class Database:
             raise RuntimeError("Database not connected")
         return self.db[name]
     
+    def ensure_indexes(self):
+        """Create indexes that enforce upload deduplication"""
+        # A user can hold each distinct photo only once
+        self.get_collection('wardrobe').create_index(
+            [('user_id', ASCENDING), ('content_hash', ASCENDING)],
+            unique=True,
+            partialFilterExpression={'content_hash': {'$exists': True}}
+        )
+    
     def insert_wardrobe_item(self, user_id, item_data):
         """Insert a wardrobe item"""
         collection = self.get_collection('wardrobe')
@@ -53,6 +65,144 @@ class Database:
         result = collection.insert_one(item_data)
         return str(result.inserted_id)
     
+    def upsert_wardrobe_item(self, user_id, item_data):
+        """
+        Insert a wardrobe item unless the user already owns one with the same content hash.
+        
+        Returns:
+            tuple: (item_id, created)
+        """
+        collection = self.get_collection('wardrobe')
+        query = {'user_id': user_id, 'content_hash': item_data['content_hash']}
+        fields = {k: v for k, v in item_data.items() if k not in query}
+        
+        try:
+            result = collection.update_one(query, {'$setOnInsert': fields}, upsert=True)
+            if result.upserted_id is not None:
+                return str(result.upserted_id), True
+        except DuplicateKeyError:
+            # Lost the race against an identical concurrent upload
+            pass
+        
+        existing = collection.find_one(query, {'_id': 1})
+        return str(existing['_id']), False
+    
+    def insert_wardrobe_items(self, user_id, items):
+        """
+        Insert many wardrobe items in one round trip.
+        
+        Items whose content the user already owns (including repeats within
+        the batch) are skipped by the unique index and reported as duplicates.
+        
+        Returns:
+            list: (item_id, created) for each item, in order
+        """
+        if not items:
+            return []
+        
+        collection = self.get_collection('wardrobe')
+        documents = [dict(item, user_id=user_id, _id=ObjectId()) for item in items]
+        
+        duplicates = set()
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') != 11000:
+                    raise
+                duplicates.add(error['index'])
+        
+        existing = {}
+        if duplicates:
+            hashes = list({documents[i]['content_hash'] for i in duplicates})
+            for item in collection.find({'user_id': user_id, 'content_hash': {'$in': hashes}}, {'content_hash': 1}):
+                existing[item['content_hash']] = str(item['_id'])
+        
+        return [
+            (existing.get(doc['content_hash']), False) if index in duplicates else (str(doc['_id']), True)
+            for index, doc in enumerate(documents)
+        ]
+    
+    def delete_wardrobe_item(self, user_id, item_id):
+        """Delete a wardrobe item and return the removed document (None if not found)"""
+        collection = self.get_collection('wardrobe')
+        try:
+            object_id = ObjectId(item_id)
+        except InvalidId:
+            return None
+        return collection.find_one_and_delete({'_id': object_id, 'user_id': user_id})
+    
+    def acquire_blob(self, content_hash, blob_data):
+        """Add a reference to a stored blob, creating its record on first use"""
+        collection = self.get_collection('blobs')
+        return collection.find_one_and_update(
+            {'_id': content_hash},
+            {'$inc': {'refcount': 1}, '$setOnInsert': blob_data},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def acquire_blobs(self, blobs):
+        """
+        Add one reference to each of several blobs in a single bulk write.
+        
+        Args:
+            blobs: List of (content_hash, blob_data) tuples; a hash may repeat
+        """
+        if not blobs:
+            return
+        self.get_collection('blobs').bulk_write([
+            UpdateOne(
+                {'_id': content_hash},
+                {'$inc': {'refcount': 1}, '$setOnInsert': blob_data},
+                upsert=True
+            )
+            for content_hash, blob_data in blobs
+        ], ordered=False)
+    
+    def release_blob(self, content_hash):
+        """
+        Drop a reference to a stored blob.
+        
+        Returns:
+            int: Remaining references; 0 means the blob file can be deleted
+        """
+        collection = self.get_collection('blobs')
+        blob = collection.find_one_and_update(
+            {'_id': content_hash},
+            {'$inc': {'refcount': -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            return 0
+        if blob['refcount'] <= 0:
+            collection.delete_one({'_id': content_hash, 'refcount': {'$lte': 0}})
+            return 0
+        return blob['refcount']
+    
+    def get_blob(self, content_hash):
+        """Get the record of a stored blob"""
+        return self.get_collection('blobs').find_one({'_id': content_hash})
+    
+    def get_blobs(self, content_hashes):
+        """Get the records of several stored blobs, keyed by content hash"""
+        collection = self.get_collection('blobs')
+        return {blob['_id']: blob for blob in collection.find({'_id': {'$in': list(content_hashes)}})}
+    
+    def set_blob_result(self, content_hash, name, value):
+        """
+        Store a processing result (background removal, pose, ...) against a
+        stored blob's content hash; content that is not a stored blob is ignored.
+        
+        Returns:
+            bool: Whether a blob record was updated
+        """
+        result = self.get_collection('blobs').update_one(
+            {'_id': content_hash},
+            {'$set': {f'results.{name}': value}}
+        )
+        return result.matched_count > 0
+    
     def get_wardrobe_items(self, user_id):
         """Get all wardrobe items for a user"""
         collection = self.get_collection('wardrobe')
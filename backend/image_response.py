@@ -0,0 +1,127 @@
+"""Encode result images for inline responses, negotiating the format from Accept"""
+import base64
+import cv2
+import numpy as np
+
+# Response format -> (MIME type, OpenCV extension)
+IMAGE_FORMATS = {
+    'webp': ('image/webp', '.webp'),
+    'jpeg': ('image/jpeg', '.jpg'),
+    'png': ('image/png', '.png'),
+}
+
+# How a result is returned: a URL to the stored file, the image bytes as the
+# response body, or a base64 data URL inside the JSON response
+OUTPUT_MODES = ('url', 'image', 'base64')
+
+def negotiate_format(accept_mimetypes, has_alpha, requested=None):
+    """
+    Pick the response format.
+
+    Args:
+        accept_mimetypes: werkzeug MIMEAccept from the request
+        has_alpha: Whether the image has a transparency channel (JPEG is
+            then only used when explicitly requested)
+        requested: Explicit format ('webp', 'jpeg', 'jpg' or 'png'), overrides Accept
+
+    Returns:
+        str: Key into IMAGE_FORMATS
+    """
+    if requested:
+        requested = 'jpeg' if requested.lower() == 'jpg' else requested.lower()
+        if requested not in IMAGE_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(IMAGE_FORMATS)}")
+        return requested
+
+    # Smallest first; best_match keeps this order among equally weighted types
+    candidates = ['webp', 'png'] if has_alpha else ['webp', 'jpeg', 'png']
+    best = accept_mimetypes.best_match([IMAGE_FORMATS[name][0] for name in candidates])
+    for name in candidates:
+        if IMAGE_FORMATS[name][0] == best:
+            return name
+    return 'png'
+
+def parse_output_options(values, default_quality, default_max_dimension):
+    """
+    Read output, format, quality and max_dim from request values.
+
+    Returns:
+        dict: Output options (ValueError on invalid values)
+    """
+    output = values.get('output', 'url').lower()
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"output must be one of: {', '.join(OUTPUT_MODES)}")
+
+    quality = int(values.get('quality', default_quality))
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+
+    max_dimension = int(values.get('max_dim', default_max_dimension or 0)) or None
+    if max_dimension is not None and max_dimension < 16:
+        raise ValueError("max_dim must be at least 16")
+
+    return {
+        'output': output,
+        'format': values.get('format') or None,
+        'quality': quality,
+        'max_dimension': max_dimension
+    }
+
+def limit_dimension(image, max_dimension):
+    """Downscale an image so its longest side is at most max_dimension"""
+    if not max_dimension:
+        return image
+    h, w = image.shape[:2]
+    if max(h, w) <= max_dimension:
+        return image
+    scale = max_dimension / max(h, w)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def encode_image(image, image_format, quality=85, max_dimension=None):
+    """
+    Encode a BGR or BGRA image.
+
+    Args:
+        image: Decoded image
+        image_format: Key into IMAGE_FORMATS
+        quality: 1-100; JPEG/WebP quality, mapped to PNG compression effort
+        max_dimension: Optional cap on the longest side
+
+    Returns:
+        tuple: (encoded bytes, MIME type)
+    """
+    mimetype, extension = IMAGE_FORMATS[image_format]
+    image = limit_dimension(image, max_dimension)
+
+    if image_format == 'jpeg':
+        if image.ndim == 3 and image.shape[2] == 4:
+            # No alpha in JPEG: composite onto white
+            alpha = image[:, :, 3:].astype(np.float32) / 255.0
+            image = (image[:, :, :3] * alpha + 255.0 * (1.0 - alpha)).astype(np.uint8)
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        # PNG is lossless; lower quality spends more CPU on compression
+        params = [cv2.IMWRITE_PNG_COMPRESSION, max(1, min(9, 10 - quality // 10))]
+
+    ok, encoded = cv2.imencode(extension, image, params)
+    if not ok:
+        raise RuntimeError(f"Could not encode result as {image_format}")
+    return encoded.tobytes(), mimetype
+
+def data_url(data, mimetype):
+    """Base64 data URL for encoded image bytes"""
+    return f"data:{mimetype};base64,{base64.b64encode(data).decode('ascii')}"
+
+def decode_data_url(value):
+    """Encoded image bytes from a data URL or bare base64 string (ValueError if invalid)"""
+    if value.startswith('data:'):
+        header, _, value = value.partition(',')
+        if not header.endswith(';base64'):
+            raise ValueError("Only base64 data URLs are supported")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid base64 image: {e}")
@@ -0,0 +1,340 @@
+"""Persistent background job queue for heavy image endpoints"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL,
+    claimed_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+"""
+
+def _worker_id():
+    """Identify a queue instance in the jobs it claims (unique even if pids are reused)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class JobQueue:
+    """
+    Priority job queue persisted in SQLite and processed by a local thread pool.
+
+    Jobs survive worker restarts: queued jobs stay in the database, and a
+    claimed job holds a lease that its queue renews while running it. Jobs
+    whose lease expired (the process died, or its container was replaced)
+    are re-queued by whichever queue claims work next. Several processes can
+    share one database; claiming a job is atomic.
+    """
+
+    def __init__(self, handlers, workers=2, poll_interval=0.5, lease_seconds=60):
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = _worker_id()
+        self._running = set()  # IDs of jobs this queue is running
+        self._db_path = None
+        self._threads = []
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    @property
+    def db_path(self):
+        return self._db_path
+
+    @db_path.setter
+    def db_path(self, db_path):
+        """Use a job database, creating it (WAL mode and schema) once here rather than per connection"""
+        self._db_path = Path(db_path) if db_path is not None else None
+        if self._db_path is None:
+            return
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            columns = {row['name'] for row in connection.execute('PRAGMA table_info(jobs)')}
+            if 'claimed_until' not in columns:
+                # Databases created before leases
+                connection.execute('ALTER TABLE jobs ADD COLUMN claimed_until REAL')
+        finally:
+            connection.close()
+
+    def start(self, db_path):
+        """Open the job database, recover orphaned jobs and start the worker threads"""
+        with self._start_lock:
+            if self.started:
+                return
+            self.db_path = db_path
+            self._stop.clear()
+            self.recover()
+
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"job-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+            heartbeat.start()
+            self._threads.append(heartbeat)
+            logger.info(f"Job queue started with {self.workers} workers: {self.db_path}")
+
+    def stop(self, timeout=5):
+        """Stop the worker threads (running jobs finish first)"""
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, kind, payload, priority=0):
+        """
+        Queue a job.
+
+        Args:
+            kind: Name of a registered handler
+            payload: JSON-serializable handler arguments
+            priority: Higher values are processed first
+
+        Returns:
+            dict: The queued job
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute(
+                'INSERT INTO jobs (id, kind, status, priority, payload, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued', int(priority), json.dumps(payload), now, now)
+            )
+        finally:
+            connection.close()
+
+        self._notify()
+        logger.info(f"Queued {kind} job {job_id} (priority={priority})")
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Get a job by ID (None if unknown)"""
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            connection.close()
+        return self._to_dict(row) if row else None
+
+    def _to_dict(self, row):
+        job = {
+            'id': row['id'],
+            'type': row['kind'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'updated_at': row['updated_at']
+        }
+        if row['result']:
+            job['result'] = json.loads(row['result'])
+        if row['error']:
+            job['error'] = row['error']
+        if row['status'] == 'queued':
+            job['queue_position'] = self._queue_position(row)
+        return job
+
+    def _queue_position(self, row):
+        connection = self._connect()
+        try:
+            ahead = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (row['priority'], row['priority'], row['created_at'])
+            ).fetchone()[0]
+        finally:
+            connection.close()
+        return ahead
+
+    def counts(self):
+        """Number of jobs per status"""
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        finally:
+            connection.close()
+        return {status: count for status, count in rows}
+
+    def wait_for_update(self, job_id, since, timeout):
+        """
+        Block until a job changes after the given updated_at timestamp.
+
+        Returns:
+            dict: The job (possibly unchanged if the timeout expired)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['updated_at'] > since or job['status'] in TERMINAL_STATUSES:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            # Local workers notify immediately; jobs run by other processes are polled
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def recover(self):
+        """Re-queue running jobs whose lease has expired"""
+        connection = self._connect()
+        try:
+            orphaned = self._requeue_expired(connection)
+        finally:
+            connection.close()
+        return orphaned
+
+    def _requeue_expired(self, connection):
+        now = time.time()
+        orphaned = connection.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL, claimed_until = NULL, "
+            "updated_at = ? WHERE status = 'running' AND (claimed_until IS NULL OR claimed_until < ?)",
+            (now, now)
+        ).rowcount
+        if orphaned:
+            logger.warning(f"Re-queued {orphaned} jobs whose worker stopped renewing their lease")
+        return orphaned
+
+    def _claim_next(self):
+        """Atomically move the highest-priority queued job to 'running'"""
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            self._requeue_expired(connection)
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, updated_at = ?, "
+                "claimed_until = ? WHERE id = ?",
+                (self.worker_id, now, now, now + self.lease_seconds, row['id'])
+            )
+            self._running.add(row['id'])
+            connection.execute('COMMIT')
+            return row
+        except Exception:
+            # BEGIN itself may have failed (e.g. locked), leaving nothing to roll back
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ?, '
+                'claimed_until = NULL WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, now, now, job_id)
+            )
+        finally:
+            connection.close()
+            self._running.discard(job_id)
+        self._notify()
+
+    def renew_leases(self):
+        """Extend the lease of every job this queue is running"""
+        running = list(self._running)
+        if not running:
+            return
+        connection = self._connect()
+        try:
+            connection.executemany(
+                "UPDATE jobs SET claimed_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                [(time.time() + self.lease_seconds, job_id, self.worker_id) for job_id in running]
+            )
+        finally:
+            connection.close()
+
+    def _heartbeat_loop(self):
+        # Renew well before expiry so a slow renewal does not lose the lease
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew_leases()
+            except Exception as e:
+                logger.error(f"Failed to renew job leases: {e}")
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                row = self._claim_next()
+            except Exception as e:
+                logger.error(f"Failed to claim job: {e}")
+                row = None
+
+            if row is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+
+            self._notify()
+            self._run(row)
+
+    def _run(self, row):
+        job_id, kind = row['id'], row['kind']
+        started = time.monotonic()
+        try:
+            result = self.handlers[kind](json.loads(row['payload']))
+            self._finish(job_id, 'done', result=result)
+            logger.info(f"Job {job_id} ({kind}) done in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {e}")
+            self._finish(job_id, 'failed', error=str(e))
@@ -68,6 +68,16 @@ class UserProfile:
         if not isinstance(pose_data, dict):
             raise ValueError("Pose data must be a dictionary")
         
+        # Masks are stored encoded (mask_codec.encode_mask), never as raw arrays;
+        # a plain COCO RLE dict has no 'encoding' and is stored as 'rle'
+        mask = pose_data.get('segmentation_mask')
+        if mask is not None:
+            encoding = mask.get('encoding', 'rle') if isinstance(mask, dict) else None
+            required = {'rle': 'counts', 'png': 'data'}.get(encoding)
+            if required is None or 'size' not in mask or required not in mask:
+                raise ValueError("Segmentation mask must be an encoded mask (rle or png)")
+            pose_data['segmentation_mask'] = {**mask, 'encoding': encoding}
+        
         # Limit number of pose references
         if len(self.pose_references) >= 10:
             self.pose_references.pop(0)  # Remove oldest
@@ -0,0 +1,168 @@
+"""Persistent cache for derived images (e.g. background-removed PNGs)"""
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.storage import shard_path
+
+logger = logging.getLogger(__name__)
+
+def cache_key(content_hash, method, model_version, extension='png'):
+    """File name for a cached result of (content hash, method, model version)"""
+    method, model_version = (re.sub(r'[^A-Za-z0-9.-]', '-', part) for part in (method, model_version))
+    return f"{content_hash}_{method}_{model_version}.{extension}"
+
+class ResultCache:
+    """
+    On-disk result cache with LRU eviction bounded by total bytes.
+
+    Entries are plain files in a hash-sharded tree, so the cache survives
+    restarts and is shared by every process using the directory; recency is
+    kept in file modification times. Entries written by other processes are
+    adopted on lookup, and the index is re-read from disk before evicting, so
+    the byte limit applies to the directory, not to each process. Concurrent
+    requests for the same key in one process share a single computation.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = None  # name -> size, least recently used first
+        self._total_bytes = 0
+        self._inflight = {}   # name -> threading.Event
+
+    def path_for(self, name):
+        """Location of a cache entry"""
+        return shard_path(self.directory, name)
+
+    def _load(self, rescan=False):
+        """Build the LRU index from the files already on disk"""
+        if self._entries is not None and not rescan:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                stat = (Path(dirpath) / filename).stat()
+                files.append((stat.st_mtime_ns, filename, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._total_bytes = sum(self._entries.values())
+
+    def _lookup(self, name):
+        """Return the cached path and mark it recently used (lock must be held)"""
+        path = self.path_for(name)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            if name in self._entries:
+                # Removed behind our back (another process or GC)
+                self._total_bytes -= self._entries.pop(name)
+            return None
+        if name not in self._entries:
+            # Written by another process sharing the directory
+            self._entries[name] = size
+            self._total_bytes += size
+        self._entries.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get(self, name):
+        """Get the path of a cached result, or None"""
+        with self._lock:
+            self._load()
+            path = self._lookup(name)
+            if path is not None:
+                self.hits += 1
+            return path
+
+    def get_or_create(self, name, compute):
+        """
+        Return a cached result, computing it at most once per key.
+
+        Args:
+            name: Cache key (see cache_key)
+            compute: Callable that writes the result to the path it is given
+                and returns a truthy value on success
+
+        Returns:
+            tuple: (path, cached) where cached tells whether it was a hit
+        """
+        while True:
+            with self._lock:
+                self._load()
+                path = self._lookup(name)
+                if path is not None:
+                    self.hits += 1
+                    return path, True
+
+                event = self._inflight.get(name)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self._inflight[name] = event
+
+            if owner:
+                break
+            # Another request is computing this key; use its result
+            event.wait()
+
+        path = self.path_for(name)
+        temp_path = path.parent / f".tmp_{uuid.uuid4().hex}_{name}"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not compute(temp_path) or not temp_path.exists():
+                raise RuntimeError(f"Failed to compute cached result: {name}")
+
+            os.replace(temp_path, path)
+            with self._lock:
+                self.misses += 1
+                # Other processes add and evict entries too; only the files
+                # on disk give the directory's true size and recency order
+                self._load(rescan=True)
+                self._evict(keep=name)
+            return path, False
+
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+            with self._lock:
+                self._inflight.pop(name, None)
+            event.set()
+
+    def _evict(self, keep=None):
+        """Delete least recently used entries until under max_bytes (lock must be held)"""
+        for name in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self._total_bytes -= self._entries.pop(name)
+            try:
+                self.path_for(name).unlink()
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted cached result: {name}")
+
+    def stats(self):
+        """Cache size and hit counters"""
+        with self._lock:
+            self._load()
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,63 @@
+"""In-memory session registry for interactive try-on state"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """
+    Thread-safe registry of live objects (try-on layers, analysed photos)
+    under random IDs, bounded by count and idle time.
+
+    Sessions live in the worker process that created them, which is why the
+    deploy runs a single threaded web worker; behind several workers, route
+    a client's requests to the same worker (sticky sessions).
+    """
+
+    def __init__(self, max_entries=64, ttl_seconds=1800):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # id -> (value, last used), least recently used first
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """Drop idle and surplus sessions (lock must be held)"""
+        while self._entries:
+            session_id, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl_seconds and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[session_id]
+            logger.debug(f"Expired session {session_id}")
+
+    def create(self, value):
+        """Register a value and return its new session ID"""
+        session_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._entries[session_id] = (value, now)
+            self._expire(now)
+        return session_id
+
+    def get(self, session_id):
+        """Value of a session, or None if unknown or expired; refreshes its idle timer"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries[session_id] = (entry[0], now)
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def delete(self, session_id):
+        """Remove a session; returns whether it existed"""
+        with self._lock:
+            return self._entries.pop(session_id, None) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
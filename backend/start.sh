@@ -27,19 +27,28 @@ fi
 PORT=${PORT:-5000}
 echo "🔌 Using PORT: $PORT"
 
-# Set default number of workers (2 * CPU cores + 1)
-WORKERS=${WORKERS:-4}
+# Set default number of workers. Keep one: try-on, render and person sessions
+# live in process memory, so a second worker would 404 their follow-up
+# requests unless the proxy routes each client to the same worker
+WORKERS=${WORKERS:-1}
 echo "👷 Using $WORKERS workers"
 
 # Set worker timeout (important for ML model operations)
 TIMEOUT=${TIMEOUT:-120}
 echo "⏱️  Worker timeout: ${TIMEOUT}s"
 
-# Set worker class (sync for simple CPU-bound tasks)
-# For ML/IO-heavy operations, consider 'gevent' or 'eventlet'
-# Install with: pip install gevent or pip install eventlet
-WORKER_CLASS=${WORKER_CLASS:-sync}
-echo "🔧 Worker class: $WORKER_CLASS"
+# Set worker class: threaded workers keep long requests (SSE job streams)
+# from blocking a whole worker or tripping the worker timeout
+WORKER_CLASS=${WORKER_CLASS:-gthread}
+THREADS=${THREADS:-16}
+echo "🔧 Worker class: $WORKER_CLASS ($THREADS threads)"
+
+# Run background jobs in their own process rather than in the web workers
+export JOB_RUNNER=${JOB_RUNNER:-worker}
+if [ "$JOB_RUNNER" = "worker" ]; then
+    echo "🧵 Starting job runner..."
+    python worker.py &
+fi
 
 # Start Gunicorn with optimized settings for Railway
 echo "✨ Starting Gunicorn..."
@@ -47,6 +56,7 @@ exec gunicorn \
     --bind 0.0.0.0:$PORT \
     --workers $WORKERS \
     --worker-class $WORKER_CLASS \
+    --threads $THREADS \
     --timeout $TIMEOUT \
     --access-logfile - \
     --error-logfile - \
@@ -0,0 +1,388 @@
+"""Upload storage: content-addressed blobs, sharded layout, TTL garbage collection and quotas"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Read uploads in 64KB chunks while hashing
+CHUNK_SIZE = 64 * 1024
+HASH_ALGORITHM = 'sha256'
+
+# Artifact classes and whether the quota may evict them. Wardrobe photos are
+# user data and reference counted, so only their owner can delete them.
+ARTIFACT_CLASSES = {
+    'wardrobe': {'evictable': False},
+    'cache': {'evictable': True},
+    'tryon': {'evictable': True},
+    'adjusted': {'evictable': True},
+    'nobg': {'evictable': True},
+    'job_input': {'evictable': False},
+    'thumbnail': {'evictable': False},
+    'temp': {'evictable': True},
+}
+
+# Files written to the flat upload folder before the sharded layout existed
+LEGACY_PREFIXES = (
+    ('temp_', 'temp'),
+    ('tryon_result_', 'tryon'),
+    ('adjusted_', 'adjusted'),
+    ('nobg_', 'nobg'),
+    ('job_', 'job_input'),
+)
+
+class StoredBlob:
+    """Result of storing a stream under its content hash"""
+
+    def __init__(self, content_hash, path, size, created, temp_name=None):
+        self.content_hash = content_hash
+        self.path = Path(path)
+        self.size = size
+        self.created = created
+        self.temp_name = temp_name  # The upload's own copy of a reused blob, until settled
+
+    @property
+    def filename(self):
+        return self.path.name
+
+def hash_bytes(data):
+    """Content hash of an in-memory buffer"""
+    return hashlib.new(HASH_ALGORITHM, data).hexdigest()
+
+def blob_filename(content_hash, extension):
+    """File name of a blob stored under its content hash"""
+    return f"{content_hash}.{extension.lower()}"
+
+# <sha256>.<ext> blobs and thumbnails, <sha256>_<method>_<version>.<ext> cached results
+CONTENT_ADDRESSED_NAME = re.compile(r'^([0-9a-f]{64})(_[A-Za-z0-9.-]+)*\.[A-Za-z0-9]+$')
+
+def content_address(name):
+    """
+    Identity of a content-addressed file name, or None for other files.
+
+    The bytes behind such a name never change, so it can be cached forever.
+    """
+    match = CONTENT_ADDRESSED_NAME.match(name)
+    return name.rsplit('.', 1)[0] if match else None
+
+def shard_path(directory, name, key=None):
+    """
+    Two-level hash-sharded location of a file: <directory>/ab/cd/<name>.
+
+    Args:
+        directory: Root directory of the artifact class
+        name: File name
+        key: Hex digest to shard by (defaults to a hash of the name)
+    """
+    key = key or hashlib.md5(name.encode('utf-8')).hexdigest()
+    return Path(directory) / key[0:2] / key[2:4] / name
+
+def classify_legacy_file(name):
+    """Artifact class of a file in the flat legacy layout"""
+    for prefix, artifact_class in LEGACY_PREFIXES:
+        if name.startswith(prefix):
+            return artifact_class
+    if name.endswith('_nobg.png'):
+        return 'nobg'
+    return 'wardrobe'
+
+def delete_blob(path, still_referenced=None):
+    """
+    Remove a blob file once nothing references it any more.
+
+    The file is first moved aside. If still_referenced() then reports a new
+    reference (a concurrent upload of the same content), it is put back.
+
+    Args:
+        path: Blob file
+        still_referenced: Callable checked after the file is moved aside
+
+    Returns:
+        bool: Whether the file was deleted
+    """
+    path = Path(path)
+    tombstone = path.with_name(f".deleted_{uuid.uuid4().hex}_{path.name}")
+    try:
+        os.replace(path, tombstone)
+    except FileNotFoundError:
+        return False
+
+    if still_referenced is not None and still_referenced():
+        try:
+            os.link(tombstone, path)
+        except FileExistsError:
+            pass  # Stored again meanwhile
+        os.unlink(tombstone)
+        logger.info(f"Kept blob referenced again during delete: {path.name}")
+        return False
+
+    os.unlink(tombstone)
+    logger.info(f"Deleted unreferenced blob: {path.name}")
+    return True
+
+class IncomingBlob:
+    """
+    A blob being written chunk by chunk, hashed as it arrives.
+
+    Call commit() once all data is written to move it to its content-addressed
+    location, or discard() to drop it.
+    """
+
+    def __init__(self, storage, extension, artifact_class='wardrobe'):
+        self.storage = storage
+        self.extension = extension
+        self.artifact_class = artifact_class
+        self.size = 0
+        self._hasher = hashlib.new(HASH_ALGORITHM)
+
+        directory = storage.class_dir(artifact_class)
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.temp_name = tempfile.mkstemp(dir=directory, prefix='.incoming_')
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, hold=False):
+        """Finish the write and return the StoredBlob (see StorageManager.commit_temp for hold)"""
+        self._file.close()
+        return self.storage.commit_temp(
+            self.temp_name, self._hasher.hexdigest(), self.size, self.extension, self.artifact_class, hold
+        )
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_name):
+            os.unlink(self.temp_name)
+
+class StorageManager:
+    """
+    Manages the upload folder layout and lifecycle.
+
+    Each artifact class lives in its own hash-sharded tree under the root.
+    A garbage collector deletes files older than their class TTL and, when
+    the folder exceeds its quota, evicts the least recently used files of
+    evictable classes.
+    """
+
+    def __init__(self, root, ttl_hours=None, quota_bytes=None):
+        self.root = Path(root)
+        self.ttl_seconds = {
+            name: hours * 3600 for name, hours in (ttl_hours or {}).items() if hours
+        }
+        self.quota_bytes = quota_bytes
+        self.last_gc = None
+        self._metrics = None
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+        self._gc_lock = threading.Lock()
+
+    def class_dir(self, artifact_class):
+        """Root directory of an artifact class"""
+        if artifact_class not in ARTIFACT_CLASSES:
+            raise ValueError(f"Unknown artifact class: {artifact_class}")
+        return self.root / artifact_class
+
+    def path_for(self, artifact_class, name, key=None):
+        """Sharded path for a new artifact (parent directories are created)"""
+        path = shard_path(self.class_dir(artifact_class), name, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def relative_path(self, path):
+        """Path of an artifact relative to the storage root (used in URLs)"""
+        return Path(path).relative_to(self.root).as_posix()
+
+    def store_content(self, stream, extension, artifact_class='wardrobe', hold=False):
+        """
+        Store a stream under its content hash, hashing it while it is read.
+
+        The data is written once to a temporary file and atomically renamed
+        into its sharded location. If a blob with the same hash already
+        exists the temporary file is discarded, so identical uploads are
+        stored only once.
+
+        Args:
+            stream: Readable binary stream (e.g. an uploaded file's stream)
+            extension: File extension for the stored blob
+            artifact_class: Artifact class to store under
+            hold: Keep the upload's copy of an existing blob until settle()
+
+        Returns:
+            StoredBlob: Hash, final path, size and whether a new file was written
+        """
+        incoming = self.open_incoming(extension, artifact_class)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                incoming.write(chunk)
+            return incoming.commit(hold)
+
+        except Exception:
+            incoming.discard()
+            raise
+
+    def open_incoming(self, extension, artifact_class='wardrobe'):
+        """Start writing a blob whose data arrives in chunks (see IncomingBlob)"""
+        return IncomingBlob(self, extension, artifact_class)
+
+    def commit_temp(self, temp_name, content_hash, size, extension, artifact_class='wardrobe', hold=False):
+        """
+        Move a fully written temporary file to its content-addressed location.
+
+        With hold, a temporary file whose blob already exists is kept on the
+        StoredBlob until settle(), so the blob can be restored if the last
+        reference to it is deleted before this upload's reference is recorded.
+        """
+        final_path = self.path_for(artifact_class, blob_filename(content_hash, extension), key=content_hash)
+
+        # Linking fails if the blob exists, so exactly one of several
+        # concurrent identical uploads sees created=True
+        try:
+            os.link(temp_name, final_path)
+            created = True
+        except FileExistsError:
+            created = False
+        if created or not hold:
+            os.unlink(temp_name)
+            temp_name = None
+
+        return StoredBlob(content_hash, final_path, size, created, temp_name)
+
+    def settle(self, blob, restore=True):
+        """
+        Drop the copy held for a blob once its reference is recorded (or the
+        upload was rejected, with restore=False).
+
+        A delete that released the blob's last reference concurrently may
+        have removed the file; it is restored from the copy.
+        """
+        if blob is None or blob.temp_name is None:
+            return
+        try:
+            if restore:
+                os.link(blob.temp_name, blob.path)
+                logger.info(f"Restored blob deleted during upload: {blob.filename}")
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(blob.temp_name)
+            blob.temp_name = None
+
+    def _iter_files(self):
+        """Yield (artifact_class, path, stat) for every managed file"""
+        if not self.root.exists():
+            return
+        for entry in os.scandir(self.root):
+            if entry.is_file():
+                if not entry.name.startswith('.') and entry.name.rsplit('.', 1)[-1] not in ('db', 'db-wal', 'db-shm'):
+                    yield classify_legacy_file(entry.name), Path(entry.path), entry.stat()
+            elif entry.is_dir() and entry.name in ARTIFACT_CLASSES:
+                for dirpath, _, filenames in os.walk(entry.path):
+                    for filename in filenames:
+                        path = Path(dirpath) / filename
+                        try:
+                            yield entry.name, path, path.stat()
+                        except FileNotFoundError:
+                            continue
+
+    def collect_garbage(self, now=None):
+        """
+        Delete expired artifacts, then enforce the quota.
+
+        Returns:
+            dict: Files and bytes removed, by reason
+        """
+        with self._gc_lock:
+            now = now or time.time()
+            removed = {'expired_files': 0, 'expired_bytes': 0, 'evicted_files': 0, 'evicted_bytes': 0}
+            metrics = {name: {'files': 0, 'bytes': 0} for name in ARTIFACT_CLASSES}
+            evictable = []
+
+            for artifact_class, path, stat in self._iter_files():
+                ttl = self.ttl_seconds.get(artifact_class)
+                # Stale temporary files from interrupted writes
+                abandoned = path.name.startswith(('.incoming_', '.tmp_', '.deleted_')) and now - stat.st_mtime > 3600
+                if abandoned or (ttl and now - stat.st_mtime > ttl):
+                    if self._unlink(path):
+                        removed['expired_files'] += 1
+                        removed['expired_bytes'] += stat.st_size
+                    continue
+
+                metrics[artifact_class]['files'] += 1
+                metrics[artifact_class]['bytes'] += stat.st_size
+                if ARTIFACT_CLASSES[artifact_class]['evictable']:
+                    evictable.append((stat.st_mtime, stat.st_size, artifact_class, path))
+
+            total = sum(m['bytes'] for m in metrics.values())
+            if self.quota_bytes and total > self.quota_bytes:
+                # Least recently used first
+                for _, size, artifact_class, path in sorted(evictable, key=lambda item: item[0]):
+                    if total <= self.quota_bytes:
+                        break
+                    if self._unlink(path):
+                        total -= size
+                        metrics[artifact_class]['files'] -= 1
+                        metrics[artifact_class]['bytes'] -= size
+                        removed['evicted_files'] += 1
+                        removed['evicted_bytes'] += size
+
+            self._metrics = metrics
+            self.last_gc = {'finished_at': time.time(), 'duration': time.time() - now, **removed}
+            if removed['expired_files'] or removed['evicted_files']:
+                logger.info(f"Storage GC removed {removed}")
+            return removed
+
+    def _unlink(self, path):
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def metrics(self, refresh=False):
+        """Files and bytes per artifact class, as of the last scan"""
+        if refresh or self._metrics is None:
+            metrics = {name: {'files': 0, 'bytes': 0} for name in ARTIFACT_CLASSES}
+            for artifact_class, _, stat in self._iter_files():
+                metrics[artifact_class]['files'] += 1
+                metrics[artifact_class]['bytes'] += stat.st_size
+            self._metrics = metrics
+
+        total_bytes = sum(m['bytes'] for m in self._metrics.values())
+        return {
+            'classes': self._metrics,
+            'total_files': sum(m['files'] for m in self._metrics.values()),
+            'total_bytes': total_bytes,
+            'quota_bytes': self.quota_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'last_gc': self.last_gc
+        }
+
+    def start_gc(self, interval):
+        """Run garbage collection every `interval` seconds in a daemon thread"""
+        if self._gc_thread is not None or not interval:
+            return
+
+        def run():
+            while not self._gc_stop.wait(interval):
+                try:
+                    self.collect_garbage()
+                except Exception as e:
+                    logger.error(f"Storage GC failed: {e}")
+
+        self._gc_thread = threading.Thread(target=run, name='storage-gc', daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self):
+        self._gc_stop.set()
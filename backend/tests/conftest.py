@@ -0,0 +1,21 @@
+"""Shared pytest setup for the backend tests"""
+import importlib.util
+import sys
+from pathlib import Path
+
+def load_ml_models():
+    """Import the ml-models directory as the ml_models package, as deployed"""
+    if 'ml_models' in sys.modules:
+        return sys.modules['ml_models']
+    root = Path(__file__).resolve().parent.parent.parent / 'ml-models'
+    spec = importlib.util.spec_from_file_location(
+        'ml_models', root / '__init__.py', submodule_search_locations=[str(root)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ml_models'] = module
+    spec.loader.exec_module(module)
+    return module
+
+# Registered before backend.app is imported, so the app's ML imports resolve
+# and ML tests run (or are reported as skipped) instead of silently passing
+load_ml_models()
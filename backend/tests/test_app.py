@@ -17,11 +17,15 @@ def client():
     app.config['TESTING'] = True
     Config.UPLOAD_FOLDER = Path(__file__).parent / 'test_uploads'
     Config.UPLOAD_FOLDER.mkdir(exist_ok=True)
+    Config.JOB_DATABASE = Config.UPLOAD_FOLDER / 'jobs.db'
     
     with app.test_client() as client:
         yield client
     
-    # Cleanup
+    # Cleanup; the job queue is reopened on the next test's fresh database
+    from backend.app import job_queue
+    job_queue.stop()
+    job_queue.db_path = None
     import shutil
     if Config.UPLOAD_FOLDER.exists():
         shutil.rmtree(Config.UPLOAD_FOLDER)
@@ -122,3 +126,596 @@ def test_ar_tryon_missing_files(client):
     
     data = json.loads(response.data)
     assert 'error' in data
+
+def test_ar_tryon_rejects_adjustable_progressive(client):
+    """Test a preview and an adjustable session cannot be requested together"""
+    data = {
+        'person_image': (BytesIO(_encoded_image()), 'person.png'),
+        'garment_image': (BytesIO(_encoded_image(32, 32, '.jpg')), 'garment.jpg'),
+        'adjustable': 'true',
+        'progressive': 'true'
+    }
+    response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'progressive' in json.loads(response.data)['error']
+
+def _encoded_image(width=64, height=96, ext='.png'):
+    """Encode a small synthetic person-like image"""
+    import cv2
+    import numpy as np
+    
+    img = np.full((height, width, 3), 200, dtype=np.uint8)
+    cv2.rectangle(img, (width // 4, height // 4), (3 * width // 4, 3 * height // 4), (100, 100, 200), -1)
+    return cv2.imencode(ext, img)[1].tobytes()
+
+def test_background_remove_writes_no_temp_files(client):
+    """Test background removal only persists the result artifact"""
+    data = {'file': (BytesIO(_encoded_image()), 'person.png')}
+    response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    
+    result = json.loads(response.data)
+    assert result['success'] is True
+    
+    stored = [p.name for p in Config.UPLOAD_FOLDER.iterdir()]
+    assert not any(name.startswith('temp_') for name in stored)
+    assert (Config.UPLOAD_FOLDER / result['image_url'][len('/api/uploads/'):]).exists()
+
+def test_background_remove_reuses_cached_result(client):
+    """Test a repeat request for the same photo is served from the result cache"""
+    from backend.app import ML_AVAILABLE
+    
+    image = _encoded_image()
+    results = []
+    for _ in range(2):
+        data = {'file': (BytesIO(image), 'person.png'), 'method': 'grabcut'}
+        response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+        results.append(json.loads(response.data))
+    
+    if not ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+    assert results[0]['cached'] is False
+    assert results[1]['cached'] is True
+    assert results[0]['image_url'] == results[1]['image_url']
+
+def test_background_remove_failure_not_cached_as_deeplab(client, monkeypatch):
+    """Test a failed DeepLabV3 run is cached under the GrabCut key that produced it"""
+    from backend.app import ML_AVAILABLE, get_background_cache
+    if not ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+    from ml_models import body_detection, deeplab
+    
+    def broken_model(image, task='background'):
+        raise RuntimeError('model failed')
+    
+    monkeypatch.setattr(body_detection, 'DEEPLABV3_AVAILABLE', True)
+    monkeypatch.setattr(deeplab, 'person_mask', broken_model)
+    data = {'file': (BytesIO(_encoded_image()), 'person.png')}
+    response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    
+    url = json.loads(response.data)['image_url']
+    assert '_grabcut_' in url and '_deeplabv3_' not in url
+    cache = get_background_cache()
+    assert not list(cache.directory.rglob('*_deeplabv3_*'))
+
+def test_background_remove_invalid_method(client):
+    """Test unknown background removal methods are rejected"""
+    data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'method': 'magic'}
+    response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+def test_ar_tryon_in_memory(client):
+    """Test AR try-on decodes uploads without temp files"""
+    data = {
+        'person_image': (BytesIO(_encoded_image()), 'person.png'),
+        'garment_image': (BytesIO(_encoded_image(32, 32, '.jpg')), 'garment.jpg')
+    }
+    response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    
+    result = json.loads(response.data)
+    stored = [p.name for p in Config.UPLOAD_FOLDER.rglob('*')]
+    assert not any(name.startswith('temp_') for name in stored)
+    assert (Config.UPLOAD_FOLDER / result['result_url'][len('/api/uploads/'):]).exists()
+
+def test_ar_tryon_inline_image(client):
+    """Test try-on can return the encoded image in the response body"""
+    data = {
+        'person_image': (BytesIO(_encoded_image(600, 900)), 'person.png'),
+        'garment_image': (BytesIO(_encoded_image(32, 32, '.jpg')), 'garment.jpg'),
+        'output': 'image',
+        'max_dim': '300'
+    }
+    response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data',
+                           headers={'Accept': 'image/jpeg,image/png;q=0.8'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'Accept' in response.headers['Vary']
+    assert response.headers['X-Result-Method'] in ('ml', 'fallback')
+    
+    import cv2
+    import numpy as np
+    result = cv2.imdecode(np.frombuffer(response.data, np.uint8), cv2.IMREAD_COLOR)
+    assert max(result.shape[:2]) == 300
+    assert not list(Config.UPLOAD_FOLDER.rglob('tryon_result_*'))
+
+def test_ar_tryon_catalogue_product(client, monkeypatch, tmp_path):
+    """Test try-on by catalogue product ID prepares the garment once"""
+    from backend.app import ML_AVAILABLE
+    
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'shirt.jpg').write_bytes(_encoded_image(48, 64, '.jpg'))
+    (tmp_path / 'metadata.json').write_text(json.dumps({
+        'products': [{'id': 'prod-0001', 'image_filename': 'shirt.jpg'}, {'id': 'prod-0002'}]
+    }))
+    monkeypatch.setattr(Config, 'CATALOGUE_DIR', tmp_path)
+    
+    for _ in range(2):
+        data = {'person_image': (BytesIO(_encoded_image()), 'person.png'), 'product_id': 'prod-0001'}
+        response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+    
+    for product_id in ('prod-0002', 'prod-9999'):
+        data = {'person_image': (BytesIO(_encoded_image()), 'person.png'), 'product_id': product_id}
+        response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+        assert response.status_code == 404
+    
+    if not ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+    from backend.app import get_garment_store
+    assert get_garment_store().stats()['misses'] == 1
+    assert list((Config.UPLOAD_FOLDER / 'cache' / 'garments').rglob('*.npz'))
+
+def test_ar_tryon_outfit(client, monkeypatch, tmp_path):
+    """Test an outfit of catalogue and uploaded garments is composited in one request"""
+    (tmp_path / 'images').mkdir()
+    for name in ('trousers.jpg', 'shirt.jpg', 'shoes.jpg'):
+        (tmp_path / 'images' / name).write_bytes(_encoded_image(48, 64, '.jpg'))
+    (tmp_path / 'metadata.json').write_text(json.dumps({'products': [
+        {'id': 'prod-0001', 'category': 'bottoms', 'image_filename': 'trousers.jpg'},
+        {'id': 'prod-0002', 'category': 'tops', 'image_filename': 'shirt.jpg'},
+        {'id': 'prod-0003', 'category': 'shoes', 'image_filename': 'shoes.jpg'},
+    ]}))
+    monkeypatch.setattr(Config, 'CATALOGUE_DIR', tmp_path)
+
+    def post(garments, **files):
+        data = {'person_image': (BytesIO(_encoded_image(120, 160)), 'person.png'), 'garments': json.dumps(garments)}
+        data.update({name: (BytesIO(_encoded_image(48, 64, '.jpg')), f'{name}.jpg') for name in files})
+        return client.post('/api/ar-tryon/outfit', data=data, content_type='multipart/form-data')
+
+    response = post([{'product_id': 'prod-0001'}, {'product_id': 'prod-0002'},
+                     {'file': 'jacket', 'region': 'upper'}], jacket=True)
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert result['garments'] == 3
+    assert (Config.UPLOAD_FOLDER / result['result_url'][len('/api/uploads/'):]).exists()
+
+    assert post([{'product_id': 'prod-0003'}]).status_code == 400
+    assert post([{'product_id': 'prod-9999'}]).status_code == 404
+    assert post([{'file': 'missing'}]).status_code == 400
+    assert post([]).status_code == 400
+
+def test_person_session_tryons(client, monkeypatch):
+    """Test a person photo is analysed once and reused by later try-ons"""
+    from backend import app as app_module
+
+    data = {'person_image': (BytesIO(_encoded_image(120, 160)), 'person.png')}
+    response = client.post('/api/person-sessions', data=data, content_type='multipart/form-data')
+    if not app_module.ML_AVAILABLE:
+        assert response.status_code == 503
+        pytest.skip('ML modules not available')
+    assert response.status_code == 201
+    session_id = json.loads(response.data)['person_session_id']
+    assert json.loads(client.get(f'/api/person-sessions/{session_id}').data)['analysis']['image_size'] == [120, 160]
+
+    def no_pose(image):
+        raise AssertionError('person analysed again')
+    monkeypatch.setattr(app_module, 'person_keypoints', no_pose)
+
+    for _ in range(2):
+        data = {'person_session_id': session_id, 'garment_image': (BytesIO(_encoded_image(48, 64, '.jpg')), 'shirt.jpg'),
+                'output': 'image', 'format': 'png'}
+        response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.mimetype == 'image/png'
+
+    assert client.delete(f'/api/person-sessions/{session_id}').status_code == 200
+    data = {'person_session_id': session_id, 'garment_image': (BytesIO(_encoded_image(48, 64, '.jpg')), 'shirt.jpg')}
+    assert client.post('/api/ar-tryon', data=data, content_type='multipart/form-data').status_code == 404
+
+def test_detect_pose_encodes_mask(client, monkeypatch):
+    """Test the pose segmentation mask is returned encoded, not as a raw array"""
+    import numpy as np
+    from backend import app as app_module
+
+    data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'mask_encoding': 'bitmap'}
+    assert client.post('/api/body-shape/detect-pose', data=data,
+                       content_type='multipart/form-data').status_code == 400
+    if not app_module.ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+    from ml_models.mask_codec import decode_mask
+
+    mask = np.zeros((48, 64), dtype=np.uint8)
+    mask[10:40, 20:44] = 255
+    monkeypatch.setattr(app_module, 'analyze_pose',
+                        lambda image: ({'keypoints': [], 'segmentation_mask': mask.copy(), 'method': 'test'}, None))
+
+    for encoding in ('rle', 'png'):
+        data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'mask_encoding': encoding}
+        response = client.post('/api/body-shape/detect-pose', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+        encoded = json.loads(response.data)['pose_data']['segmentation_mask']
+        assert encoded['encoding'] == encoding and encoded['size'] == [48, 64]
+        np.testing.assert_array_equal(decode_mask(encoded), mask)
+
+def test_profile_pose_reference_by_pose_id(client, monkeypatch):
+    """Test a profile update can reference a cached pose instead of resubmitting it"""
+    from backend import app as app_module
+    from backend.models.user_profile import UserProfileManager
+
+    monkeypatch.setattr(app_module, 'profile_manager', UserProfileManager(None))
+    user_id = 'pose_cache_user'
+    client.post('/api/profile/create', json={'user_id': user_id})
+
+    update = {'pose_reference': {'pose_id': 'unknown'}}
+    assert client.put(f'/api/profile/{user_id}', json=update).status_code == 404
+    if not app_module.ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+
+    keypoints = [{'id': i, 'x': 0.5, 'y': 0.1 * i, 'z': 0.0, 'visibility': 0.9} for i in range(5)]
+    monkeypatch.setattr(app_module, 'cached_pose', lambda pose_id: (
+        {'keypoints': keypoints, 'segmentation_mask': None, 'method': 'mediapipe', 'confidence': 0.85},
+        {'body_shape': 'pear', 'measurements': {}}
+    ) if pose_id == 'abc' else (None, None))
+    response = client.put(f'/api/profile/{user_id}', json={'pose_reference': {'pose_id': 'abc'}})
+    assert response.status_code == 200
+    reference = json.loads(response.data)['profile']['pose_references'][-1]
+    assert reference['pose_id'] == 'abc'
+    assert reference['keypoints'] == keypoints
+    assert reference['body_measurements']['body_shape'] == 'pear'
+
+def test_pose_reference_accepts_plain_coco_rle():
+    """Test a COCO RLE mask without an 'encoding' key is accepted as rle"""
+    from backend.models.user_profile import UserProfile
+    
+    profile = UserProfile('rle_user')
+    profile.add_pose_reference({'keypoints': [], 'segmentation_mask': {'size': [4, 4], 'counts': [5, 6, 5]}})
+    assert profile.pose_references[-1]['segmentation_mask'] == {'size': [4, 4], 'counts': [5, 6, 5], 'encoding': 'rle'}
+    
+    for mask in ({'size': [4, 4]}, {'encoding': 'png', 'size': [4, 4]}, {'encoding': 'bitmap', 'size': [4, 4]},
+                 [[0, 255]]):
+        with pytest.raises(ValueError):
+            profile.add_pose_reference({'keypoints': [], 'segmentation_mask': mask})
+
+def test_ar_tryon_progressive(client):
+    """Test a progressive try-on returns a preview first and the full render on request"""
+    import cv2
+    import numpy as np
+    from backend.app import ML_AVAILABLE
+
+    data = {
+        'person_image': (BytesIO(_encoded_image(900, 1200)), 'person.png'),
+        'garment_image': (BytesIO(_encoded_image(48, 64, '.jpg')), 'garment.jpg'),
+        'progressive': 'true', 'output': 'image', 'format': 'png'
+    }
+    response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    if not ML_AVAILABLE:
+        assert 'X-Result-Render-Id' not in response.headers
+        pytest.skip('ML modules not available')
+
+    preview = cv2.imdecode(np.frombuffer(response.data, np.uint8), cv2.IMREAD_COLOR)
+    assert max(preview.shape[:2]) == Config.TRYON_PREVIEW_MAX_SIDE
+    assert float(response.headers['X-Result-Preview-Ms']) >= 0
+
+    render_id = response.headers['X-Result-Render-Id']
+    response = client.post(f'/api/ar-tryon/renders/{render_id}')
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert {'preview_ms', 'render_ms', 'time_to_first_image_ms', 'time_to_full_image_ms'} <= set(result['timings'])
+    full = cv2.imread(str(Config.UPLOAD_FOLDER / result['result_url'][len('/api/uploads/'):]))
+    assert full.shape[:2] == (1200, 900)
+
+    assert client.post('/api/ar-tryon/renders/unknown').status_code == 404
+
+def test_ar_tryon_adjustable_session(client):
+    """Test an adjustable try-on returns a session whose garment can be moved in place"""
+    from backend.app import ML_AVAILABLE
+    
+    data = {
+        'person_image': (BytesIO(_encoded_image(120, 160)), 'person.png'),
+        'garment_image': (BytesIO(_encoded_image(48, 64, '.jpg')), 'garment.jpg'),
+        'adjustable': 'true'
+    }
+    response = client.post('/api/ar-tryon', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    if not ML_AVAILABLE:
+        assert 'tryon_session_id' not in result
+        pytest.skip('ML modules not available')
+    
+    session_id = result['tryon_session_id']
+    response = client.post(f'/api/ar-tryon/sessions/{session_id}/adjust',
+                           data={'x': '6', 'scale': '1.1', 'rotation': '4', 'output': 'image', 'format': 'png'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert len(response.headers['X-Result-Region'].split(',')) == 4
+    
+    response = client.post(f'/api/ar-tryon/sessions/{session_id}/adjust', data={'y': '-3'})
+    adjusted = json.loads(response.data)
+    assert adjusted['adjustment'] == {'position': [6.0, -3.0], 'scale': 1.1, 'rotation': 4.0}
+    assert (Config.UPLOAD_FOLDER / adjusted['result_url'][len('/api/uploads/'):]).exists()
+    
+    assert client.delete(f'/api/ar-tryon/sessions/{session_id}').status_code == 200
+    assert client.post(f'/api/ar-tryon/sessions/{session_id}/adjust', data={'x': '1'}).status_code == 404
+
+class FakeWebSocket:
+    """Scripted stand-in for a flask-sock connection"""
+    
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+    
+    def receive(self, timeout=None):
+        return self.messages.pop(0)
+    
+    def send(self, data):
+        self.sent.append(data)
+
+def test_live_tryon_stream(client):
+    """Test the live try-on protocol: setup, frames in, rendered frames and metrics out"""
+    import base64
+    from backend.app import ML_AVAILABLE, live_tryon_stream
+    
+    garment = base64.b64encode(_encoded_image(48, 64, '.jpg')).decode('ascii')
+    ws = FakeWebSocket([
+        json.dumps({'garment_image': garment, 'target_fps': 60}),
+        _encoded_image(120, 160, '.jpg'),
+        json.dumps({'type': 'close'})
+    ])
+    with app.app_context():
+        live_tryon_stream(ws)
+    
+    messages = [json.loads(m) for m in ws.sent if isinstance(m, str)]
+    if not ML_AVAILABLE:
+        assert messages == [{'type': 'error', 'error': 'Live try-on requires the ML modules'}]
+        pytest.skip('ML modules not available')
+    
+    assert messages[0] == {'type': 'ready', 'target_fps': 30.0, 'format': 'jpeg'}
+    frames = [m for m in ws.sent if isinstance(m, bytes)]
+    assert len(frames) == 1 and frames[0][:2] == b'\xff\xd8'
+    assert messages[-1]['final'] is True
+    assert messages[-1]['frames_received'] == messages[-1]['frames_processed'] == 1
+
+def test_live_tryon_rejects_bad_setup(client):
+    """Test a live session without a garment is refused"""
+    from backend.app import live_tryon_stream
+    
+    ws = FakeWebSocket([json.dumps({'target_fps': 10})])
+    with app.app_context():
+        live_tryon_stream(ws)
+    assert json.loads(ws.sent[-1])['type'] == 'error'
+    assert not any(isinstance(m, bytes) for m in ws.sent)
+
+def test_background_remove_inline_base64(client):
+    """Test background removal can embed the result as a data URL"""
+    data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'output': 'base64', 'format': 'webp'}
+    response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    
+    result = json.loads(response.data)
+    assert result['format'] == 'webp'
+    assert result['image'].startswith('data:image/webp;base64,')
+
+def test_inline_output_rejects_bad_options(client):
+    """Test invalid output options are rejected"""
+    for options in ({'output': 'zip'}, {'output': 'image', 'format': 'bmp'}, {'output': 'image', 'quality': '0'}):
+        data = {'file': (BytesIO(_encoded_image()), 'person.png'), **options}
+        response = client.post('/api/background-remove', data=data, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+def test_wardrobe_upload_deduplicates_content(client):
+    """Test identical uploads are stored once under their content hash"""
+    image = _encoded_image()
+    responses = []
+    for name in ('first.png', 'retry.png'):
+        data = {'file': (BytesIO(image), name), 'user_id': 'test_user'}
+        responses.append(client.post('/api/wardrobe/upload', data=data, content_type='multipart/form-data'))
+    
+    assert responses[0].status_code == 201
+    assert responses[1].status_code == 200
+    
+    first, retry = (json.loads(r.data) for r in responses)
+    assert retry['duplicate'] is True
+    assert first['data']['content_hash'] == retry['data']['content_hash']
+    assert first['data']['filename'] == f"{first['data']['content_hash']}.png"
+    assert (Config.UPLOAD_FOLDER / first['data']['storage_path']).exists()
+    assert len(list(Config.UPLOAD_FOLDER.rglob('*.png'))) == 1
+
+def test_background_remove_job(client):
+    """Test async background removal returns a job ID and completes"""
+    import time
+    
+    data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'priority': '5'}
+    response = client.post('/api/jobs/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 202
+    
+    submitted = json.loads(response.data)
+    assert submitted['job']['status'] in ('queued', 'running', 'done')
+    
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        job = json.loads(client.get(submitted['status_url']).data)['job']
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    
+    assert job['status'] == 'done'
+    assert (Config.UPLOAD_FOLDER / job['result']['image_url'][len('/api/uploads/'):]).exists()
+    assert not any(p.name.startswith('job_') for p in Config.UPLOAD_FOLDER.rglob('*') if p.is_file())
+    
+    events = client.get(submitted['events_url']).get_data(as_text=True)
+    assert 'event: done' in events
+
+def test_jobs_left_to_worker_process(client, monkeypatch):
+    """Test web processes only queue jobs with JOB_RUNNER=worker and event streams end"""
+    from backend.app import job_queue
+    
+    monkeypatch.setattr(Config, 'JOB_RUNNER', 'worker')
+    monkeypatch.setattr(Config, 'JOB_EVENTS_TIMEOUT', 0)
+    data = {'file': (BytesIO(_encoded_image()), 'person.png')}
+    response = client.post('/api/jobs/background-remove', data=data, content_type='multipart/form-data')
+    assert response.status_code == 202
+    assert not job_queue.started
+    
+    submitted = json.loads(response.data)
+    assert json.loads(client.get(submitted['status_url']).data)['job']['status'] == 'queued'
+    events = client.get(submitted['events_url']).get_data(as_text=True)
+    assert events.startswith('retry: ') and 'event: queued' in events
+
+def test_wardrobe_bulk_upload(client):
+    """Test a bulk upload stores each distinct photo once and reports per-file status"""
+    photo = _encoded_image()
+    data = {
+        'user_id': 'test_user',
+        'category': 'tops',
+        'file': [
+            (BytesIO(photo), 'first.png'),
+            (BytesIO(_encoded_image(80, 40, '.jpg')), 'second.jpg'),
+            (BytesIO(photo), 'again.png'),
+            (BytesIO(b'not an image at all'), 'fake.png'),
+            (BytesIO(b'text'), 'notes.txt')
+        ]
+    }
+    response = client.post('/api/wardrobe/bulk-upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 201
+    
+    result = json.loads(response.data)
+    statuses = [f['status'] for f in result['files']]
+    assert statuses == ['created', 'created', 'duplicate', 'rejected', 'rejected']
+    assert result['created'] == 2 and result['rejected'] == 2
+    
+    first = result['files'][0]['data']
+    assert first['category'] == 'tops'
+    assert (first['width'], first['height']) == (64, 96)
+    assert (Config.UPLOAD_FOLDER / first['thumbnail_path']).exists()
+    assert len(list((Config.UPLOAD_FOLDER / 'wardrobe').rglob('*.*'))) == 2
+    assert not list(Config.UPLOAD_FOLDER.rglob('.incoming_*'))
+
+def test_wardrobe_bulk_upload_requires_multipart(client):
+    """Test bulk upload rejects non-multipart bodies"""
+    response = client.post('/api/wardrobe/bulk-upload', data='{}', content_type='application/json')
+    assert response.status_code == 400
+
+def test_serve_content_addressed_upload(client):
+    """Test content-addressed uploads are immutable, revalidate and support ranges"""
+    data = {'file': (BytesIO(_encoded_image()), 'shirt.png'), 'user_id': 'test_user'}
+    item = json.loads(client.post('/api/wardrobe/upload', data=data, content_type='multipart/form-data').data)['data']
+    
+    response = client.get(item['url'])
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{item["content_hash"]}"'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Last-Modified' in response.headers
+    
+    response = client.get(item['url'], headers={'If-None-Match': f'"{item["content_hash"]}"'})
+    assert response.status_code == 304
+    
+    response = client.get(item['url'], headers={'Range': 'bytes=0-7'})
+    assert response.status_code == 206
+    assert response.data == b'\x89PNG\r\n\x1a\n'
+
+def test_serve_generated_result_revalidates(client):
+    """Test generated results are served with validators but no long-lived caching"""
+    data = {'file': (BytesIO(_encoded_image()), 'person.png'), 'method': 'grabcut'}
+    result = json.loads(client.post('/api/background-remove', data=data, content_type='multipart/form-data').data)
+    
+    from backend.app import ML_AVAILABLE
+    response = client.get(result['image_url'])
+    assert response.status_code == 200
+    assert 'ETag' in response.headers
+    if not ML_AVAILABLE:
+        assert 'no-cache' in response.headers['Cache-Control']
+    
+    assert client.get('/api/uploads/../config.py').status_code == 404
+
+def test_serve_upload_x_accel_redirect(client, monkeypatch):
+    """Test the proxy hand-off mode returns headers only"""
+    monkeypatch.setattr(Config, 'UPLOAD_SENDFILE', 'x-accel-redirect')
+    data = {'file': (BytesIO(_encoded_image()), 'shirt.png'), 'user_id': 'test_user'}
+    item = json.loads(client.post('/api/wardrobe/upload', data=data, content_type='multipart/form-data').data)['data']
+    
+    response = client.get(item['url'])
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.mimetype == 'image/png'
+    assert response.headers['X-Accel-Redirect'] == f"/protected-uploads/{item['storage_path']}"
+    
+    response = client.get(item['url'], headers={'If-None-Match': f'"{item["content_hash"]}"'})
+    assert response.status_code == 304
+
+def test_storage_metrics(client):
+    """Test storage metrics report bytes per artifact class"""
+    data = {'file': (BytesIO(_encoded_image()), 'shirt.png'), 'user_id': 'test_user'}
+    client.post('/api/wardrobe/upload', data=data, content_type='multipart/form-data')
+    
+    response = client.get('/api/storage/metrics?refresh=true')
+    assert response.status_code == 200
+    
+    storage = json.loads(response.data)['storage']
+    assert storage['classes']['wardrobe']['files'] == 1
+    assert storage['total_bytes'] > 0
+    assert 'result_cache' in storage
+
+def test_job_not_found(client):
+    """Test polling an unknown job"""
+    response = client.get('/api/jobs/does-not-exist')
+    assert response.status_code == 404
+
+class RecordingDatabase:
+    """Stand-in for the MongoDB wrapper that records blob results"""
+    
+    def __init__(self):
+        self.db = object()
+        self.results = {}
+    
+    def set_blob_result(self, content_hash, name, value):
+        self.results[(content_hash, name)] = value
+        return True
+
+def test_processing_results_recorded_on_blob(client, monkeypatch):
+    """Test background removal and pose results are stored against the photo's blob"""
+    from backend import app as app_module
+    from backend.storage import hash_bytes
+    if not app_module.ML_AVAILABLE:
+        pytest.skip('ML modules not available')
+    
+    database = RecordingDatabase()
+    monkeypatch.setattr(app_module, 'db', database)
+    image = _encoded_image()
+    
+    data = {'file': (BytesIO(image), 'person.png'), 'method': 'grabcut'}
+    result = json.loads(client.post('/api/background-remove', data=data, content_type='multipart/form-data').data)
+    recorded = database.results[(hash_bytes(image), 'background_removal')]
+    assert recorded['url'] == result['image_url']
+    assert recorded['method'] == 'grabcut'
+    
+    keypoints = [{'id': 0, 'x': 0.5, 'y': 0.1, 'z': 0.0, 'visibility': 0.9}]
+    monkeypatch.setattr(app_module, 'analyze_pose', lambda image: (
+        {'keypoints': keypoints, 'method': 'test', 'confidence': 0.8, 'pose_id': 'abc'}, {'body_shape': 'pear'}
+    ))
+    data = {'file': (BytesIO(image), 'person.png')}
+    assert client.post('/api/body-shape/detect-pose', data=data, content_type='multipart/form-data').status_code == 200
+    recorded = database.results[(hash_bytes(image), 'pose')]
+    assert recorded['pose_id'] == 'abc' and recorded['keypoints'] == keypoints
+    assert recorded['body_measurements'] == {'body_shape': 'pear'}
+
+def test_result_filenames_are_unique():
+    """Test results for the same upload name within one second do not collide"""
+    from backend.app import result_filename
+    
+    names = {result_filename('tryon_result', 'person.jpg') for _ in range(100)}
+    assert len(names) == 100
+    assert all(name.startswith('tryon_result_') and name.endswith('_person.png') for name in names)
@@ -0,0 +1,175 @@
+"""Unit tests for the background job queue"""
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.jobs import JobQueue
+
+def wait_for(queue, job_id, timeout=10):
+    """Wait until a job reaches a terminal state"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'jobs.db'
+
+def test_jobs_run_in_priority_order(db_path):
+    """Test higher-priority jobs are processed first"""
+    order = []
+    queue = JobQueue({'record': lambda payload: order.append(payload['name'])}, workers=1)
+    queue.db_path = db_path
+    
+    low = queue.submit('record', {'name': 'low'}, priority=-1)
+    normal = queue.submit('record', {'name': 'normal'})
+    high = queue.submit('record', {'name': 'high'}, priority=5)
+    assert queue.get(low['id'])['queue_position'] == 2
+    
+    queue.start(db_path)
+    try:
+        for job in (low, normal, high):
+            wait_for(queue, job['id'])
+    finally:
+        queue.stop()
+    
+    assert order == ['high', 'normal', 'low']
+
+def test_job_result_and_failure(db_path):
+    """Test results and errors are persisted"""
+    def handler(payload):
+        if payload.get('fail'):
+            raise RuntimeError('boom')
+        return {'value': payload['value'] * 2}
+    
+    queue = JobQueue({'double': handler}, workers=2)
+    queue.start(db_path)
+    try:
+        ok = wait_for(queue, queue.submit('double', {'value': 21})['id'])
+        failed = wait_for(queue, queue.submit('double', {'fail': True})['id'])
+    finally:
+        queue.stop()
+    
+    assert ok['status'] == 'done' and ok['result'] == {'value': 42}
+    assert failed['status'] == 'failed' and failed['error'] == 'boom'
+
+def test_orphaned_jobs_are_requeued(db_path):
+    """Test jobs left running by a dead worker process are picked up again"""
+    done = threading.Event()
+    queue = JobQueue({'work': lambda payload: done.set()}, workers=1)
+    queue.db_path = db_path
+    job = queue.submit('work', {})
+    
+    # Simulate a worker that crashed mid-job
+    connection = sqlite3.connect(str(db_path))
+    connection.execute(
+        "UPDATE jobs SET status = 'running', worker = ?, claimed_until = ? WHERE id = ?",
+        (f"{socket.gethostname()}:999999999", time.time() - 1, job['id'])
+    )
+    connection.commit()
+    connection.close()
+    
+    queue.start(db_path)
+    try:
+        assert wait_for(queue, job['id'])['status'] == 'done'
+    finally:
+        queue.stop()
+    assert done.is_set()
+
+def test_unknown_job_type(db_path):
+    """Test submitting an unregistered job type"""
+    queue = JobQueue({}, workers=1)
+    queue.db_path = db_path
+    with pytest.raises(ValueError):
+        queue.submit('missing', {})
+
+def test_expired_leases_are_requeued(db_path):
+    """Test a job is re-queued once its lease expires, whichever host claimed it"""
+    queue = JobQueue({'work': lambda payload: None}, workers=1, lease_seconds=30)
+    queue.db_path = db_path
+    live = queue.submit('work', {})
+    expired = queue.submit('work', {})
+    
+    connection = sqlite3.connect(str(db_path))
+    connection.execute(
+        "UPDATE jobs SET status = 'running', worker = 'other-host:1', claimed_until = ? WHERE id = ?",
+        (time.time() + 30, live['id'])
+    )
+    connection.execute(
+        "UPDATE jobs SET status = 'running', worker = 'other-host:2', claimed_until = ? WHERE id = ?",
+        (time.time() - 1, expired['id'])
+    )
+    connection.commit()
+    connection.close()
+    
+    claimed = queue._claim_next()
+    assert claimed['id'] == expired['id']
+    assert queue.get(live['id'])['status'] == 'running'
+
+def test_running_jobs_renew_their_lease(db_path):
+    """Test the heartbeat keeps a long job's lease ahead of the clock"""
+    release = threading.Event()
+    queue = JobQueue({'work': lambda payload: release.wait(10)}, workers=1, lease_seconds=0.3)
+    queue.db_path = db_path
+    job = queue.submit('work', {})
+    
+    queue.start(db_path)
+    try:
+        time.sleep(0.6)  # Two lease lengths; only heartbeats keep the job claimed
+        connection = sqlite3.connect(str(db_path))
+        claimed_until, worker = connection.execute(
+            'SELECT claimed_until, worker FROM jobs WHERE id = ?', (job['id'],)
+        ).fetchone()
+        connection.close()
+        assert worker == queue.worker_id
+        assert claimed_until > time.time()
+        assert queue.recover() == 0
+    finally:
+        release.set()
+        queue.stop()
+    assert wait_for(queue, job['id'])['status'] == 'done'
+
+def test_schema_adds_lease_column(db_path):
+    """Test a job database from before leases gains the claimed_until column"""
+    connection = sqlite3.connect(str(db_path))
+    connection.execute(
+        'CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, '
+        'priority INTEGER NOT NULL DEFAULT 0, payload TEXT NOT NULL, result TEXT, error TEXT, '
+        'worker TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, '
+        'updated_at REAL NOT NULL)'
+    )
+    connection.commit()
+    connection.close()
+    
+    queue = JobQueue({'work': lambda payload: None}, workers=1)
+    queue.db_path = db_path
+    job = queue.submit('work', {})
+    assert queue._claim_next()['id'] == job['id']
+
+def test_claim_surfaces_lock_error(db_path, monkeypatch):
+    """Test a failed BEGIN reports the lock, not a rollback without a transaction"""
+    queue = JobQueue({'work': lambda payload: None}, workers=1)
+    queue.db_path = db_path
+    monkeypatch.setattr(queue, '_connect', lambda: sqlite3.connect(str(db_path), timeout=0,
+                                                                   isolation_level=None))
+    
+    holder = sqlite3.connect(str(db_path), isolation_level=None)
+    holder.execute('BEGIN EXCLUSIVE')
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            queue._claim_next()
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
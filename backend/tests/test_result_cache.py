@@ -0,0 +1,93 @@
+"""Unit tests for the derived-image result cache"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.result_cache import ResultCache, cache_key
+
+def writer(data, calls=None, delay=0):
+    """Build a compute function that writes data to the cache path"""
+    def compute(path):
+        if calls is not None:
+            calls.append(path)
+        time.sleep(delay)
+        Path(path).write_bytes(data)
+        return True
+    return compute
+
+def test_cache_key_includes_method_and_version():
+    """Test keys differ by method and model version"""
+    assert cache_key('abc', 'grabcut', 'v1') != cache_key('abc', 'grabcut', 'v2')
+    assert cache_key('abc', 'deeplabv3', 'resnet101/coco') == 'abc_deeplabv3_resnet101-coco.png'
+
+def test_hit_after_miss(tmp_path):
+    """Test a computed result is reused"""
+    cache = ResultCache(tmp_path, max_bytes=1024)
+    calls = []
+    
+    path, cached = cache.get_or_create('a.png', writer(b'x' * 10, calls))
+    assert cached is False and path.read_bytes() == b'x' * 10
+    
+    path, cached = cache.get_or_create('a.png', writer(b'y' * 10, calls))
+    assert cached is True and path.read_bytes() == b'x' * 10
+    assert len(calls) == 1
+
+def test_concurrent_requests_share_one_computation(tmp_path):
+    """Test single-flight behaviour for the same key"""
+    cache = ResultCache(tmp_path, max_bytes=1024)
+    calls = []
+    results = []
+    
+    def request():
+        results.append(cache.get_or_create('a.png', writer(b'x', calls, delay=0.1)))
+    
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert len({str(path) for path, _ in results}) == 1
+
+def test_lru_eviction_by_bytes(tmp_path):
+    """Test least recently used entries are evicted when over budget"""
+    cache = ResultCache(tmp_path, max_bytes=25)
+    cache.get_or_create('a.png', writer(b'a' * 10))
+    cache.get_or_create('b.png', writer(b'b' * 10))
+    assert cache.get('a.png') is not None  # a is now most recently used
+    
+    cache.get_or_create('c.png', writer(b'c' * 10))
+    
+    assert cache.get('b.png') is None
+    assert cache.get('a.png') is not None
+    assert cache.stats()['bytes'] == 20
+
+def test_cache_survives_restart(tmp_path):
+    """Test entries on disk are picked up by a new cache instance"""
+    ResultCache(tmp_path, max_bytes=1024).get_or_create('a.png', writer(b'a'))
+    
+    path, cached = ResultCache(tmp_path, max_bytes=1024).get_or_create('a.png', writer(b'b'))
+    assert cached is True
+
+def test_processes_share_the_directory(tmp_path):
+    """Test caches in different processes reuse and evict each other's entries"""
+    first = ResultCache(tmp_path, max_bytes=25)
+    second = ResultCache(tmp_path, max_bytes=25)
+    assert second.stats()['entries'] == 0  # Index loaded before first writes
+    
+    first.get_or_create('a.png', writer(b'a' * 10))
+    path, cached = second.get_or_create('a.png', writer(b'x' * 10))
+    assert cached is True and path.read_bytes() == b'a' * 10
+    
+    first.get_or_create('b.png', writer(b'b' * 10))
+    second.get_or_create('c.png', writer(b'c' * 10))
+    
+    # The limit holds for the directory: the oldest entry went
+    on_disk = [p.name for p in tmp_path.rglob('*.png')]
+    assert sorted(on_disk) == ['b.png', 'c.png']
+    assert first.get('a.png') is None
@@ -0,0 +1,135 @@
+"""Unit tests for upload storage layout and garbage collection"""
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.storage import StorageManager, classify_legacy_file, delete_blob
+
+def age(path, seconds):
+    """Backdate a file's modification time"""
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+def test_store_content_is_sharded_and_deduplicated(tmp_path):
+    """Test blobs land in a two-level shard named by their hash"""
+    storage = StorageManager(tmp_path)
+
+    first = storage.store_content(BytesIO(b'shirt'), 'png')
+    retry = storage.store_content(BytesIO(b'shirt'), 'png')
+
+    assert first.created is True and retry.created is False
+    assert first.path == tmp_path / 'wardrobe' / first.content_hash[:2] / first.content_hash[2:4] / first.filename
+    assert storage.relative_path(first.path).startswith('wardrobe/')
+    assert len(list(tmp_path.rglob('*.png'))) == 1
+
+def test_concurrent_identical_uploads_create_once(tmp_path):
+    """Test only one of several simultaneous identical uploads reports creating the blob"""
+    storage = StorageManager(tmp_path)
+    blobs = [storage.open_incoming('png') for _ in range(8)]
+    for blob in blobs:
+        blob.write(b'same shirt')
+
+    barrier = threading.Barrier(len(blobs))
+    results = []
+    def commit(blob):
+        barrier.wait()
+        results.append(blob.commit())
+    threads = [threading.Thread(target=commit, args=(blob,)) for blob in blobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(blob.created for blob in results) == 1
+    assert results[0].path.read_bytes() == b'same shirt'
+    assert not list(tmp_path.rglob('.incoming_*'))
+
+def test_delete_keeps_blob_referenced_again(tmp_path):
+    """Test a blob referenced again while it is being deleted is kept"""
+    storage = StorageManager(tmp_path)
+    path = storage.store_content(BytesIO(b'shirt'), 'png').path
+
+    assert delete_blob(path, still_referenced=lambda: True) is False
+    assert path.read_bytes() == b'shirt'
+    assert delete_blob(path, still_referenced=lambda: False) is True
+    assert not path.exists()
+    assert not [p for p in tmp_path.rglob('*') if p.is_file()]
+
+def test_held_upload_restores_blob_deleted_meanwhile(tmp_path):
+    """Test an upload reusing a blob restores it if the last reference was deleted first"""
+    storage = StorageManager(tmp_path)
+    first = storage.store_content(BytesIO(b'shirt'), 'png')
+    reused = storage.store_content(BytesIO(b'shirt'), 'png', hold=True)
+    assert reused.created is False and reused.temp_name is not None
+
+    # The previous owner deletes the file before this upload records its reference
+    delete_blob(first.path)
+    storage.settle(reused)
+    assert reused.path.read_bytes() == b'shirt'
+    assert not list(tmp_path.rglob('.incoming_*'))
+
+    rejected = storage.store_content(BytesIO(b'shirt'), 'png', hold=True)
+    delete_blob(first.path)
+    storage.settle(rejected, restore=False)
+    assert not first.path.exists()
+    assert not list(tmp_path.rglob('.incoming_*'))
+
+def test_ttl_expires_only_its_class(tmp_path):
+    """Test expired artifacts are removed and wardrobe photos are kept"""
+    storage = StorageManager(tmp_path, ttl_hours={'tryon': 1})
+
+    old_result = storage.path_for('tryon', 'tryon_result_old.png')
+    new_result = storage.path_for('tryon', 'tryon_result_new.png')
+    photo = storage.store_content(BytesIO(b'photo'), 'png').path
+    for path in (old_result, new_result):
+        path.write_bytes(b'x')
+    age(old_result, 2 * 3600)
+    age(photo, 48 * 3600)
+
+    removed = storage.collect_garbage()
+
+    assert removed['expired_files'] == 1
+    assert not old_result.exists()
+    assert new_result.exists() and photo.exists()
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    """Test the quota evicts old evictable files and never wardrobe photos"""
+    storage = StorageManager(tmp_path, quota_bytes=250)
+
+    photo = storage.store_content(BytesIO(b'p' * 100), 'png').path
+    oldest = storage.path_for('nobg', 'nobg_a.png')
+    newest = storage.path_for('nobg', 'nobg_b.png')
+    for path in (oldest, newest):
+        path.write_bytes(b'n' * 100)
+    age(photo, 300)
+    age(oldest, 200)
+    age(newest, 100)
+
+    removed = storage.collect_garbage()
+
+    assert removed['evicted_files'] == 1
+    assert photo.exists() and newest.exists()
+    assert not oldest.exists()
+    assert storage.metrics()['total_bytes'] == 200
+
+def test_legacy_flat_files_are_classified(tmp_path):
+    """Test files from the flat layout are collected by their prefix"""
+    storage = StorageManager(tmp_path, ttl_hours={'temp': 1})
+
+    stale = tmp_path / 'temp_1700000000_photo.jpg'
+    stale.write_bytes(b'x')
+    age(stale, 2 * 3600)
+    (tmp_path / 'jobs.db').write_bytes(b'db')
+
+    storage.collect_garbage()
+
+    assert classify_legacy_file('tryon_result_1_photo.png') == 'tryon'
+    assert not stale.exists()
+    assert (tmp_path / 'jobs.db').exists()
+    assert storage.metrics()['classes']['temp']['files'] == 0
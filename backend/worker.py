@@ -0,0 +1,38 @@
+"""
+Background job runner, run as its own process next to the web server:
+
+    JOB_RUNNER=worker python worker.py
+
+Web processes then only queue jobs; this process claims and runs them with
+JOB_WORKERS threads until it receives SIGTERM or SIGINT.
+"""
+import logging
+import signal
+import sys
+import threading
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.app import job_queue
+from backend.config import Config
+from backend.database import db
+
+logger = logging.getLogger(__name__)
+
+def main():
+    if not db.connect():
+        logger.warning("Running without database connection")
+    
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    
+    job_queue.start(Config.JOB_DATABASE)
+    stop.wait()
+    logger.info("Stopping job runner")
+    job_queue.stop()
+
+if __name__ == '__main__':
+    main()
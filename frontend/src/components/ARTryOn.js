@@ -1,5 +1,5 @@
-import React, { useState } from 'react';
-import { applyARTryOn } from '../utils/api';
+import React, { useRef, useState } from 'react';
+import { applyARTryOn, adjustTryOn } from '../utils/api';
 import CameraCapture from './CameraCapture';
 
 function ARTryOn() {
@@ -15,6 +15,8 @@ function ARTryOn() {
   const [scale, setScale] = useState(1.0);
   const [rotation, setRotation] = useState(0);
   const [showControls, setShowControls] = useState(false);
+  const [tryonSessionId, setTryonSessionId] = useState(null);
+  const latestAdjustment = useRef(0);
 
   const handlePersonImageUpload = (e) => {
     const file = e.target.files[0];
@@ -51,6 +53,7 @@ function ARTryOn() {
       setError(null);
       const data = await applyARTryOn(personImage, garmentImage);
       setResultImage(data.result_url);
+      setTryonSessionId(data.tryon_session_id || null);
       setShowControls(true);
     } catch (err) {
       setError(err.message);
@@ -61,18 +64,34 @@ function ARTryOn() {
 
   const adjustOverlay = async (adjustmentType, value) => {
     // Update local state
+    const next = { x: position.x, y: position.y, scale, rotation };
     if (adjustmentType === 'position-x') {
+      next.x = value;
       setPosition({ ...position, x: value });
     } else if (adjustmentType === 'position-y') {
+      next.y = value;
       setPosition({ ...position, y: value });
     } else if (adjustmentType === 'scale') {
+      next.scale = value;
       setScale(value);
     } else if (adjustmentType === 'rotation') {
+      next.rotation = value;
       setRotation(value);
     }
     
-    // In a real implementation, this would call an API to re-render
-    // For now, we just update the CSS transform
+    // Without a server-side session, fall back to the CSS transform preview
+    if (!tryonSessionId) return;
+    
+    // The server moves only the garment layer; stale responses are ignored
+    const request = ++latestAdjustment.current;
+    try {
+      const imageUrl = await adjustTryOn(tryonSessionId, next);
+      if (request === latestAdjustment.current) {
+        setResultImage(imageUrl);
+      }
+    } catch (err) {
+      setTryonSessionId(null);
+    }
   };
 
   const reset = () => {
@@ -84,10 +103,13 @@ function ARTryOn() {
     setScale(1.0);
     setRotation(0);
     setShowControls(false);
+    setTryonSessionId(null);
   };
 
   // Calculate transform style for real-time preview
   const getTransformStyle = () => {
+    // Adjustments are rendered server-side into the image itself
+    if (tryonSessionId) return {};
     return {
       transform: `translate(${position.x}px, ${position.y}px) scale(${scale}) rotate(${rotation}deg)`,
       transition: 'transform 0.2s ease'
@@ -281,6 +303,9 @@ function ARTryOn() {
                     setPosition({ x: 0, y: 0 });
                     setScale(1.0);
                     setRotation(0);
+                    if (tryonSessionId) {
+                      adjustTryOn(tryonSessionId, {}).then(setResultImage).catch(() => setTryonSessionId(null));
+                    }
                   }}
                   className="mt-3 w-full bg-gray-500 text-white py-2 px-4 rounded font-medium hover:bg-gray-600 transition-colors text-sm"
                 >
@@ -91,8 +91,15 @@ export async function analyzeBodyShape(file) {
  */
 export async function applyARTryOn(personImage, garmentImage) {
   const formData = new FormData();
-  formData.append('person_image', personImage);
+  // A person session ID reuses the photo's stored pose and working image
+  if (typeof personImage === 'string') {
+    formData.append('person_session_id', personImage);
+  } else {
+    formData.append('person_image', personImage);
+  }
   formData.append('garment_image', garmentImage);
+  // Keep the garment layer on the server so the fit sliders can adjust it
+  formData.append('adjustable', 'true');
 
   return apiRequest('/ar-tryon', {
     method: 'POST',
@@ -100,6 +107,94 @@ export async function applyARTryOn(personImage, garmentImage) {
   });
 }
 
+/**
+ * Upload a person photo once for many try-ons.
+ * Resolves to { person_session_id, analysis }; pass the ID to applyARTryOn
+ * in place of the photo.
+ */
+export async function createPersonSession(personImage) {
+  const formData = new FormData();
+  formData.append('person_image', personImage);
+
+  return apiRequest('/person-sessions', {
+    method: 'POST',
+    body: formData,
+  });
+}
+
+/**
+ * Move, scale or rotate the garment of an adjustable try-on.
+ * Resolves to an object URL of the re-composited image.
+ */
+export async function adjustTryOn(sessionId, { x = 0, y = 0, scale = 1, rotation = 0 }) {
+  const formData = new FormData();
+  formData.append('x', x);
+  formData.append('y', y);
+  formData.append('scale', scale);
+  formData.append('rotation', rotation);
+  formData.append('output', 'image');
+
+  const response = await fetch(`${API_BASE_URL}/ar-tryon/sessions/${sessionId}/adjust`, {
+    method: 'POST',
+    body: formData,
+  });
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.error || 'Adjustment failed');
+  }
+  return URL.createObjectURL(await response.blob());
+}
+
+/**
+ * Open a live try-on session over a WebSocket.
+ *
+ * Send encoded camera frames (e.g. canvas.toBlob JPEGs) with sendFrame;
+ * rendered frames arrive as Blobs through onFrame and FPS/latency/dropped
+ * frame statistics through onMetrics. Frames are not sent while the previous
+ * one is still buffered, so a slow connection drops frames instead of lagging.
+ */
+export function openLiveTryOn({ productId, garmentImage, targetFps = 15, onReady, onFrame, onMetrics, onError }) {
+  const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/ar-tryon/live`);
+  socket.binaryType = 'blob';
+
+  socket.onopen = () => {
+    socket.send(JSON.stringify({
+      product_id: productId,
+      garment_image: garmentImage,
+      target_fps: targetFps,
+    }));
+  };
+
+  socket.onmessage = (event) => {
+    if (typeof event.data !== 'string') {
+      if (onFrame) onFrame(event.data);
+      return;
+    }
+    const message = JSON.parse(event.data);
+    if (message.type === 'ready' && onReady) onReady(message);
+    if (message.type === 'metrics' && onMetrics) onMetrics(message);
+    if (message.type === 'error' && onError) onError(new Error(message.error));
+  };
+
+  socket.onerror = () => {
+    if (onError) onError(new Error('Live try-on connection failed'));
+  };
+
+  return {
+    sendFrame(frame) {
+      if (socket.readyState === WebSocket.OPEN && socket.bufferedAmount === 0) {
+        socket.send(frame);
+      }
+    },
+    close() {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'close' }));
+      }
+      socket.close();
+    },
+  };
+}
+
 /**
  * Get product catalogue
  */
@@ -122,6 +217,9 @@ const api = {
   getRecommendations,
   analyzeBodyShape,
   applyARTryOn,
+  createPersonSession,
+  adjustTryOn,
+  openLiveTryOn,
   getProductCatalogue,
   API_BASE_URL,
 };
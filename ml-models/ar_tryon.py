@@ -2,7 +2,11 @@
 import logging
 import cv2
 import numpy as np
-from pathlib import Path
+
+from .image_io import is_image_path, load_image, resolve_output_path
+from .garment_assets import GARMENT_REGIONS, GarmentAsset, garment_anchor_points, prepare_garment
+from .preprocessing import prepare_input
+from .tps import solve_tps, evaluate_tps, tps_grid, remap_with_grid, image_key, pose_key, WarpCache
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +23,7 @@ except ImportError:
 VTONHD_MODEL_ID = "levihsu/OOTDiffusion"  # Example model
 VTONHD_AVAILABLE = False  # Set to True when model is downloaded
 
-def apply_virtual_tryon_vtonhd(person_path, garment_path):
+def apply_virtual_tryon_vtonhd(person_image, garment_image):
     """Apply virtual try-on using VTON-HD from Hugging Face"""
     try:
         if not TORCH_AVAILABLE or not VTONHD_AVAILABLE:
@@ -33,7 +37,7 @@ def apply_virtual_tryon_vtonhd(person_path, garment_path):
         
         # For now, return None to use fallback
         # Real implementation would look like:
-        # result = vton_pipeline(person_image=person_path, garment_image=garment_path)
+        # result = vton_pipeline(person_image=person_image, garment_image=garment_image)
         # return result['output_path']
         
         logger.info("VTON-HD model not loaded, using fallback")
@@ -43,13 +47,115 @@ def apply_virtual_tryon_vtonhd(person_path, garment_path):
         logger.error(f"VTON-HD failed: {e}")
         return None
 
-def apply_tps_warping(person_img, garment_img, keypoints=None):
-    """Apply Thin Plate Spline (TPS) warping for garment fitting"""
+MIN_VISIBILITY = 0.3
+
+# Where each region's garment goes, as (left, top, right, bottom) fractions
+# of the person image, when no pose landmarks are available
+REGION_BOXES = {
+    'upper': (0.25, 0.15, 0.75, 0.55),
+    'lower': (0.3, 0.5, 0.7, 0.95),
+    'full': (0.25, 0.15, 0.75, 0.9),
+}
+
+# Warp grids are stored at 1/TPS_GRID_STEP resolution per side and reused
+# while control points move less than TPS_POSE_QUANTUM pixels
+TPS_GRID_STEP = 4
+TPS_POSE_QUANTUM = 4
+_warp_cache = WarpCache(max_entries=64)
+
+def is_landmark_list(keypoints):
+    """Check whether keypoints are detect_body_pose landmarks (normalized dicts)"""
+    return bool(keypoints) and isinstance(keypoints[0], dict)
+
+def tps_control_points(landmarks, person_size, garment_size, anchor_points=None, region='upper'):
+    """
+    Pair garment anchor points with landmark positions on the person.
+    
+    Args:
+        landmarks: detect_body_pose landmark dicts
+        person_size: (width, height) of the person image
+        garment_size: (width, height) of the garment image
+        anchor_points: Precomputed garment anchors in pixels (GarmentAsset);
+            derived from the region's anchors and garment_size if None
+        region: Body region of the garment (key into GARMENT_REGIONS)
+    
+    Returns:
+        tuple: ((N, 2) person points, (N, 2) garment points) in pixels, or
+            None if fewer than three anchors are visible
+    """
+    person_w, person_h = person_size
+    if anchor_points is None:
+        anchor_points = garment_anchor_points(garment_size, region)
+    by_id = {kp['id']: kp for kp in landmarks if kp.get('visibility', 1.0) >= MIN_VISIBILITY}
+    
+    person_points, garment_points = [], []
+    for name, ((id_a, id_b), _, _) in GARMENT_REGIONS[region].items():
+        if id_a not in by_id or id_b not in by_id:
+            continue
+        pair = sorted((by_id[id_a], by_id[id_b]), key=lambda kp: kp['x'])
+        for kp, anchor in zip(pair, anchor_points[name]):
+            person_points.append((kp['x'] * person_w, kp['y'] * person_h))
+            garment_points.append(anchor)
+    
+    if len(person_points) < 3:
+        return None
+    
+    # Top and hem centres keep the spline from twisting between the pairs
+    person_points, garment_points = np.float64(person_points), np.float64(garment_points)
+    if len(person_points) >= 4:
+        person_points = np.vstack([person_points, person_points[:2].mean(0), person_points[-2:].mean(0)])
+        garment_points = np.vstack([garment_points, garment_points[:2].mean(0), garment_points[-2:].mean(0)])
+    return person_points, garment_points
+
+def apply_tps_warping(person_img, garment_img, keypoints=None, garment_key=None):
+    """
+    Warp the garment onto the person.
+    
+    With detect_body_pose landmarks a thin-plate spline through the shoulder,
+    elbow and hip landmarks is used. The spline is solved once per (garment,
+    pose) and kept as a coarse cv2.remap grid, so re-rendering for the same
+    or a slightly moved pose skips the solve. Four pixel corner points, or no
+    keypoints at all, fall back to a perspective warp.
+    
+    Args:
+        person_img: BGR person image
+        garment_img: BGR garment image
+        keypoints: Landmark dicts, four (x, y) corner points or None
+        garment_key: Stable ID of the garment for the warp cache (defaults
+            to a hash of its pixels)
+    
+    A GarmentAsset is warped together with its alpha mask (BGRA result),
+    using its precomputed control points and key.
+    """
     try:
+        anchor_points, region = None, 'upper'
+        if isinstance(garment_img, GarmentAsset):
+            garment_key = garment_key or garment_img.key
+            anchor_points, region = garment_img.control_points, garment_img.region
+            garment_img = garment_img.bgra
+        
         # Get dimensions
         person_h, person_w = person_img.shape[:2]
         garment_h, garment_w = garment_img.shape[:2]
         
+        if is_landmark_list(keypoints):
+            points = tps_control_points(keypoints, (person_w, person_h), (garment_w, garment_h),
+                                        anchor_points, region)
+            if points is not None:
+                person_points, garment_points = points
+                key = (
+                    garment_key or image_key(garment_img),
+                    (garment_w, garment_h),
+                    pose_key(person_points, TPS_POSE_QUANTUM),
+                    (person_w, person_h)
+                )
+                # Inverse map: person pixel -> garment pixel
+                grid = _warp_cache.get_or_create(key, lambda: tps_grid(
+                    solve_tps(person_points, garment_points), (person_w, person_h), TPS_GRID_STEP
+                ))
+                return remap_with_grid(garment_img, grid, (person_w, person_h))
+            keypoints = None
+        
         # Define source points (corners of garment)
         src_points = np.float32([
             [0, 0],
@@ -60,23 +166,11 @@ def apply_tps_warping(person_img, garment_img, keypoints=None):
         
         # Define destination points based on keypoints or estimation
         if keypoints:
-            # Use actual body keypoints for better fitting
-            # Assuming keypoints contain shoulder and hip positions
+            # Corner points (top-left, top-right, bottom-right, bottom-left)
             dst_points = np.float32(keypoints)
         else:
-            # Estimate fitting area on person
-            # Upper body region
-            top_y = int(person_h * 0.15)
-            bottom_y = int(person_h * 0.55)
-            left_x = int(person_w * 0.25)
-            right_x = int(person_w * 0.75)
-            
-            dst_points = np.float32([
-                [left_x, top_y],
-                [right_x, top_y],
-                [right_x, bottom_y],
-                [left_x, bottom_y]
-            ])
+            # Estimate fitting area on person from the garment's body region
+            dst_points = region_box_points(region, (person_w, person_h))
         
         # Compute perspective transform
         matrix = cv2.getPerspectiveTransform(src_points, dst_points)
@@ -87,7 +181,8 @@ def apply_tps_warping(person_img, garment_img, keypoints=None):
             matrix,
             (person_w, person_h),
             flags=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_TRANSPARENT
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=0
         )
         
         return warped_garment
@@ -96,46 +191,327 @@ def apply_tps_warping(person_img, garment_img, keypoints=None):
         logger.error(f"TPS warping failed: {e}")
         return None
 
-def apply_virtual_tryon_opencv(person_path, garment_path, keypoints=None):
-    """Enhanced fallback AR try-on using OpenCV with TPS warping"""
+def region_box_points(region, person_size):
+    """Corner points (TL, TR, BR, BL) of a region's default box on the person"""
+    person_w, person_h = person_size
+    left, top, right, bottom = REGION_BOXES[region]
+    return np.float32([
+        [int(person_w * left), int(person_h * top)],
+        [int(person_w * right), int(person_h * top)],
+        [int(person_w * right), int(person_h * bottom)],
+        [int(person_w * left), int(person_h * bottom)]
+    ])
+
+def warp_cache_stats():
+    """Size and hit counters of the TPS warp grid cache"""
+    return _warp_cache.stats()
+
+# Edge feathering of the garment mask (Gaussian kernel size)
+BLEND_KERNEL = 7
+
+def blend_garment(person_img, warped_garment, alpha=0.75):
+    """
+    Alpha-blend a warped garment onto the person image in place.
+    
+    The mask is the garment's alpha (BGRA input) or its non-black pixels,
+    feathered with a Gaussian blur. Only the garment's bounding box is
+    blended, with 8-bit fixed-point weights.
+    
+    Args:
+        person_img: BGR uint8 image, modified in place
+        warped_garment: BGR uint8 image of the same size, black where empty,
+            or BGRA with the garment's alpha
+        alpha: Garment opacity
+        
+    Returns:
+        tuple: (x, y, w, h) of the blended region, or None if the garment is empty
+    """
+    if warped_garment.shape[2] == 4:
+        mask = warped_garment[:, :, 3]
+        warped_garment = warped_garment[:, :, :3]
+    else:
+        gray = cv2.cvtColor(warped_garment, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+    if not cv2.countNonZero(mask):
+        return None
+    
+    # Grow the box by the blur radius so feathered edges are kept
+    x, y, w, h = cv2.boundingRect(mask)
+    pad = BLEND_KERNEL // 2
+    height, width = mask.shape
+    x1, y1 = max(0, x - pad), max(0, y - pad)
+    x2, y2 = min(width, x + w + pad), min(height, y + h + pad)
+    
+    # Smooth mask edges. The blur window gets another radius of margin so
+    # border reflection inside the crop matches a full-frame blur.
+    bx1, by1 = max(0, x1 - pad), max(0, y1 - pad)
+    bx2, by2 = min(width, x2 + pad), min(height, y2 + pad)
+    blurred = cv2.GaussianBlur(mask[by1:by2, bx1:bx2], (BLEND_KERNEL, BLEND_KERNEL), 0)
+    roi_mask = blurred[y1 - by1:y2 - by1, x1 - bx1:x2 - bx1]
+    
+    # Weight in [0, 256]: mask * alpha, rounded
+    weight = (roi_mask.astype(np.uint16) * int(round(alpha * 256)) + 127) // 255
+    weight = weight[:, :, None]
+    
+    roi = person_img[y1:y2, x1:x2]
+    blended = (roi.astype(np.uint16) * (256 - weight) +
+               warped_garment[y1:y2, x1:x2].astype(np.uint16) * weight + 128) >> 8
+    roi[:] = blended.astype(np.uint8)
+    
+    return x1, y1, x2 - x1, y2 - y1
+
+# Extra margin around a garment's estimated footprint: the forward spline
+# used to find it only approximates the inverse one used for warping
+FOOTPRINT_MARGIN = 0.05
+
+def garment_footprint(person_points, garment_points, garment_size, canvas_size):
+    """
+    Box on the person image that a warped garment can cover.
+
+    Returns:
+        tuple: (x1, y1, x2, y2) clipped to the canvas, padded for feathering
+    """
+    width, height = canvas_size
+    garment_w, garment_h = garment_size
+    t = np.linspace(0.0, 1.0, 17)
+    zeros, ones = np.zeros_like(t), np.ones_like(t)
+    border = np.vstack([
+        np.column_stack([t, zeros]), np.column_stack([t, ones]),
+        np.column_stack([zeros, t]), np.column_stack([ones, t])
+    ]) * (garment_w, garment_h)
+    mapped = evaluate_tps(solve_tps(garment_points, person_points), border)
+    
+    low, high = mapped.min(0), mapped.max(0)
+    margin = (high - low) * FOOTPRINT_MARGIN + BLEND_KERNEL
+    x1, y1 = np.floor(low - margin).astype(int).tolist()
+    x2, y2 = np.ceil(high + margin).astype(int).tolist()
+    return max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+
+class GarmentWarp:
+    """
+    A garment's warp into its footprint box on the person image.
+    
+    The warp is either a coarse TPS remap grid or a perspective matrix, both
+    relative to the box. It can be rendered again for a larger copy of the
+    same person image, so a full-resolution render reuses a preview's spline
+    without solving or evaluating it again.
+    """
+    
+    def __init__(self, canvas_size, box, grid=None, matrix=None):
+        self.canvas_size = tuple(canvas_size)  # (width, height) the warp was solved for
+        self.box = tuple(box)                  # (x1, y1, x2, y2) on that canvas
+        self.grid = grid
+        self.matrix = matrix
+    
+    def scaled_box(self, canvas_size):
+        """The footprint box on a canvas of another size"""
+        sx, sy = canvas_size[0] / self.canvas_size[0], canvas_size[1] / self.canvas_size[1]
+        x1, y1, x2, y2 = self.box
+        return (int(np.floor(x1 * sx)), int(np.floor(y1 * sy)),
+                min(canvas_size[0], int(np.ceil(x2 * sx))), min(canvas_size[1], int(np.ceil(y2 * sy))))
+    
+    def render(self, garment, canvas_size=None):
+        """
+        Warp the garment pixels.
+        
+        Args:
+            garment: BGRA garment image the warp was computed for
+            canvas_size: Person image size to render for (default: the
+                warp's own); must have the same aspect ratio
+            
+        Returns:
+            tuple: (BGRA warped garment, (x1, y1, x2, y2) box on the canvas)
+        """
+        canvas_size = tuple(canvas_size or self.canvas_size)
+        box = self.box if canvas_size == self.canvas_size else self.scaled_box(canvas_size)
+        x1, y1, x2, y2 = box
+        size = (x2 - x1, y2 - y1)
+        
+        if self.grid is not None:
+            # The grid is coarse anyway; upsampling it to a larger box is exact
+            # up to rounding of the box edges
+            return remap_with_grid(garment, self.grid, size), box
+        
+        sx, sy = canvas_size[0] / self.canvas_size[0], canvas_size[1] / self.canvas_size[1]
+        px1, py1 = self.box[:2]
+        rescale = np.float64([[sx, 0, sx * px1 - x1], [0, sy, sy * py1 - y1], [0, 0, 1]])
+        warped = cv2.warpPerspective(garment, rescale @ self.matrix, size, flags=cv2.INTER_LINEAR,
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return warped, box
+
+def garment_roi_warp(asset, keypoints, canvas_size):
+    """
+    Solve a prepared garment's warp into its footprint on the person image.
+    
+    Args:
+        asset: GarmentAsset
+        keypoints: detect_body_pose landmarks or None (region box placement)
+        canvas_size: (width, height) of the person image
+        
+    Returns:
+        GarmentWarp, or None if the garment falls outside the image
+    """
+    width, height = canvas_size
+    garment_h, garment_w = asset.image.shape[:2]
+    
+    points = None
+    if is_landmark_list(keypoints):
+        points = tps_control_points(keypoints, canvas_size, (garment_w, garment_h),
+                                    asset.control_points, asset.region)
+    
+    if points is not None:
+        person_points, garment_points = points
+        pose = pose_key(person_points, TPS_POSE_QUANTUM)
+        # The box is derived from the quantized pose so it is fixed per cache key
+        quantized = np.float64(pose).reshape(-1, 2) * TPS_POSE_QUANTUM
+        x1, y1, x2, y2 = garment_footprint(quantized, garment_points, (garment_w, garment_h), canvas_size)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        size = (x2 - x1, y2 - y1)
+        key = (asset.key, (garment_w, garment_h), pose, canvas_size, (x1, y1, x2, y2))
+        grid = _warp_cache.get_or_create(key, lambda: tps_grid(
+            solve_tps(person_points, garment_points), size, TPS_GRID_STEP, origin=(x1, y1)
+        ))
+        return GarmentWarp(canvas_size, (x1, y1, x2, y2), grid=grid)
+    
+    # No usable landmarks: perspective warp into the region's default box
+    dst_points = region_box_points(asset.region, canvas_size)
+    x1, y1 = np.maximum(dst_points.min(0).astype(int) - BLEND_KERNEL, 0).tolist()
+    x2, y2 = np.minimum(dst_points.max(0).astype(int) + BLEND_KERNEL, (width, height)).tolist()
+    src_points = np.float32([[0, 0], [garment_w, 0], [garment_w, garment_h], [0, garment_h]])
+    matrix = cv2.getPerspectiveTransform(src_points, dst_points - np.float32([x1, y1]))
+    return GarmentWarp(canvas_size, (x1, y1, x2, y2), matrix=matrix)
+
+def warp_garment_roi(asset, keypoints, canvas_size):
+    """
+    Warp a prepared garment into just its footprint on the person image.
+    
+    Unlike apply_tps_warping, the output covers only the garment's box, so
+    the cost follows the garment's size rather than the image's.
+    
+    Args:
+        asset: GarmentAsset
+        keypoints: detect_body_pose landmarks or None (region box placement)
+        canvas_size: (width, height) of the person image
+        
+    Returns:
+        tuple: (BGRA warped garment, (x1, y1, x2, y2) box on the person), or
+            None if the garment falls outside the image
+    """
+    warp = garment_roi_warp(asset, keypoints, canvas_size)
+    return warp.render(asset.bgra) if warp is not None else None
+
+def apply_layered_tryon(person_image, garments, keypoints=None, output_path=None,
+                        full_resolution=False, return_image=False, alpha=0.75):
+    """
+    Try on several garments at once, composited in z-order in one pass.
+    
+    Each garment is warped to its body region (upper, lower or full length)
+    into only its own footprint and blended onto a single in-memory canvas,
+    so the cost grows with the garments' areas, not with full-image passes.
+    
+    Args:
+        person_image: Path to person image, encoded image bytes or a BGR ndarray
+        garments: Garments bottom layer first (e.g. trousers, shirt, jacket):
+            GarmentAssets, or (image source, region) tuples prepared on the fly
+        keypoints: The 'keypoints' list from detect_body_pose; without it each
+            garment is placed in its region's default box
+        output_path: Where to write the result (auto-generated next to the
+            person image if None; required for in-memory images)
+        full_resolution: Render at the person image's original size
+        return_image: Return the composite as a BGR array instead of writing it
+        alpha: Garment opacity
+        
+    Returns:
+        Path to result image (the image itself with return_image)
+    """
+    person_img = load_image(person_image)
+    if person_img is None:
+        raise ValueError("Could not read person image")
+    if not full_resolution:
+        person_img, _ = prepare_input(person_img, 'tryon')
+    if not is_landmark_list(keypoints):
+        keypoints = None
+    
+    canvas = person_img.copy()
+    canvas_size = (canvas.shape[1], canvas.shape[0])
+    for garment in garments:
+        if not isinstance(garment, GarmentAsset):
+            source, region = garment
+            image = load_image(source)
+            if image is None:
+                raise ValueError("Could not read garment image")
+            garment = prepare_garment(image, f"{image_key(image)}-{region}", region)
+        
+        warped = warp_garment_roi(garment, keypoints, canvas_size)
+        if warped is None:
+            continue
+        layer, (x1, y1, x2, y2) = warped
+        blend_garment(canvas[y1:y2, x1:x2], layer, alpha)
+    
+    if return_image:
+        return canvas
+    
+    result_path = resolve_output_path(person_image, output_path, _tryon_filename)
+    cv2.imwrite(str(result_path), canvas)
+    logger.info(f"Layered try-on of {len(garments)} garments completed: {result_path}")
+    return str(result_path)
+
+def _tryon_filename(person_path):
+    """Output file name for a try-on result"""
+    return f"tryon_result_{person_path.name}"
+
+def apply_virtual_tryon_opencv(person_image, garment_image, keypoints=None, output_path=None,
+                               full_resolution=False, return_image=False, garment_key=None,
+                               preview=False):
+    """
+    Enhanced fallback AR try-on using OpenCV with TPS warping.
+    
+    The composite is rendered at the 'tryon' working resolution unless
+    full_resolution is set, or at the small 'preview' one with preview;
+    keypoints are detect_body_pose landmarks or corner points in original
+    image pixels.
+    With return_image the composite is returned as an array and not written.
+    A GarmentAsset garment is used as prepared, skipping all garment-side work.
+    """
     try:
         # Read images
-        person_img = cv2.imread(person_path)
-        garment_img = cv2.imread(garment_path)
+        person_img = load_image(person_image)
+        is_asset = isinstance(garment_image, GarmentAsset)
+        garment_img = garment_image if is_asset else load_image(garment_image)
         
         if person_img is None or garment_img is None:
             raise ValueError("Could not read images")
         
+        # Cap both images at the working resolution before warping and blending
+        if preview or not full_resolution:
+            person_img, transform = prepare_input(person_img, 'preview' if preview else 'tryon')
+            # Normalized landmarks apply to any resolution unchanged
+            if keypoints is not None and not is_landmark_list(keypoints):
+                keypoints = transform.to_working_points(keypoints).tolist()
+        if not is_asset:
+            garment_img, _ = prepare_input(garment_img, 'tryon')
+        
         # Apply TPS warping if available
-        warped_garment = apply_tps_warping(person_img, garment_img, keypoints)
+        warped_garment = apply_tps_warping(person_img, garment_img, keypoints, garment_key)
         
         if warped_garment is None:
             # Fallback to simple scaling
+            garment_pixels = garment_img.image if is_asset else garment_img
             person_h, person_w = person_img.shape[:2]
-            garment_h, garment_w = garment_img.shape[:2]
+            garment_h, garment_w = garment_pixels.shape[:2]
             
             scale = min(person_w * 0.6 / garment_w, person_h * 0.4 / garment_h)
             new_w = int(garment_w * scale)
             new_h = int(garment_h * scale)
-            warped_garment = cv2.resize(garment_img, (new_w, new_h))
+            warped_garment = cv2.resize(garment_pixels, (new_w, new_h))
         
         # Create result with blending
         result = person_img.copy()
         
         # Get non-zero pixels from warped garment (transparency-aware)
         if warped_garment.shape[:2] == result.shape[:2]:
-            # Create mask from non-black pixels
-            gray = cv2.cvtColor(warped_garment, cv2.COLOR_BGR2GRAY)
-            _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
-            
-            # Smooth mask edges
-            mask = cv2.GaussianBlur(mask, (7, 7), 0)
-            mask_3ch = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
-            
-            # Alpha blending
-            alpha = 0.75
-            result = (result * (1 - mask_3ch * alpha) + 
-                     warped_garment * mask_3ch * alpha).astype(np.uint8)
+            blend_garment(result, warped_garment, alpha=0.75)
         else:
             # Simple overlay for mismatched sizes
             person_h, person_w = person_img.shape[:2]
@@ -156,8 +532,11 @@ def apply_virtual_tryon_opencv(person_path, garment_path, keypoints=None):
                     blended = cv2.addWeighted(roi, 1 - alpha, garment_crop, alpha, 0)
                     result[y1:y2, x1:x2] = blended
         
+        if return_image:
+            return result
+        
         # Save result
-        result_path = Path(person_path).parent / f"tryon_result_{Path(person_path).name}"
+        result_path = resolve_output_path(person_image, output_path, _tryon_filename)
         cv2.imwrite(str(result_path), result)
         
         logger.info(f"AR try-on completed: {result_path}")
@@ -166,24 +545,44 @@ def apply_virtual_tryon_opencv(person_path, garment_path, keypoints=None):
     except Exception as e:
         logger.error(f"OpenCV try-on failed: {e}")
         # Return person image as ultimate fallback
-        return person_path
+        return str(person_image) if is_image_path(person_image) and not return_image else None
 
-def apply_virtual_tryon(person_path, garment_path, keypoints=None):
+def apply_virtual_tryon(person_image, garment_image, keypoints=None, output_path=None,
+                        full_resolution=False, return_image=False, garment_key=None, preview=False):
     """
     Main entry point for virtual try-on with multiple strategies.
     
     Args:
-        person_path: Path to person image
-        garment_path: Path to garment image
-        keypoints: Optional body keypoints for better fitting
+        person_image: Path to person image, encoded image bytes or a BGR ndarray
+        garment_image: Path to garment image, encoded image bytes, a BGR ndarray
+            or a prepared GarmentAsset
+        keypoints: Optional body keypoints for better fitting: the 'keypoints'
+            list from detect_body_pose (thin-plate-spline fit) or four corner points
+        garment_key: Stable garment ID used to cache warp grids
+        output_path: Where to write the result (auto-generated next to the
+            person image if None; required for in-memory images)
+        full_resolution: Render at the person image's original size instead
+            of the capped working resolution
+        return_image: Return the composite as a BGR array instead of writing it
+        preview: Render quickly at the small 'preview' working resolution;
+            progressive_tryon.ProgressiveTryOn follows a preview with a
+            full-resolution render that reuses its warp
         
     Returns:
-        Path to result image
+        Path to result image (the image itself with return_image)
     """
-    logger.info(f"Starting AR try-on: person={person_path}, garment={garment_path}")
+    is_asset = isinstance(garment_image, GarmentAsset)
+    if is_image_path(person_image) and is_image_path(garment_image):
+        logger.info(f"Starting AR try-on: person={person_image}, garment={garment_image}")
+    else:
+        logger.info("Starting AR try-on from in-memory images")
+    
+    # Decode once for all strategies
+    person_img = load_image(person_image)
+    garment_img = garment_image if is_asset else load_image(garment_image)
     
     # Try VTON-HD first (if model is available)
-    result = apply_virtual_tryon_vtonhd(person_path, garment_path)
+    result = apply_virtual_tryon_vtonhd(person_img, garment_img.image if is_asset else garment_img)
     
     if result:
         logger.info("Used VTON-HD for try-on")
@@ -191,24 +590,33 @@ def apply_virtual_tryon(person_path, garment_path, keypoints=None):
     
     # Fallback to OpenCV with TPS
     logger.info("Using OpenCV TPS fallback for try-on")
-    return apply_virtual_tryon_opencv(person_path, garment_path, keypoints)
+    if output_path is None and is_image_path(person_image) and not return_image:
+        output_path = resolve_output_path(person_image, None, _tryon_filename)
+    result = apply_virtual_tryon_opencv(person_img, garment_img, keypoints, output_path, full_resolution,
+                                        return_image, garment_key, preview)
+    
+    if result is None and is_image_path(person_image) and not return_image:
+        return str(person_image)
+    return result
 
-def adjust_garment_overlay(result_image, position=None, scale=None, rotation=None):
+def adjust_garment_overlay(result_image, position=None, scale=None, rotation=None, output_path=None):
     """
     Adjust the position, size, and rotation of overlaid garment.
-    Used for real-time adjustments in the frontend.
+    This transforms the whole composited image; for interactive adjustments
+    use tryon_session.TryOnSession, which moves only the garment layer.
     
     Args:
-        result_image: Path to current result image
+        result_image: Path to current result image, or the image itself
         position: (x, y) offset for positioning
         scale: Scale factor (0.5 to 2.0)
         rotation: Rotation angle in degrees
+        output_path: Where to write the adjusted image (required for in-memory images)
         
     Returns:
         Path to adjusted image
     """
     try:
-        img = cv2.imread(result_image)
+        img = load_image(result_image)
         if img is None:
             raise ValueError("Could not read result image")
         
@@ -245,11 +653,13 @@ def adjust_garment_overlay(result_image, position=None, scale=None, rotation=Non
             img = cv2.warpAffine(img, matrix, (w, h))
         
         # Save adjusted result
-        adjusted_path = Path(result_image).parent / f"adjusted_{Path(result_image).name}"
+        adjusted_path = resolve_output_path(
+            result_image, output_path, lambda path: f"adjusted_{path.name}"
+        )
         cv2.imwrite(str(adjusted_path), img)
         
         return str(adjusted_path)
         
     except Exception as e:
         logger.error(f"Adjustment failed: {e}")
-        return result_image
+        return str(result_image) if is_image_path(result_image) else None
@@ -0,0 +1,108 @@
+"""Micro-batching scheduler that merges concurrent inference requests"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collect single-item requests from many threads into batched calls.
+
+    The first request of a batch waits at most max_wait_ms for others to
+    arrive; the batch is run as soon as it reaches max_batch_size or the
+    wait expires. Results are routed back to each caller in order.
+
+    Example:
+        batcher = MicroBatcher(lambda items: [model(x) for x in items])
+        result = batcher.infer(item)
+    """
+
+    def __init__(self, infer_batch, max_batch_size=8, max_wait_ms=5.0, name='batcher'):
+        """
+        Args:
+            infer_batch: Callable taking a list of items and returning a list
+                of results of the same length
+            max_batch_size: Largest batch passed to infer_batch
+            max_wait_ms: Longest time the first request of a batch waits
+            name: Used for the worker thread and logs
+        """
+        self.infer_batch = infer_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def configure(self, max_batch_size=None, max_wait_ms=None):
+        """Change the batching limits; applies from the next batch"""
+        with self._condition:
+            if max_batch_size is not None:
+                self.max_batch_size = max(1, int(max_batch_size))
+            if max_wait_ms is not None:
+                self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result"""
+        future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+            self._queue.append((item, future))
+            self._condition.notify()
+        return future
+
+    def infer(self, item, timeout=None):
+        """Run one item through the batched model and wait for its result"""
+        return self.submit(item).result(timeout)
+
+    def stats(self):
+        """Number of batches run and the mean batch size"""
+        with self._condition:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms
+            }
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+
+            # The oldest request bounds how long the batch may keep filling
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            self.batches += 1
+            self.items += len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            futures = [future for _, future in batch]
+            try:
+                results = self.infer_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: expected {len(batch)} results, got {len(results)}")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,142 @@
+"""
+Throughput/latency curves for micro-batched DeepLabV3 inference.
+
+Runs a number of concurrent clients against the scheduler for several
+(max_batch_size, max_wait_ms) settings. Uses the real DeepLabV3 model when
+PyTorch is installed and a synthetic model with the same cost shape
+(fixed per-call overhead plus per-item work) otherwise.
+
+Usage:
+    python ml-models/benchmarks/batching_benchmark.py
+    python ml-models/benchmarks/batching_benchmark.py --clients 1 4 8 16 --json results.json
+"""
+import argparse
+import importlib.util
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+def load_ml_models():
+    """Import the ml-models directory as the ml_models package"""
+    if 'ml_models' in sys.modules:
+        return sys.modules['ml_models']
+    root = Path(__file__).resolve().parent.parent
+    spec = importlib.util.spec_from_file_location(
+        'ml_models', root / '__init__.py', submodule_search_locations=[str(root)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ml_models'] = module
+    spec.loader.exec_module(module)
+    return module
+
+load_ml_models()
+from ml_models.batching import MicroBatcher
+from ml_models import deeplab
+
+# (max_batch_size, max_wait_ms); the first is the unbatched baseline
+SETTINGS = [(1, 0.0), (4, 2.0), (8, 5.0), (16, 10.0)]
+
+def synthetic_model(overhead_ms=20.0, per_item=256):
+    """Batched call whose cost is a fixed overhead plus per-item matrix work"""
+    weights = np.random.default_rng(0).standard_normal((per_item, per_item)).astype(np.float32)
+
+    def infer_batch(items):
+        time.sleep(overhead_ms / 1000.0)
+        batch = np.stack(items)
+        return list(batch @ weights)
+
+    def make_input():
+        return np.random.default_rng().standard_normal((64, per_item)).astype(np.float32)
+
+    return infer_batch, make_input
+
+def deeplab_model(backbone='resnet50'):
+    """Batched DeepLabV3 forward pass on random 520x520 inputs"""
+    deeplab.get_model(backbone)
+
+    def infer_batch(items):
+        return deeplab._forward(backbone, items)
+
+    def make_input():
+        image = np.random.default_rng().integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        return deeplab.preprocess(image)
+
+    return infer_batch, make_input
+
+def run(infer_batch, make_input, clients, requests_per_client, max_batch_size, max_wait_ms):
+    """
+    Drive the scheduler with concurrent clients.
+
+    Returns:
+        dict: Throughput, latency percentiles and mean batch size
+    """
+    batcher = MicroBatcher(infer_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    inputs = [make_input() for _ in range(clients)]
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            batcher.infer(inputs[index])
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    # Warm up (model load, allocator)
+    batcher.infer(inputs[0])
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000.0
+    stats = batcher.stats()
+    return {
+        'clients': clients,
+        'max_batch_size': max_batch_size,
+        'max_wait_ms': max_wait_ms,
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / wall,
+        'latency_p50_ms': float(np.percentile(latencies_ms, 50)),
+        'latency_p95_ms': float(np.percentile(latencies_ms, 95)),
+        'mean_batch_size': stats['mean_batch_size']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--requests', type=int, default=8, help='Requests per client')
+    parser.add_argument('--synthetic', action='store_true', help='Use the synthetic model even if PyTorch is installed')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    if deeplab.TORCH_AVAILABLE and not args.synthetic:
+        model_name = 'deeplabv3_resnet50'
+        infer_batch, make_input = deeplab_model()
+    else:
+        model_name = 'synthetic'
+        infer_batch, make_input = synthetic_model()
+
+    results = []
+    print(f"model: {model_name}")
+    print(f"{'clients':>7} {'batch':>5} {'wait':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean batch':>10}")
+    for clients in args.clients:
+        for max_batch_size, max_wait_ms in SETTINGS:
+            result = run(infer_batch, make_input, clients, args.requests, max_batch_size, max_wait_ms)
+            results.append(result)
+            print(f"{clients:>7} {max_batch_size:>5} {max_wait_ms:>6.1f} {result['throughput_rps']:>8.1f} "
+                  f"{result['latency_p50_ms']:>8.1f} {result['latency_p95_ms']:>8.1f} {result['mean_batch_size']:>10.2f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'model': model_name, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Parity and latency of the DeepLabV3 runtimes: eager PyTorch, ONNX Runtime
+float32 and ONNX Runtime with dynamic int8 weights.
+
+Each runtime segments the same images; the person masks of the ONNX
+runtimes are compared with PyTorch's by intersection over union, and the
+script fails if any image falls below --min-iou. Needs PyTorch, onnx and
+onnxruntime; the pretrained weights are downloaded on first use and the
+exported models are kept in the ONNX model directory.
+
+Usage:
+    python ml-models/benchmarks/deeplab_runtime_benchmark.py --images photos/*.jpg
+    python ml-models/benchmarks/deeplab_runtime_benchmark.py --backbone resnet50 --json runtimes.json
+    python ml-models/benchmarks/deeplab_runtime_benchmark.py --backbone lraspp_mobilenet_v3_large --input-size 384
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from pipeline_benchmark import synthetic_person  # noqa: E402 (also imports ml_models)
+from ml_models import deeplab  # noqa: E402
+
+RUNTIMES = [('torch', False), ('onnx', False), ('onnx', True)]
+
+def person_masks(backbone, images, repeats, input_size):
+    """
+    Person masks from the configured runtime, timed per image.
+
+    Returns:
+        tuple: (list of boolean masks, per-call latencies in ms)
+    """
+    forward = deeplab._forward_torch if deeplab.runtime_name(backbone) == 'torch' else deeplab._forward_onnx
+    inputs = [deeplab.preprocess(image, input_size)[None] for image in images]
+    forward(backbone, inputs[0])  # warm up (model load or export)
+
+    masks, latencies = [], []
+    for image, batch in zip(images, inputs):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            margin = forward(backbone, batch)[0]
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        masks.append(deeplab.mask_from_logit(margin, image.shape, input_size) > 0)
+    return masks, latencies
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else float(np.logical_and(a, b).sum() / union)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='+', help='Person photos (default: synthetic images)')
+    parser.add_argument('--backbone', default='resnet101', choices=list(deeplab.MODELS))
+    parser.add_argument('--input-size', type=int, default=deeplab.INPUT_SIZE, help='Model input square side')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed calls per image')
+    parser.add_argument('--threads', type=int, default=0, help='ONNX Runtime threads (0 = one per core)')
+    parser.add_argument('--model-dir', help='Where exported ONNX files are kept')
+    parser.add_argument('--min-iou', type=float, default=0.95,
+                        help='Lowest acceptable per-image mask IoU against PyTorch')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    if not (deeplab.TORCH_AVAILABLE and deeplab.ONNXRUNTIME_AVAILABLE):
+        sys.exit("PyTorch and onnxruntime are both required")
+
+    if args.images:
+        images = [cv2.imread(path, cv2.IMREAD_COLOR) for path in args.images]
+        if any(image is None for image in images):
+            sys.exit("Could not read all images")
+    else:
+        images = [synthetic_person(size, seed) for seed, size in enumerate((480, 960, 1440))]
+
+    results, reference, failed = [], None, False
+    print(f"{'runtime':<10} {'p50 ms':>9} {'p95 ms':>9} {'mean IoU':>9} {'min IoU':>9}")
+    for runtime, quantize in RUNTIMES:
+        deeplab.configure_runtime(runtime=runtime, quantize=quantize, threads=args.threads,
+                                  model_dir=args.model_dir)
+        name = deeplab.runtime_name(args.backbone)
+        masks, latencies = person_masks(args.backbone, images, args.repeats, args.input_size)
+        if reference is None:
+            reference = masks
+        ious = [iou(mask, ref) for mask, ref in zip(masks, reference)]
+        failed |= min(ious) < args.min_iou
+        result = {
+            'runtime': name,
+            'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'iou_mean': round(float(np.mean(ious)), 4),
+            'iou_min': round(float(np.min(ious)), 4)
+        }
+        results.append(result)
+        print(f"{name:<10} {result['latency_p50_ms']:>9.1f} {result['latency_p95_ms']:>9.1f} "
+              f"{result['iou_mean']:>9.4f} {result['iou_min']:>9.4f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            'backbone': args.backbone,
+            'images': len(images),
+            'input_size': args.input_size,
+            'min_iou': args.min_iou,
+            'results': results
+        }, indent=2))
+    if failed:
+        sys.exit(f"Mask IoU below {args.min_iou} against PyTorch")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency and mask agreement of the GrabCut background removal modes.
+
+Each image is segmented three ways:
+
+- full_resolution: 5 GrabCut iterations on the full image (the reference)
+- working_resolution: 5 iterations on the area-averaged downsized image,
+  mask upsampled
+- coarse_to_fine: the current grabcut_mask (adaptive iterations on the
+  downsized image, boundary band re-cut at full resolution)
+
+Masks are compared by intersection over union with the full-resolution
+reference and, for the synthetic images, with the figure's ground-truth mask.
+OpenCV's random generator is reseeded before each run, since GrabCut
+initializes its colour models with k-means.
+
+Usage:
+    python ml-models/benchmarks/grabcut_benchmark.py --images photos/*.jpg
+    python ml-models/benchmarks/grabcut_benchmark.py --sizes 1920 4000 --json grabcut.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from pipeline_benchmark import synthetic_person, synthetic_person_mask  # noqa: E402 (also imports ml_models)
+from ml_models.grabcut import GRABCUT, grabcut_mask  # noqa: E402
+from ml_models.preprocessing import prepare_input  # noqa: E402
+
+def rect_grabcut(image, iterations=5):
+    """Single-scale GrabCut from the centred rectangle; 0/255 mask"""
+    h, w = image.shape[:2]
+    mask = np.zeros((h, w), np.uint8)
+    rect = (int(w * 0.1), int(h * 0.1), int(w * 0.8), int(h * 0.8))
+    cv2.grabCut(image, mask, rect, np.zeros((1, 65)), np.zeros((1, 65)), iterations, cv2.GC_INIT_WITH_RECT)
+    return np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+
+def working_resolution(image):
+    working, transform = prepare_input(image, 'grabcut')
+    return transform.to_original_mask(rect_grabcut(working))
+
+def coarse_to_fine(image):
+    mask, stats = grabcut_mask(image)
+    return mask, stats['iterations']
+
+# Mode -> callable(image) returning (0/255 mask, iterations run)
+MODES = {
+    'full_resolution': lambda image: (rect_grabcut(image), 5),
+    'working_resolution': lambda image: (working_resolution(image), 5),
+    'coarse_to_fine': coarse_to_fine,
+}
+
+def iou(a, b):
+    a, b = a > 0, b > 0
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else float(np.logical_and(a, b).sum() / union)
+
+def timed(mode, image):
+    cv2.setRNGSeed(0)
+    started = time.perf_counter()
+    mask, iterations = MODES[mode](image)
+    return mask, iterations, (time.perf_counter() - started) * 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='+', help='Person photos (default: synthetic images)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[960, 1920, 3000],
+                        help='Longest sides of the synthetic images')
+    parser.add_argument('--threads', type=int, default=1, help='OpenCV threads (0 = OpenCV default)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    if args.images:
+        images = [(path, cv2.imread(path, cv2.IMREAD_COLOR), None) for path in args.images]
+        if any(image is None for _, image, _ in images):
+            sys.exit("Could not read all images")
+    else:
+        images = [(f"synthetic-{size}", synthetic_person(size), synthetic_person_mask(size))
+                  for size in args.sizes]
+
+    results = []
+    print(f"{'image':<24} {'mode':<20} {'ms':>9} {'IoU':>7} {'GT IoU':>7} {'iterations':>10}")
+    for name, image, truth in images:
+        runs = {mode: timed(mode, image) for mode in MODES}
+        reference = runs['full_resolution'][0]
+        for mode, (mask, iterations, latency) in runs.items():
+            result = {'image': name, 'shape': list(image.shape[:2]), 'mode': mode,
+                      'latency_ms': round(latency, 1), 'iou': round(iou(mask, reference), 4),
+                      'truth_iou': round(iou(mask, truth), 4) if truth is not None else None,
+                      'iterations': iterations}
+            results.append(result)
+            truth_iou = f"{result['truth_iou']:>7.4f}" if truth is not None else f"{'-':>7}"
+            print(f"{name:<24} {mode:<20} {latency:>9.1f} {result['iou']:>7.4f} {truth_iou} {iterations:>10}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'settings': dict(GRABCUT), 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Latency, throughput and memory of the image pipelines across image sizes.
+
+Each function runs on synthetic person and garment images (seeded, so every
+run sees the same pixels) at several resolutions. Only CPU code paths that
+need no model download are used: MediaPipe pose detection is included only
+with --allow-downloads, otherwise the OpenCV fallback is measured.
+
+Results are written as JSON; pass an earlier file with --compare to see the
+change in median latency per function and size and fail on regressions.
+
+Usage:
+    python ml-models/benchmarks/pipeline_benchmark.py --json before.json
+    python ml-models/benchmarks/pipeline_benchmark.py --sizes 640 1920 --json after.json --compare before.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+import cv2
+import numpy as np
+
+def load_ml_models():
+    """Import the ml-models directory as the ml_models package"""
+    if 'ml_models' in sys.modules:
+        return sys.modules['ml_models']
+    root = Path(__file__).resolve().parent.parent
+    spec = importlib.util.spec_from_file_location(
+        'ml_models', root / '__init__.py', submodule_search_locations=[str(root)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ml_models'] = module
+    spec.loader.exec_module(module)
+    return module
+
+load_ml_models()
+from ml_models import body_detection
+from ml_models.ar_tryon import apply_virtual_tryon_opencv
+from ml_models.body_detection import detect_body_pose, extract_body_measurements, remove_background_opencv
+from ml_models.preprocessing import WORKING_RESOLUTION
+from ml_models.segmentation import segment_clothing_opencv
+
+# Longest image side of each benchmarked size; images are 3:4 portraits
+DEFAULT_SIZES = [480, 960, 1920, 3000]
+
+# Fast calls are timed in loops of at least this long, so timer resolution
+# and call overhead do not dominate their samples
+MIN_SAMPLE_SECONDS = 0.005
+
+# Normalized MediaPipe landmarks of the synthetic person
+PERSON_LANDMARKS = {
+    0: (0.5, 0.12), 11: (0.62, 0.28), 12: (0.38, 0.28), 13: (0.7, 0.44), 14: (0.3, 0.44),
+    15: (0.74, 0.58), 16: (0.26, 0.58), 23: (0.58, 0.6), 24: (0.42, 0.6),
+    25: (0.58, 0.78), 26: (0.42, 0.78), 27: (0.58, 0.95), 28: (0.42, 0.95),
+}
+
+def _draw_person(canvas, skin, shirt, trousers):
+    """Draw the figure of synthetic_person onto an image or mask"""
+    h, w = canvas.shape[:2]
+
+    def point(idx):
+        x, y = PERSON_LANDMARKS[idx]
+        return int(x * w), int(y * h)
+
+    thickness = max(2, w // 12)
+    cv2.circle(canvas, point(0), max(2, w // 12), skin, -1)
+    cv2.fillConvexPoly(canvas, np.int32([point(12), point(11), point(23), point(24)]), shirt)
+    for a, b, colour in ((11, 13, shirt), (13, 15, skin), (12, 14, shirt), (14, 16, skin),
+                         (23, 25, trousers), (25, 27, trousers), (24, 26, trousers), (26, 28, trousers)):
+        cv2.line(canvas, point(a), point(b), colour, thickness)
+    return canvas
+
+def synthetic_person(long_side, seed=0):
+    """A figure (head, torso, limbs) on a textured background"""
+    h, w = long_side, long_side * 3 // 4
+    rng = np.random.default_rng(seed)
+    image = cv2.GaussianBlur(rng.integers(150, 220, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+    return _draw_person(image, (140, 170, 210), (60, 40, 160), (90, 60, 40))
+
+def synthetic_person_mask(long_side):
+    """0/255 ground-truth foreground mask of synthetic_person"""
+    h, w = long_side, long_side * 3 // 4
+    return _draw_person(np.zeros((h, w), dtype=np.uint8), 255, 255, 255)
+
+def synthetic_garment(long_side=800, seed=1):
+    """A patterned T-shirt shape on a white backdrop, like a product photo"""
+    h, w = long_side, long_side * 4 // 5
+    image = np.full((h, w, 3), 255, dtype=np.uint8)
+    outline = np.float64([[0.3, 0.1], [0.7, 0.1], [0.95, 0.3], [0.8, 0.4], [0.75, 0.95],
+                          [0.25, 0.95], [0.2, 0.4], [0.05, 0.3]])
+    body = (outline * (w, h)).astype(np.int32)
+    rng = np.random.default_rng(seed)
+    pattern = rng.integers(0, 255, (h // 16 + 1, w // 16 + 1, 3), dtype=np.uint8)
+    pattern = cv2.resize(pattern, (w, h), interpolation=cv2.INTER_NEAREST)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(mask, [body], 255)
+    image[mask > 0] = pattern[mask > 0]
+    return image
+
+def landmarks():
+    return [{'id': idx, 'x': x, 'y': y, 'z': 0.0, 'visibility': 0.9} for idx, (x, y) in PERSON_LANDMARKS.items()]
+
+def pose_backend():
+    return 'mediapipe' if body_detection.MEDIAPIPE_AVAILABLE else 'opencv_fallback'
+
+def cases(output_dir):
+    """
+    Benchmarked calls.
+
+    Returns:
+        list: (function, backend, callable(person, garment))
+    """
+    keypoints = landmarks()
+    output_path = Path(output_dir) / 'result.png'
+    return [
+        ('apply_virtual_tryon_opencv', 'tps_working_resolution',
+         lambda person, garment: apply_virtual_tryon_opencv(person, garment, keypoints, return_image=True,
+                                                            garment_key='benchmark')),
+        ('apply_virtual_tryon_opencv', 'tps_full_resolution',
+         lambda person, garment: apply_virtual_tryon_opencv(person, garment, keypoints, return_image=True,
+                                                            full_resolution=True, garment_key='benchmark')),
+        ('segment_clothing_opencv', 'opencv',
+         lambda person, garment: segment_clothing_opencv(person)),
+        ('remove_background_opencv', 'grabcut',
+         lambda person, garment: remove_background_opencv(person, output_path)),
+        ('detect_body_pose', pose_backend(),
+         lambda person, garment: detect_body_pose(person)),
+        ('extract_body_measurements', 'keypoints',
+         lambda person, garment: extract_body_measurements(keypoints)),
+    ]
+
+def measure(call, person, garment, repeats, warmup):
+    """
+    Time a call, then run it once more under tracemalloc for peak memory.
+
+    tracemalloc sees NumPy buffers but not OpenCV's internal allocations, so
+    the peak is a lower bound on the true memory high-water mark.
+
+    Returns:
+        dict: Latency percentiles (ms), throughput and peak traced memory
+    """
+    started = time.perf_counter()
+    for _ in range(max(1, warmup)):
+        call(person, garment)
+    single = (time.perf_counter() - started) / max(1, warmup)
+    number = max(1, int(np.ceil(MIN_SAMPLE_SECONDS / max(single, 1e-9))))
+
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            call(person, garment)
+        latencies.append((time.perf_counter() - started) / number)
+
+    tracemalloc.start()
+    try:
+        call(person, garment)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        'repeats': repeats,
+        'calls_per_sample': number,
+        'latency_mean_ms': round(float(latencies_ms.mean()), 4),
+        'latency_p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'latency_p95_ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'latency_p99_ms': round(float(np.percentile(latencies_ms, 99)), 4),
+        'throughput_per_s': round(len(latencies) / float(np.sum(latencies)), 3),
+        'peak_traced_memory_mb': round(peak / 2 ** 20, 3)
+    }
+
+def environment(threads):
+    """Machine and library details stored with the results"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': threads,
+        'working_resolution': dict(WORKING_RESOLUTION)
+    }
+
+def compare(results, baseline, threshold, min_delta_ms=0.5):
+    """
+    Median latency change against a baseline run.
+
+    A slowdown is a regression when it exceeds both threshold (relative) and
+    min_delta_ms, so sub-millisecond jitter is not reported.
+
+    Returns:
+        tuple: (function, backend, size, baseline p50, p50, change, regressed)
+            rows for entries present in both runs, and whether any regressed
+    """
+    previous = {(r['function'], r['backend'], r['size']): r for r in baseline['results']}
+    rows, regressed = [], False
+    for result in results:
+        old = previous.get((result['function'], result['backend'], result['size']))
+        if old is None or not old['latency_p50_ms']:
+            continue
+        change = result['latency_p50_ms'] / old['latency_p50_ms'] - 1.0
+        slower = change > threshold and result['latency_p50_ms'] - old['latency_p50_ms'] > min_delta_ms
+        regressed |= slower
+        rows.append((result['function'], result['backend'], result['size'],
+                     old['latency_p50_ms'], result['latency_p50_ms'], change, slower))
+    return rows, regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Longest image sides')
+    parser.add_argument('--repeats', type=int, default=10, help='Timed calls per function and size')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--functions', nargs='+', help='Only benchmark these functions')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='OpenCV threads (1 gives the most stable numbers; 0 = OpenCV default)')
+    parser.add_argument('--allow-downloads', action='store_true',
+                        help='Use MediaPipe for pose detection when installed (may download its model)')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Earlier --json output to compare median latencies with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative p50 slowdown counted as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='Smallest absolute p50 slowdown counted as a regression')
+    args = parser.parse_args()
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    if not args.allow_downloads:
+        body_detection.MEDIAPIPE_AVAILABLE = False
+
+    garment = synthetic_garment()
+    results = []
+    print(f"{'function':<28} {'backend':<24} {'size':>6} {'p50 ms':>9} {'p95 ms':>9} {'calls/s':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        benchmarks = [case for case in cases(output_dir) if not args.functions or case[0] in args.functions]
+        for size in args.sizes:
+            person = synthetic_person(size)
+            for function, backend, call in benchmarks:
+                result = {'function': function, 'backend': backend, 'size': size,
+                          'image_shape': list(person.shape[:2]),
+                          **measure(call, person, garment, args.repeats, args.warmup)}
+                results.append(result)
+                print(f"{function:<28} {backend:<24} {size:>6} {result['latency_p50_ms']:>9.2f} "
+                      f"{result['latency_p95_ms']:>9.2f} {result['throughput_per_s']:>9.1f} "
+                      f"{result['peak_traced_memory_mb']:>8.1f}")
+
+    report = {'environment': environment(args.threads), 'results': results}
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        rows, regressed = compare(results, json.loads(Path(args.compare).read_text()),
+                                  args.threshold, args.min_delta_ms)
+        print(f"\n{'function':<28} {'backend':<24} {'size':>6} {'base p50':>9} {'p50':>9} {'change':>8}")
+        for function, backend, size, before, after, change, slower in rows:
+            flag = '  REGRESSION' if slower else ''
+            print(f"{function:<28} {backend:<24} {size:>6} {before:>9.2f} {after:>9.2f} {change:>+8.1%}{flag}")
+        if regressed:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 """Body shape detection using MediaPipe/Microsoft Human Pose with fallback"""
+import copy
 import logging
 import cv2
 import numpy as np
-from pathlib import Path
+
+from .image_io import is_image_path, load_image, resolve_output_path
+from .preprocessing import prepare_input, WORKING_RESOLUTION
+from . import deeplab, grabcut
+from .grabcut import grabcut_mask
+from .keypoints import Keypoints, keypoint_array, stack_keypoints
+from .pose_cache import PoseCache, PoseCacheEntry, image_content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -13,45 +20,153 @@ except ImportError:
     MEDIAPIPE_AVAILABLE = False
     logger.warning("MediaPipe not available, using fallback detection")
 
-# Try to import DeepLabV3 for background removal
-try:
-    import torch
-    import torchvision
-    DEEPLABV3_AVAILABLE = True
-except ImportError:
-    DEEPLABV3_AVAILABLE = False
+# DeepLabV3 for background removal
+DEEPLABV3_AVAILABLE = deeplab.TORCH_AVAILABLE
+if not DEEPLABV3_AVAILABLE:
     logger.warning("DeepLabV3 not available, using OpenCV fallback for background removal")
 
-def detect_body_pose(image_path):
+# Versions of the background removal backends. Bump these whenever a change
+# alters their output so cached results are not reused.
+DEEPLABV3_MODEL_VERSION = 'coco-v3'
+GRABCUT_VERSION = 'rect-v3'
+
+# MediaPipe Pose settings. Overridden from the backend Config at startup.
+POSE = {
+    'model_complexity': 2,
+}
+
+# Pose results with their body measurements, by image content hash, model
+# complexity and mask resolution, so an image already seen needs no inference
+pose_cache = PoseCache(max_entries=256)
+
+def configure_pose(model_complexity=None, cache_size=None):
+    """
+    Set the MediaPipe Pose model complexity (0-2) and the pose cache size.
+
+    Example:
+        configure_pose(model_complexity=1, cache_size=512)
+    """
+    if model_complexity is not None:
+        if int(model_complexity) not in (0, 1, 2):
+            raise ValueError(f"Pose model complexity must be 0, 1 or 2: {model_complexity}")
+        POSE['model_complexity'] = int(model_complexity)
+    if cache_size is not None:
+        pose_cache.resize(cache_size)
+
+def detect_body_pose(image, full_resolution_mask=False):
     """
     Detect body pose and return keypoints with segmentation mask.
     Uses MediaPipe Pose for accurate keypoint detection.
     
+    Inference runs on a copy downsized to the 'pose' working resolution.
+    Keypoints are normalized, so they apply to the original image unchanged.
+    Results are cached by image content (see analyze_pose).
+    
+    Args:
+        image: Path to the image file, encoded image bytes or a BGR ndarray
+        full_resolution_mask: Upsample the segmentation mask to the original
+            image size (otherwise it stays at working resolution)
+        
+    Returns:
+        dict: Contains keypoints, landmarks, segmentation_mask (optional),
+            confidence and pose_id (when cached)
+    """
+    return analyze_pose(image, full_resolution_mask)[0]
+
+def analyze_pose(image, full_resolution_mask=False):
+    """
+    Pose and body measurements of an image, without inference when the same
+    image was analysed before with the same model complexity.
+    
+    MediaPipe results (including "no person found") are cached under the
+    image's content hash, which is returned as the pose's pose_id; see
+    cached_pose. Each call returns fresh dicts that callers may modify.
+    
     Args:
-        image_path: Path to the image file
+        image: Path to the image file, encoded image bytes or a BGR ndarray
+        full_resolution_mask: As for detect_body_pose
         
     Returns:
-        dict: Contains keypoints, landmarks, segmentation_mask (optional), confidence
+        tuple: (detect_body_pose result or None, extract_body_measurements
+            result or None)
+    """
+    entry, key = _pose_entry(image, full_resolution_mask)
+    pose = entry.pose()
+    if pose is not None and key:
+        pose['pose_id'] = key[0]
+    return pose, copy.deepcopy(entry.measurements)
+
+def pose_keypoints(images, full_resolution_mask=False):
+    """
+    Keypoints of many images as one (N, 33, 4) float32 array, for offline
+    analysis with batch_body_measurements.
+    
+    Shares the pose cache with analyze_pose but builds no landmark dicts or
+    masks; images without a person give all-NaN poses.
+    
+    Example:
+        poses = pose_keypoints(paths)
+        shapes = batch_body_measurements(poses)['body_shape']
     """
+    return stack_keypoints([_pose_entry(image, full_resolution_mask)[0].keypoints for image in images])
+
+def _pose_entry(image, full_resolution_mask):
+    """The image's PoseCacheEntry, running inference on a miss, and its cache key (None if uncached)"""
+    key = None
+    if MEDIAPIPE_AVAILABLE:
+        content_hash = image_content_hash(image)
+        if content_hash:
+            key = (content_hash, POSE['model_complexity'], bool(full_resolution_mask))
+    
+    entry = pose_cache.get(key) if key else None
+    if entry is None:
+        pose = _detect_body_pose(image, full_resolution_mask)
+        measurements = extract_body_measurements(pose['keypoints']) if pose and pose.get('keypoints') else None
+        entry = PoseCacheEntry(pose, measurements)
+        # Fallback estimates are instant and must not mask a later MediaPipe result
+        if key and (pose is None or pose.get('method') == 'mediapipe'):
+            pose_cache.put(key, entry)
+        else:
+            key = None
+    return entry, key
+
+def cached_pose(pose_id):
+    """
+    Pose and measurements cached under a pose_id, or (None, None) if the
+    image has not been analysed (or its entry was evicted).
+    """
+    for full_resolution_mask in (False, True):
+        entry = pose_cache.get((pose_id, POSE['model_complexity'], full_resolution_mask))
+        if entry is not None and entry.found:
+            pose = entry.pose()
+            pose['pose_id'] = pose_id
+            return pose, copy.deepcopy(entry.measurements)
+    return None, None
+
+def _detect_body_pose(image, full_resolution_mask=False):
+    """detect_body_pose without the cache ('keypoints' may be Keypoints)"""
     try:
+        # Decode once so the fallback does not read the image again
+        image = load_image(image)
+        
         if not MEDIAPIPE_AVAILABLE:
-            return detect_body_pose_fallback(image_path)
+            return detect_body_pose_fallback(image)
         
         mp_pose = mp.solutions.pose
         
-        # Read image
-        image = cv2.imread(str(image_path))
         if image is None:
             raise ValueError("Could not read image")
         
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         h, w, _ = image.shape
+        working, transform = prepare_input(image, 'pose')
+        
+        # Convert BGR to RGB
+        image_rgb = cv2.cvtColor(working, cv2.COLOR_BGR2RGB)
         
         # Initialize pose detection
         with mp_pose.Pose(
             static_image_mode=True,
-            model_complexity=2,
+            model_complexity=POSE['model_complexity'],
             enable_segmentation=True,
             min_detection_confidence=0.5
         ) as pose:
@@ -60,23 +175,18 @@ def detect_body_pose(image_path):
             if not results.pose_landmarks:
                 return None
             
-            # Extract keypoints
+            # Extract keypoints (landmark dicts are built from the cache entry)
             landmarks = results.pose_landmarks.landmark
-            keypoints = []
-            
-            for idx, landmark in enumerate(landmarks):
-                keypoints.append({
-                    'id': idx,
-                    'x': landmark.x,
-                    'y': landmark.y,
-                    'z': landmark.z,
-                    'visibility': landmark.visibility
-                })
+            keypoints = Keypoints.from_landmarks(landmarks)
             
             # Get segmentation mask if available
             segmentation_mask = None
             if results.segmentation_mask is not None:
-                segmentation_mask = (results.segmentation_mask > 0.5).astype(np.uint8) * 255
+                probabilities = results.segmentation_mask
+                if full_resolution_mask and not transform.is_identity:
+                    # Upsample the soft mask before thresholding for clean edges
+                    probabilities = cv2.resize(probabilities, (w, h), interpolation=cv2.INTER_LINEAR)
+                segmentation_mask = (probabilities > 0.5).astype(np.uint8) * 255
             
             return {
                 'keypoints': keypoints,
@@ -85,17 +195,18 @@ def detect_body_pose(image_path):
                 'confidence': 0.85,
                 'method': 'mediapipe',
                 'image_width': w,
-                'image_height': h
+                'image_height': h,
+                'transform': transform.to_dict()
             }
             
     except Exception as e:
         logger.error(f"MediaPipe pose detection failed: {e}")
-        return detect_body_pose_fallback(image_path)
+        return detect_body_pose_fallback(image)
 
-def detect_body_pose_fallback(image_path):
+def detect_body_pose_fallback(image):
     """Fallback pose detection using OpenCV"""
     try:
-        image = cv2.imread(str(image_path))
+        image = load_image(image)
         if image is None:
             raise ValueError("Could not read image")
         
@@ -128,80 +239,35 @@ def detect_body_pose_fallback(image_path):
 def extract_body_measurements(keypoints):
     """
     Extract body measurements from pose keypoints.
+    
     Computes shoulder width, torso length, hip width, and classifies body shape.
     
     Args:
-        keypoints: List of keypoint dictionaries from detect_body_pose
+        keypoints: List of keypoint dictionaries from detect_body_pose,
+            Keypoints or a (33, 4) keypoint array
         
     Returns:
         dict: Contains measurements and body_shape classification
     """
     try:
-        if not keypoints or len(keypoints) < 5:
+        if keypoints is None or len(keypoints) < 5:
             return {
                 'error': 'Insufficient keypoints for measurement',
                 'body_shape': 'unknown'
             }
         
-        # Convert keypoints list to dict for easier access
-        kp_dict = {kp['id']: kp for kp in keypoints}
-        
-        # MediaPipe pose landmark indices
-        # 11: left shoulder, 12: right shoulder
-        # 23: left hip, 24: right hip
-        # 0: nose, 11: left shoulder (for torso length approximation)
-        
-        measurements = {}
-        
-        # Shoulder width
-        if 11 in kp_dict and 12 in kp_dict:
-            shoulder_left = kp_dict[11]
-            shoulder_right = kp_dict[12]
-            shoulder_width = abs(shoulder_left['x'] - shoulder_right['x'])
-            measurements['shoulder_width'] = float(shoulder_width)
-        else:
-            measurements['shoulder_width'] = 0.4  # default
-        
-        # Hip width
-        if 23 in kp_dict and 24 in kp_dict:
-            hip_left = kp_dict[23]
-            hip_right = kp_dict[24]
-            hip_width = abs(hip_left['x'] - hip_right['x'])
-            measurements['hip_width'] = float(hip_width)
-        else:
-            measurements['hip_width'] = 0.38  # default
-        
-        # Torso length (nose to hip midpoint)
-        if 0 in kp_dict and 23 in kp_dict and 24 in kp_dict:
-            nose = kp_dict[0]
-            hip_left = kp_dict[23]
-            hip_right = kp_dict[24]
-            hip_mid_y = (hip_left['y'] + hip_right['y']) / 2
-            torso_length = abs(hip_mid_y - nose['y'])
-            measurements['torso_length'] = float(torso_length)
-        else:
-            measurements['torso_length'] = 0.5  # default
-        
-        # Calculate body shape based on proportions
-        shoulder_width = measurements.get('shoulder_width', 0.4)
-        hip_width = measurements.get('hip_width', 0.38)
-        ratio = shoulder_width / hip_width if hip_width > 0 else 1.0
-        measurements['shoulder_hip_ratio'] = float(ratio)
-        
-        # Classify body shape
-        if ratio > 1.1:
-            body_shape = 'inverted_triangle'
-        elif ratio < 0.9:
-            body_shape = 'pear'
-        elif 0.95 <= ratio <= 1.05:
-            body_shape = 'hourglass'
-        else:
-            body_shape = 'rectangle'
+        # float64 so measurements of JSON keypoints are exactly as sent
+        batch = batch_body_measurements(keypoint_array(keypoints, np.float64)[np.newaxis])
+        if not batch['valid'][0]:
+            return {
+                'error': 'Insufficient keypoints for measurement',
+                'body_shape': 'unknown'
+            }
         
         return {
-            'measurements': measurements,
-            'body_shape': body_shape,
-            'confidence': 0.8 if len(keypoints) > 15 else 0.6
+            'measurements': {name: float(batch[name][0]) for name in MEASUREMENT_NAMES},
+            'body_shape': str(batch['body_shape'][0]),
+            'confidence': float(batch['confidence'][0])
         }
         
     except Exception as e:
@@ -212,75 +278,140 @@ def extract_body_measurements(keypoints):
             'measurements': {}
         }
 
-def remove_background(image_path, output_path=None):
+# batch_body_measurements outputs per pose, as in extract_body_measurements
+MEASUREMENT_NAMES = ('shoulder_width', 'hip_width', 'torso_length', 'shoulder_hip_ratio')
+
+def batch_body_measurements(poses):
+    """
+    Body measurements of a batch of poses at once.
+    
+    Same rules as extract_body_measurements: landmark widths fall back to
+    defaults when either landmark is missing, and poses with fewer than 5
+    landmarks are not measured.
+    
+    Args:
+        poses: (N, 33, 4) keypoint array (see stack_keypoints), NaN rows
+            for missing landmarks
+        
+    Returns:
+        dict: (N,) arrays for each of MEASUREMENT_NAMES, body_shape,
+            confidence and valid; invalid poses have body_shape 'unknown'
+            and confidence 0
+    """
+    poses = np.asarray(poses)
+    present = ~np.isnan(poses[..., 0])
+    x, y = poses[..., 0], poses[..., 1]
+    count = present.sum(axis=1)
+    
+    # MediaPipe pose landmark indices
+    # 11: left shoulder, 12: right shoulder
+    # 23: left hip, 24: right hip
+    # 0: nose (torso length is nose to hip midpoint)
+    shoulders = present[:, 11] & present[:, 12]
+    hips = present[:, 23] & present[:, 24]
+    shoulder_width = np.where(shoulders, np.abs(x[:, 11] - x[:, 12]), 0.4)
+    hip_width = np.where(hips, np.abs(x[:, 23] - x[:, 24]), 0.38)
+    hip_mid_y = (y[:, 23] + y[:, 24]) / 2
+    torso_length = np.where(hips & present[:, 0], np.abs(hip_mid_y - y[:, 0]), 0.5)
+    
+    ratio = np.ones_like(shoulder_width)
+    np.divide(shoulder_width, hip_width, out=ratio, where=hip_width > 0)
+    
+    body_shape = np.select(
+        [ratio > 1.1, ratio < 0.9, (ratio >= 0.95) & (ratio <= 1.05)],
+        ['inverted_triangle', 'pear', 'hourglass'],
+        'rectangle'
+    )
+    valid = count >= 5
+    return {
+        'shoulder_width': shoulder_width,
+        'hip_width': hip_width,
+        'torso_length': torso_length,
+        'shoulder_hip_ratio': ratio,
+        'body_shape': np.where(valid, body_shape, 'unknown'),
+        'confidence': np.where(valid, np.where(count > 15, 0.8, 0.6), 0.0),
+        'valid': valid
+    }
+
+def _nobg_filename(input_path):
+    """Output file name for a background-removed image"""
+    return f"{input_path.stem}_nobg.png"
+
+def _original_or_none(image):
+    """Ultimate fallback result: the input path if there is one on disk"""
+    return str(image) if is_image_path(image) else None
+
+def background_removal_backend(method=None):
+    """
+    Resolve which backend remove_background will use.
+    
+    Args:
+        method: 'deeplabv3', 'grabcut' or None for the best available
+        
+    Returns:
+        tuple: (method, model_version), suitable as part of a result cache key
+    """
+    if method not in (None, 'deeplabv3', 'grabcut'):
+        raise ValueError(f"Unknown background removal method: {method}")
+    
+    if method != 'grabcut' and DEEPLABV3_AVAILABLE:
+        return 'deeplabv3', f"{DEEPLABV3_MODEL_VERSION}-{deeplab.model_tag('background')}"
+    # GrabCut output depends on the resolution it runs at and its settings
+    return 'grabcut', f"{GRABCUT_VERSION}-{WORKING_RESOLUTION['grabcut']}-{grabcut.settings_tag()}"
+
+def remove_background(image, output_path=None, method=None, strict=False):
     """
     Remove background from image using DeepLabV3 with OpenCV fallback.
     Returns path to image with transparent background (PNG).
     
     Args:
-        image_path: Path to input image
-        output_path: Optional path for output (auto-generated if None)
+        image: Path to input image, encoded image bytes or a BGR ndarray
+        output_path: Optional path for output (auto-generated next to the
+            input if None; required for in-memory images)
+        method: Force 'deeplabv3' or 'grabcut' (default: best available)
+        strict: Raise if the resolved backend fails instead of falling back
+            (for results cached under that backend's key)
         
     Returns:
         str: Path to output image with transparent background
     """
     try:
-        if DEEPLABV3_AVAILABLE:
-            return remove_background_deeplabv3(image_path, output_path)
+        # Decode once and hand the array down the fallback chain
+        image_data = load_image(image)
+        if image_data is None:
+            raise ValueError("Could not read image")
+        output_path = resolve_output_path(image, output_path, _nobg_filename)
+        
+        if background_removal_backend(method)[0] == 'deeplabv3':
+            return remove_background_deeplabv3(image_data, output_path, strict)
         else:
-            return remove_background_opencv(image_path, output_path)
+            return remove_background_opencv(image_data, output_path, strict)
             
     except Exception as e:
         logger.error(f"Background removal failed: {e}")
+        if strict:
+            raise
         # Return original image path as fallback
-        return str(image_path)
+        return _original_or_none(image)
 
-def remove_background_deeplabv3(image_path, output_path=None):
-    """Remove background using DeepLabV3 segmentation"""
+def remove_background_deeplabv3(image, output_path=None, strict=False):
+    """Remove background using DeepLabV3 segmentation (GrabCut on failure unless strict)"""
     try:
-        # Load pre-trained DeepLabV3 model
-        model = torchvision.models.segmentation.deeplabv3_resnet101(pretrained=True)
-        model.eval()
-        
-        # Read and preprocess image
-        image = cv2.imread(str(image_path))
+        # Read image
+        source = image
+        image = load_image(source)
         if image is None:
             raise ValueError("Could not read image")
         
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        h, w, _ = image.shape
-        
-        # Prepare input for model
-        from torchvision import transforms
-        preprocess = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize((520, 520)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        
-        input_tensor = preprocess(image_rgb)
-        input_batch = input_tensor.unsqueeze(0)
-        
-        # Run inference
-        with torch.no_grad():
-            output = model(input_batch)['out'][0]
-        
-        # Get person segmentation mask (class 15 in COCO)
-        output_predictions = output.argmax(0).byte().cpu().numpy()
-        mask = (output_predictions == 15).astype(np.uint8) * 255
-        
-        # Resize mask to original size
-        mask = cv2.resize(mask, (w, h))
+        # The model is loaded once; concurrent requests share a batched forward pass
+        mask = deeplab.person_mask(image, 'background')
         
         # Apply mask to create transparent background
         image_rgba = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
         image_rgba[:, :, 3] = mask
         
         # Generate output path
-        if output_path is None:
-            input_path = Path(image_path)
-            output_path = input_path.parent / f"{input_path.stem}_nobg.png"
+        output_path = resolve_output_path(source, output_path, _nobg_filename)
         
         # Save result
         cv2.imwrite(str(output_path), image_rgba)
@@ -290,42 +421,29 @@ def remove_background_deeplabv3(image_path, output_path=None):
         
     except Exception as e:
         logger.error(f"DeepLabV3 background removal failed: {e}")
-        return remove_background_opencv(image_path, output_path)
+        if strict:
+            raise
+        return remove_background_opencv(image, output_path)
 
-def remove_background_opencv(image_path, output_path=None):
-    """Fallback background removal using OpenCV GrabCut"""
+def remove_background_opencv(image, output_path=None, strict=False):
+    """Fallback background removal using OpenCV GrabCut (raises on failure if strict)"""
+    source = image
     try:
         # Read image
-        image = cv2.imread(str(image_path))
+        image = load_image(source)
         if image is None:
             raise ValueError("Could not read image")
         
-        h, w, _ = image.shape
-        
-        # Create mask for GrabCut
-        mask = np.zeros((h, w), np.uint8)
-        
-        # Define rectangle around the subject (assuming center composition)
-        rect = (int(w * 0.1), int(h * 0.1), int(w * 0.8), int(h * 0.8))
-        
-        # Initialize background and foreground models
-        bgd_model = np.zeros((1, 65), np.float64)
-        fgd_model = np.zeros((1, 65), np.float64)
-        
-        # Run GrabCut
-        cv2.grabCut(image, mask, rect, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_RECT)
-        
-        # Create binary mask
-        mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
+        # GrabCut cost grows with pixel count: segment a downsized copy, then
+        # refine only the boundary band at full resolution
+        mask, _ = grabcut_mask(image)
         
         # Apply mask to create transparent background
         image_rgba = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
-        image_rgba[:, :, 3] = mask2 * 255
+        image_rgba[:, :, 3] = mask
         
         # Generate output path
-        if output_path is None:
-            input_path = Path(image_path)
-            output_path = input_path.parent / f"{input_path.stem}_nobg.png"
+        output_path = resolve_output_path(source, output_path, _nobg_filename)
         
         # Save result
         cv2.imwrite(str(output_path), image_rgba)
@@ -335,34 +453,37 @@ def remove_background_opencv(image_path, output_path=None):
         
     except Exception as e:
         logger.error(f"OpenCV background removal failed: {e}")
-        return str(image_path)
+        if strict:
+            raise
+        return _original_or_none(source)
 
 # Legacy function for backward compatibility
-def detect_body_shape_mediapipe(image_path):
+def detect_body_shape_mediapipe(image):
     """Detect body shape using MediaPipe Pose (legacy function, use detect_body_pose instead)"""
     try:
-        pose_data = detect_body_pose(image_path)
+        # Shares cached pose results with detect_body_pose
+        pose_data, measurements = analyze_pose(image)
         if not pose_data:
             return None
-        
-        measurements = extract_body_measurements(pose_data['keypoints'])
+        measurements = measurements or {}
         
         return {
             'body_type': measurements.get('body_shape', 'unknown'),
             'measurements': measurements.get('measurements', {}),
             'confidence': pose_data.get('confidence', 0.5),
             'method': pose_data.get('method', 'mediapipe'),
-            'landmarks_detected': pose_data.get('landmarks_count', 0)
+            'landmarks_detected': pose_data.get('landmarks_count', 0),
+            'pose_id': pose_data.get('pose_id')
         }
     except Exception as e:
         logger.error(f"MediaPipe detection failed: {e}")
         return None
 
-def detect_body_shape_fallback(image_path):
+def detect_body_shape_fallback(image):
     """Fallback body shape detection using OpenCV (legacy function)"""
     try:
         # Read image
-        image = cv2.imread(image_path)
+        image = load_image(image)
         if image is None:
             raise ValueError("Could not read image")
         
@@ -416,13 +537,21 @@ def detect_body_shape_fallback(image_path):
             'error': str(e)
         }
 
-def detect_body_shape(image_path):
-    """Main entry point for body shape detection (legacy function)"""
+def detect_body_shape(image):
+    """
+    Main entry point for body shape detection (legacy function)
+    
+    Args:
+        image: Path to the image file, encoded image bytes or a BGR ndarray
+    """
+    # Decode once for both strategies
+    image = load_image(image)
+    
     # Try MediaPipe first
     if MEDIAPIPE_AVAILABLE:
-        result = detect_body_shape_mediapipe(image_path)
+        result = detect_body_shape_mediapipe(image)
         if result:
             return result
     
     # Fallback to OpenCV
-    return detect_body_shape_fallback(image_path)
+    return detect_body_shape_fallback(image)
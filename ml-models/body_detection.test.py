@@ -1,4 +1,5 @@
 """Unit tests for body detection module"""
+import json
 import pytest
 import cv2
 import numpy as np
@@ -76,6 +77,18 @@ class TestBodyPoseDetection:
         result = detect_body_pose('nonexistent.jpg')
         assert result is None or 'error' in result
     
+    def test_detect_body_pose_from_memory(self, test_image):
+        """Test pose detection accepts encoded bytes and decoded arrays"""
+        with open(test_image, 'rb') as f:
+            data = f.read()
+        
+        from_bytes = detect_body_pose(data)
+        from_array = detect_body_pose(cv2.imread(test_image))
+        
+        assert from_bytes is not None
+        assert from_array is not None
+        assert from_bytes['image_width'] == from_array['image_width'] == 640
+    
     def test_detect_body_pose_keypoints_structure(self, test_image):
         """Test that keypoints have correct structure"""
         result = detect_body_pose(test_image)
@@ -98,6 +111,750 @@ class TestBodyPoseDetection:
         if result['method'] == 'mediapipe':
             assert result['landmarks_count'] > 0
 
+class TestWorkingResolution:
+    """Tests for resolution-capped preprocessing"""
+    
+    def test_prepare_input_caps_longest_side(self):
+        """Test large images are downsized with a transform record"""
+        from ml_models.preprocessing import prepare_input
+        
+        image = np.zeros((3000, 2000, 3), dtype=np.uint8)
+        working, transform = prepare_input(image, max_side=600)
+        
+        assert working.shape[:2] == (600, 400)
+        assert transform.original_size == (2000, 3000)
+        np.testing.assert_allclose(transform.to_original_points([[300, 200]]), [[1500, 1000]])
+        assert transform.to_original_bbox((100, 100, 50, 50)) == (500, 500, 250, 250)
+        
+        mask = np.zeros((600, 400), dtype=np.uint8)
+        mask[100:200, 100:200] = 255
+        assert transform.to_original_mask(mask).shape == (3000, 2000)
+    
+    def test_remove_background_keeps_original_size(self, test_image):
+        """Test background removal output is full resolution after downsized GrabCut"""
+        from ml_models.preprocessing import WORKING_RESOLUTION
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = Path(tmp) / 'result.png'
+            previous = WORKING_RESOLUTION['grabcut']
+            WORKING_RESOLUTION['grabcut'] = 320
+            try:
+                remove_background(test_image, output_path)
+            finally:
+                WORKING_RESOLUTION['grabcut'] = previous
+            
+            result = cv2.imread(str(output_path), cv2.IMREAD_UNCHANGED)
+            assert result.shape == (480, 640, 4)
+
+class TestGrabCut:
+    """Tests for coarse-to-fine GrabCut"""
+
+    def test_coarse_to_fine_mask_matches_subject(self):
+        """Test the refined full-resolution mask follows the subject's edges"""
+        from ml_models.grabcut import grabcut_mask, GRABCUT
+        from ml_models.preprocessing import WORKING_RESOLUTION
+
+        rng = np.random.default_rng(0)
+        image = rng.integers(170, 230, (900, 600, 3), dtype=np.uint8)
+        truth = np.zeros((900, 600), dtype=bool)
+        truth[203:701, 157:443] = True
+        image[truth] = rng.integers(20, 80, (truth.sum(), 3), dtype=np.uint8)
+
+        previous = WORKING_RESOLUTION['grabcut']
+        WORKING_RESOLUTION['grabcut'] = 200
+        try:
+            mask, stats = grabcut_mask(image)
+        finally:
+            WORKING_RESOLUTION['grabcut'] = previous
+
+        assert mask.shape == (900, 600)
+        assert 1 <= stats['iterations'] <= GRABCUT['max_iterations']
+        assert stats['refined_tiles'] > 0
+        # Exact edges at full resolution, not the coarse mask's 4.5 px steps
+        assert np.count_nonzero((mask > 0) != truth) < 0.002 * truth.size
+
+    def test_coarse_pass_sees_original_colours(self, monkeypatch):
+        """Test the working image is sampled, without colours blended across edges"""
+        from ml_models import grabcut
+
+        image = np.full((1200, 900, 3), 200, dtype=np.uint8)
+        image[301:899, 299:601] = (90, 60, 40)
+        seen = {}
+        coarse = grabcut.coarse_grabcut
+
+        def capture(working, *args):
+            seen['working'] = working
+            return coarse(working, *args)
+
+        monkeypatch.setattr(grabcut, 'coarse_grabcut', capture)
+        grabcut.grabcut_mask(image)
+
+        colours = np.unique(seen['working'].reshape(-1, 3), axis=0)
+        assert max(seen['working'].shape[:2]) < 1200
+        assert colours.tolist() == [[90, 60, 40], [200, 200, 200]]
+
+    def test_settings_are_part_of_cache_key(self):
+        """Test changing GrabCut settings changes the background removal version"""
+        from ml_models.body_detection import background_removal_backend
+        from ml_models.grabcut import configure_grabcut
+
+        before = background_removal_backend('grabcut')
+        try:
+            configure_grabcut(refine_band=0)
+            assert background_removal_backend('grabcut') != before
+        finally:
+            configure_grabcut(refine_band=2)
+        assert background_removal_backend('grabcut') == before
+
+class TestPoseCache:
+    """Tests for the content-addressed pose cache"""
+
+    def test_same_image_runs_inference_once(self, monkeypatch):
+        """Test every pose consumer shares one inference per image and model complexity"""
+        from ml_models import body_detection
+
+        calls = []
+        mask = np.zeros((40, 30), dtype=np.uint8)
+        mask[5:35, 10:20] = 255
+
+        def fake_pose(image, full_resolution_mask=False):
+            calls.append(image.shape)
+            keypoints = [{'id': i, 'x': 0.3 + 0.01 * i, 'y': 0.02 * i, 'z': 0.0, 'visibility': 0.9}
+                         for i in range(33)]
+            return {'keypoints': keypoints, 'landmarks_count': 33, 'segmentation_mask': mask.copy(),
+                    'confidence': 0.85, 'method': 'mediapipe', 'transform': {'scale': [1.0, 1.0]}}
+
+        monkeypatch.setattr(body_detection, 'MEDIAPIPE_AVAILABLE', True)
+        monkeypatch.setattr(body_detection, '_detect_body_pose', fake_pose)
+        monkeypatch.setattr(body_detection, 'pose_cache', body_detection.PoseCache(max_entries=8))
+        image = np.random.default_rng(0).integers(0, 255, (40, 30, 3), dtype=np.uint8)
+
+        first = body_detection.detect_body_pose(image)
+        first['keypoints'][0]['x'] = -1.0  # callers get their own copies
+        pose, measurements = body_detection.analyze_pose(image.copy())
+        shape = body_detection.detect_body_shape(image)
+        assert len(calls) == 1
+        assert pose['keypoints'][0]['x'] == pytest.approx(0.3)
+        np.testing.assert_array_equal(pose['segmentation_mask'], mask)
+        assert shape['body_type'] == measurements['body_shape']
+        assert shape['pose_id'] == pose['pose_id'] == first['pose_id']
+
+        cached, _ = body_detection.cached_pose(pose['pose_id'])
+        assert cached['keypoints'] == pose['keypoints']
+        assert body_detection.cached_pose('0' * 64) == (None, None)
+
+        try:
+            body_detection.configure_pose(model_complexity=1)
+            body_detection.detect_body_pose(image)
+            assert len(calls) == 2
+        finally:
+            body_detection.configure_pose(model_complexity=2)
+
+class TestMaskCodec:
+    """Tests for the compact mask encodings"""
+
+    def test_round_trip(self):
+        """Test masks survive both encodings unchanged"""
+        from ml_models.mask_codec import decode_mask, encode_mask, MASK_ENCODINGS
+
+        rng = np.random.default_rng(0)
+        masks = [np.zeros((7, 5), np.uint8), np.full((5, 7), 255, np.uint8),
+                 (rng.random((37, 53)) > 0.5).astype(np.uint8) * 255]
+        for mask in masks:
+            for encoding in MASK_ENCODINGS:
+                encoded = encode_mask(mask, encoding)
+                assert encoded['size'] == list(mask.shape)
+                json.dumps(encoded)
+                np.testing.assert_array_equal(decode_mask(encoded), mask)
+
+    def test_rle_matches_coco(self):
+        """Test runs are column-major and counts use COCO's compressed strings"""
+        from ml_models.mask_codec import counts_from_string, counts_to_string, decode_mask, rle_counts
+
+        mask = np.array([[0, 1, 1],
+                         [0, 1, 0]], dtype=np.uint8)
+        np.testing.assert_array_equal(rle_counts(mask), [2, 3, 1])
+        assert counts_to_string([2, 3, 4, 5]) == '2342'
+        assert counts_to_string([1, 100, 1, 2]) == '1T31nL'
+        np.testing.assert_array_equal(counts_from_string('1T31nL'), [1, 100, 1, 2])
+        # Uncompressed COCO RLE is accepted too
+        np.testing.assert_array_equal(decode_mask({'size': [2, 3], 'counts': [2, 3, 1]}), mask * 255)
+        with pytest.raises(ValueError):
+            decode_mask({'size': [2, 3], 'counts': [2, 2]})
+
+class TestKeypoints:
+    """Tests for array-backed keypoints and batch measurements"""
+
+    def test_dict_round_trip(self):
+        """Test landmark dicts map to a (33, 4) float32 array with NaN for missing ids"""
+        from ml_models.keypoints import Keypoints
+
+        dicts = [{'id': 0, 'x': 0.5, 'y': 0.25, 'z': -0.5, 'visibility': 0.75},
+                 {'id': 12, 'x': 0.125, 'y': 0.375, 'z': 0.0, 'visibility': 1.0}]
+        keypoints = Keypoints.from_dicts(dicts)
+        assert keypoints.array.shape == (33, 4) and keypoints.array.dtype == np.float32
+        assert len(keypoints) == 2
+        assert np.isnan(keypoints.array[1]).all()
+        assert keypoints.to_dicts() == dicts
+        with pytest.raises(AttributeError):
+            keypoints.extra = 1
+
+    def test_batch_matches_single_pose(self):
+        """Test batch measurements agree with extract_body_measurements pose by pose"""
+        from ml_models.body_detection import batch_body_measurements, MEASUREMENT_NAMES
+        from ml_models.keypoints import stack_keypoints
+
+        rng = np.random.default_rng(0)
+        poses = [None, []]
+        for n in (3, 5, 10, 16, 33):
+            ids = np.sort(rng.choice(33, n, replace=False)) if n < 33 else range(33)
+            poses.append([{'id': int(i), 'x': float(rng.random()), 'y': float(rng.random()),
+                           'z': 0.0, 'visibility': 1.0} for i in ids])
+        poses.append([{'id': i, 'x': x, 'y': 0.5, 'z': 0.0, 'visibility': 1.0}
+                      for i, x in ((0, 0.5), (11, 0.3), (12, 0.7), (23, 0.45), (24, 0.55))])
+
+        batch = batch_body_measurements(stack_keypoints(poses))
+        for i, pose in enumerate(poses):
+            single = extract_body_measurements(pose)
+            assert batch['body_shape'][i] == single['body_shape']
+            if batch['valid'][i]:
+                assert batch['confidence'][i] == single['confidence']
+                for name in MEASUREMENT_NAMES:
+                    assert batch[name][i] == pytest.approx(single['measurements'][name], rel=1e-5)
+        assert list(batch['valid']) == [False, False, False, True, True, True, True, True]
+        assert batch['body_shape'][-1] == 'inverted_triangle'
+
+class TestMicroBatching:
+    """Tests for the micro-batching inference scheduler"""
+    
+    def test_concurrent_requests_share_batches(self):
+        """Test requests arriving together are merged and routed back in order"""
+        import threading
+        from ml_models.batching import MicroBatcher
+        
+        sizes = []
+        def infer_batch(items):
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(infer_batch, max_batch_size=4, max_wait_ms=200)
+        results = {}
+        def call(i):
+            results[i] = batcher.infer(i, timeout=5)
+        
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == {i: i * 2 for i in range(8)}
+        assert max(sizes) <= 4
+        assert len(sizes) < 8
+        assert batcher.stats()['items'] == 8
+    
+    def test_batch_failure_reaches_every_caller(self):
+        """Test an exception in the batched call is raised to each request"""
+        from ml_models.batching import MicroBatcher
+        
+        def infer_batch(items):
+            raise RuntimeError("model failed")
+        
+        batcher = MicroBatcher(infer_batch, max_wait_ms=1)
+        with pytest.raises(RuntimeError, match="model failed"):
+            batcher.infer(1, timeout=5)
+    
+    def test_deeplab_preprocess_is_batchable(self):
+        """Test images of any size become fixed-size model inputs"""
+        from ml_models.deeplab import preprocess, INPUT_SIZE
+        
+        inputs = [preprocess(np.zeros((h, w, 3), dtype=np.uint8)) for h, w in ((480, 640), (1000, 300))]
+        assert all(x.shape == (3, INPUT_SIZE, INPUT_SIZE) and x.dtype == np.float32 for x in inputs)
+
+class TestDeepLabRuntime:
+    """Tests for DeepLabV3 runtime selection"""
+
+    def test_onnx_runtime_falls_back_to_torch(self, tmp_path):
+        """Test the ONNX runtime is only reported when ONNX Runtime is installed"""
+        from ml_models import deeplab
+        from ml_models.body_detection import background_removal_backend, DEEPLABV3_AVAILABLE
+
+        try:
+            deeplab.configure_runtime(runtime='onnx', quantize=True, model_dir=tmp_path)
+            expected = 'onnx-int8' if deeplab.ONNXRUNTIME_AVAILABLE else 'torch'
+            assert deeplab.runtime_name() == expected
+            assert deeplab.onnx_model_path('resnet50', quantize=True).parent == tmp_path
+            assert deeplab.onnx_model_path('resnet50', quantize=True).name.endswith('-int8.onnx')
+            if DEEPLABV3_AVAILABLE:
+                assert background_removal_backend('deeplabv3')[1].endswith(expected)
+            with pytest.raises(ValueError):
+                deeplab.configure_runtime(runtime='tensorrt')
+        finally:
+            deeplab.configure_runtime(runtime='torch', quantize=False)
+
+    def test_profile_selects_backbone_and_input_size(self):
+        """Test profiles pick the backbone per task and feed the cache key"""
+        from ml_models import deeplab
+
+        try:
+            deeplab.configure_profile('fast')
+            assert deeplab.profile_model('background') == ('lraspp_mobilenet_v3_large', 384)
+            assert deeplab.model_tag('background').startswith('lraspp_mobilenet_v3_large-384-')
+            with pytest.raises(ValueError):
+                deeplab.configure_profile('fastest')
+        finally:
+            deeplab.configure_profile('quality')
+        assert deeplab.profile_model('segmentation') == ('resnet50', 520)
+
+    def test_preprocess_keeps_aspect_ratio(self):
+        """Test a tall image is scaled into the corner of the input square, not stretched"""
+        from ml_models.deeplab import preprocess, letterbox_size
+
+        x = preprocess(np.full((1000, 300, 3), 255, dtype=np.uint8), 400)
+        assert letterbox_size((1000, 300), 400) == (120, 400)
+        assert x.shape == (3, 400, 400)
+        assert (x[:, :, :120] > 0).all()
+        assert (x[:, :, 120:] == 0).all()
+
+    def test_mask_from_logit_crops_padding_and_upsamples(self):
+        """Test the low-resolution person margin becomes a mask at the image size"""
+        from ml_models.deeplab import mask_from_logit
+
+        # 8x stride output for a 400x200 image letterboxed into 320x320
+        margin = np.full((40, 40), -1.0, dtype=np.float32)
+        margin[:, :10] = 1.0  # person in the left half of the image's 20 columns
+        margin[:, 20:] = 5.0  # padding, must be ignored
+        mask = mask_from_logit(margin, (400, 200), 320)
+        assert mask.shape == (400, 200)
+        assert (mask[:, :90] == 255).all()
+        assert (mask[:, 110:] == 0).all()
+
+class TestTryOnBlending:
+    """Tests for the ROI-restricted try-on compositor"""
+    
+    def test_blend_matches_full_frame_float_blend(self):
+        """Test fixed-point ROI blending matches the float reference within 1 level"""
+        from ml_models.ar_tryon import blend_garment
+        
+        rng = np.random.default_rng(0)
+        person = rng.integers(0, 255, (400, 300, 3), dtype=np.uint8)
+        garment = np.zeros_like(person)
+        garment[80:220, 90:210] = rng.integers(5, 255, (140, 120, 3), dtype=np.uint8)
+        
+        gray = cv2.cvtColor(garment, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+        mask_3ch = cv2.cvtColor(cv2.GaussianBlur(mask, (7, 7), 0), cv2.COLOR_GRAY2BGR) / 255.0
+        expected = (person * (1 - mask_3ch * 0.75) + garment * mask_3ch * 0.75).astype(np.uint8)
+        
+        result = person.copy()
+        region = blend_garment(result, garment, alpha=0.75)
+        
+        assert region == (87, 77, 126, 146)
+        assert np.abs(result.astype(int) - expected).max() <= 1
+        np.testing.assert_array_equal(result[:77], person[:77])
+    
+    def test_blend_empty_garment_is_noop(self):
+        """Test an all-black garment leaves the person untouched"""
+        from ml_models.ar_tryon import blend_garment
+        
+        person = np.full((50, 40, 3), 90, dtype=np.uint8)
+        assert blend_garment(person, np.zeros_like(person)) is None
+        assert (person == 90).all()
+
+class TestTpsWarping:
+    """Tests for keypoint-driven thin-plate-spline garment warping"""
+    
+    @staticmethod
+    def landmarks(dx=0.0):
+        positions = {11: (0.63, 0.30), 12: (0.39, 0.30), 13: (0.71, 0.45), 14: (0.31, 0.45),
+                     23: (0.59, 0.62), 24: (0.43, 0.62)}
+        return [{'id': i, 'x': x + dx, 'y': y, 'z': 0, 'visibility': 0.9} for i, (x, y) in positions.items()]
+    
+    def test_spline_interpolates_control_points(self):
+        """Test the solved spline maps each control point exactly"""
+        from ml_models.tps import solve_tps, evaluate_tps
+        
+        src = np.float64([[10, 10], [90, 12], [50, 60], [15, 95], [85, 90]])
+        dst = src * 1.5 + np.float64([[3, -2], [0, 4], [5, 5], [-3, 0], [2, 2]])
+        np.testing.assert_allclose(evaluate_tps(solve_tps(src, dst), src), dst, atol=1e-6)
+    
+    def test_landmarks_drive_warp_and_reuse_grid(self):
+        """Test landmarks warp the garment onto the torso and cached grids are reused"""
+        from ml_models import ar_tryon
+        
+        person = np.zeros((400, 300, 3), dtype=np.uint8)
+        garment = np.full((200, 160, 3), 180, dtype=np.uint8)
+        ar_tryon._warp_cache.clear()
+        
+        warped = ar_tryon.apply_tps_warping(person, garment, self.landmarks(), garment_key='shirt')
+        assert warped.shape == person.shape
+        # Between the shoulders and hips the garment is visible, far outside it is not
+        assert warped[160, 150].any()
+        assert not warped[390, 5].any()
+        
+        # A sub-quantum pose change reuses the grid instead of solving again
+        ar_tryon.apply_tps_warping(person, garment, self.landmarks(dx=0.002), garment_key='shirt')
+        stats = ar_tryon.warp_cache_stats()
+        assert (stats['misses'], stats['hits']) == (1, 1)
+    
+    def test_too_few_landmarks_fall_back(self):
+        """Test a perspective warp is used when fewer than three anchors are visible"""
+        from ml_models.ar_tryon import apply_tps_warping
+        
+        person = np.zeros((400, 300, 3), dtype=np.uint8)
+        garment = np.full((200, 160, 3), 180, dtype=np.uint8)
+        landmarks = [kp for kp in self.landmarks() if kp['id'] in (11, 12)]
+        assert apply_tps_warping(person, garment, landmarks) is not None
+
+    def test_no_keypoints_leaves_outside_region_untouched(self):
+        """Test the region-box fallback is empty outside the box, alpha included"""
+        from ml_models.ar_tryon import REGION_BOXES, apply_tps_warping, blend_garment, BLEND_KERNEL
+        from ml_models.garment_assets import prepare_garment
+
+        person = np.full((480, 640, 3), 120, dtype=np.uint8)
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'fallback-shirt')
+        for _ in range(5):
+            warped = apply_tps_warping(person, asset, None)
+            result = person.copy()
+            blend_garment(result, warped)
+
+            left, top, right, bottom = REGION_BOXES['upper']
+            pad = BLEND_KERNEL
+            outside = np.ones(person.shape[:2], bool)
+            outside[int(480 * top) - pad:int(480 * bottom) + pad, int(640 * left) - pad:int(640 * right) + pad] = False
+            assert not warped[outside].any()
+            np.testing.assert_array_equal(result[outside], person[outside])
+
+class TestGarmentAssets:
+    """Tests for prepared catalogue garments"""
+    
+    @staticmethod
+    def product_photo():
+        """White backdrop with a dark shirt whose centre is also white"""
+        image = np.full((300, 240, 3), 255, dtype=np.uint8)
+        cv2.rectangle(image, (60, 40), (180, 260), (40, 60, 120), -1)
+        cv2.rectangle(image, (100, 120), (140, 160), (255, 255, 255), -1)
+        return image
+    
+    def test_prepare_trims_and_fills_holes(self):
+        """Test the alpha mask covers the whole garment and the image is trimmed to it"""
+        from ml_models.garment_assets import prepare_garment
+        
+        asset = prepare_garment(self.product_photo(), 'shirt')
+        assert asset.bbox == (60, 40, 121, 221)
+        assert asset.image.shape[:2] == asset.alpha.shape == (221, 121)
+        assert (asset.alpha == 255).all()
+        assert asset.control_points['shoulders'][0] == pytest.approx([0.22 * 121, 0.08 * 221])
+    
+    def test_store_persists_and_reuses_assets(self):
+        """Test assets are prepared once and reloaded from disk by a new store"""
+        from ml_models.garment_assets import GarmentAssetStore
+        
+        with tempfile.TemporaryDirectory() as directory:
+            loads = []
+            load = lambda: loads.append(1) or self.product_photo()
+            store = GarmentAssetStore(directory)
+            first = store.get_or_create('abc123', load)
+            assert store.get_or_create('abc123', load) is first
+            
+            reloaded = GarmentAssetStore(directory).get_or_create('abc123', load)
+            assert len(loads) == 1
+            np.testing.assert_array_equal(reloaded.alpha, first.alpha)
+            assert reloaded.control_points == first.control_points
+    
+    def test_asset_save_uses_own_temp_file(self):
+        """Test saving leaves another writer's in-progress temp file alone"""
+        from ml_models.garment_assets import prepare_garment, GarmentAsset
+
+        asset = prepare_garment(self.product_photo(), 'abc123')
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'abc123.npz'
+            other = Path(directory) / '.tmp_abc123.npz'
+            other.write_bytes(b'partial')
+
+            asset.save(path)
+
+            assert other.read_bytes() == b'partial'
+            assert sorted(p.name for p in Path(directory).iterdir()) == ['.tmp_abc123.npz', 'abc123.npz']
+            assert GarmentAsset.load(path).control_points == asset.control_points
+
+    def test_asset_alpha_masks_blend(self):
+        """Test a warped asset blends through its alpha, keeping white garment pixels"""
+        from ml_models import ar_tryon
+        from ml_models.garment_assets import prepare_garment
+        
+        person = np.zeros((400, 300, 3), dtype=np.uint8)
+        asset = prepare_garment(self.product_photo(), 'shirt')
+        warped = ar_tryon.apply_tps_warping(person, asset, TestTpsWarping.landmarks())
+        assert warped.shape == (400, 300, 4)
+        
+        result = person.copy()
+        ar_tryon.blend_garment(result, warped, alpha=1.0)
+        # The white patch inside the garment is composited, not treated as background
+        assert (result[warped[:, :, 3] == 255] > 240).all(axis=1).any()
+        assert not result[warped[:, :, 3] == 0].any()
+
+class TestLayeredTryOn:
+    """Tests for multi-garment try-on by body region"""
+    
+    @staticmethod
+    def landmarks():
+        positions = {11: (0.62, 0.25), 12: (0.38, 0.25), 13: (0.7, 0.38), 14: (0.3, 0.38),
+                     23: (0.58, 0.5), 24: (0.42, 0.5), 25: (0.59, 0.7), 26: (0.41, 0.7),
+                     27: (0.59, 0.9), 28: (0.41, 0.9)}
+        return [{'id': i, 'x': x, 'y': y, 'z': 0, 'visibility': 0.9} for i, (x, y) in positions.items()]
+    
+    @staticmethod
+    def garment(color, region):
+        from ml_models.garment_assets import prepare_garment
+        
+        image = np.full((200, 160, 3), 255, dtype=np.uint8)
+        cv2.rectangle(image, (10, 5), (150, 195), color, -1)
+        return prepare_garment(image, f"{region}-{color}", region)
+    
+    def test_garments_follow_regions_in_z_order(self):
+        """Test trousers land on the legs, the top on the torso and over the trousers"""
+        from ml_models.ar_tryon import apply_layered_tryon
+        
+        person = np.zeros((600, 400, 3), dtype=np.uint8)
+        trousers = self.garment((200, 0, 0), 'lower')
+        top = self.garment((0, 0, 200), 'upper')
+        result = apply_layered_tryon(person, [trousers, top], self.landmarks(), return_image=True, alpha=1.0)
+        
+        assert tuple(result[480, 200]) == (200, 0, 0)     # knees: trousers
+        assert tuple(result[220, 200]) == (0, 0, 200)     # chest: top
+        assert tuple(result[298, 200]) == (0, 0, 200)     # hips: the top covers the waistband
+        assert not result[5:60].any()                     # above the shoulders: untouched
+    
+    def test_garments_warp_only_their_footprint(self):
+        """Test each garment is warped into a box around its region, not the whole image"""
+        from ml_models.ar_tryon import warp_garment_roi
+        
+        layer, (x1, y1, x2, y2) = warp_garment_roi(self.garment((200, 0, 0), 'lower'), self.landmarks(), (400, 600))
+        assert layer.shape == (y2 - y1, x2 - x1, 4)
+        assert 250 < y1 and (x2 - x1) * (y2 - y1) < 0.5 * 400 * 600
+        # The garment does not reach the box edges, so feathering is not clipped
+        assert not layer[:, :, 3][[0, -1]].any() and not layer[:, :, 3][:, [0, -1]].any()
+    
+    def test_without_landmarks_regions_use_default_boxes(self):
+        """Test garments are placed in their region's default box without a pose"""
+        from ml_models.ar_tryon import apply_layered_tryon
+        
+        person = np.zeros((600, 400, 3), dtype=np.uint8)
+        result = apply_layered_tryon(person, [(cv2.imencode('.png', np.full((100, 80, 3), 90, np.uint8))[1].tobytes(),
+                                               'lower')], return_image=True, alpha=1.0)
+        assert result[450, 200].any() and not result[200, 200].any()
+
+class TestTryOnSession:
+    """Tests for layered try-on adjustments"""
+    
+    @staticmethod
+    def session(size=(400, 300)):
+        from ml_models.tryon_session import TryOnSession
+        from ml_models.garment_assets import prepare_garment
+        
+        rng = np.random.default_rng(1)
+        person = rng.integers(0, 255, size + (3,), dtype=np.uint8)
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'session-shirt')
+        return TryOnSession.create(person, asset, TestTpsWarping.landmarks(), full_resolution=True)
+    
+    def test_initial_composite_matches_footprint_blend(self):
+        """Test the layered composite equals blending the garment warped into its footprint"""
+        from ml_models import ar_tryon
+        from ml_models.garment_assets import prepare_garment
+        
+        session = self.session()
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'session-shirt')
+        layer, (x1, y1, x2, y2) = ar_tryon.warp_garment_roi(asset, TestTpsWarping.landmarks(), session.size)
+        expected = session.person.copy()
+        ar_tryon.blend_garment(expected[y1:y2, x1:x2], layer)
+        np.testing.assert_array_equal(session.composite, expected)
+    
+    def test_without_keypoints_garment_stays_in_region_box(self):
+        """Test a session without a pose keeps the garment and its updates inside the region box"""
+        from ml_models.ar_tryon import REGION_BOXES, BLEND_KERNEL
+        from ml_models.tryon_session import TryOnSession
+        from ml_models.garment_assets import prepare_garment
+        
+        person = np.full((480, 640, 3), 120, dtype=np.uint8)
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'session-shirt')
+        session = TryOnSession.create(person, asset, None, full_resolution=True)
+        
+        left, top, right, bottom = REGION_BOXES['upper']
+        x, y, w, h = session.garment_bbox
+        assert 640 * left - BLEND_KERNEL <= x and x + w <= 640 * right + BLEND_KERNEL
+        assert 480 * top - BLEND_KERNEL <= y and y + h <= 480 * bottom + BLEND_KERNEL
+        assert w * h < 0.3 * 480 * 640
+        
+        changed = (session.composite != person).any(axis=2)
+        assert changed.any()
+        ys, xs = np.nonzero(changed)
+        assert x - BLEND_KERNEL <= xs.min() and xs.max() < x + w + BLEND_KERNEL
+        assert y - BLEND_KERNEL <= ys.min() and ys.max() < y + h + BLEND_KERNEL
+        
+        _, (rx, ry, rw, rh) = session.adjust(position=(5, 5))
+        assert rw * rh < 0.3 * 480 * 640
+    
+    def test_adjust_matches_single_affine_reference(self):
+        """Test an adjustment equals one full-frame affine warp of the garment layer"""
+        from ml_models import ar_tryon
+        from ml_models.tryon_session import adjustment_matrix
+        
+        session = self.session()
+        x, y, w, h = session.garment_bbox
+        layer = np.zeros(session.person.shape[:2] + (4,), dtype=np.uint8)
+        layer[y:y + h, x:x + w] = session.garment
+        
+        image, region = session.adjust(position=(12, -7), scale=1.2, rotation=8)
+        matrix = adjustment_matrix(session.center, (12, -7), 1.2, 8)
+        expected = session.person.copy()
+        ar_tryon.blend_garment(expected, cv2.warpAffine(layer, matrix, session.size))
+        
+        assert np.abs(image.astype(int) - expected).max() <= 1
+        rx, ry, rw, rh = region
+        outside = np.ones(image.shape[:2], bool)
+        outside[ry:ry + rh, rx:rx + rw] = False
+        np.testing.assert_array_equal(image[outside], session.person[outside])
+    
+    def test_reset_restores_fit_and_updates_are_fast(self):
+        """Test undoing adjustments restores the original composite; updates stay interactive"""
+        session = self.session((1280, 960))
+        original = session.composite.copy()
+        for step in range(5):
+            session.adjust(position=(step * 3, step), scale=1 + step / 20, rotation=step)
+            assert session.last_update_ms < 20
+        image, _ = session.reset()
+        np.testing.assert_array_equal(image, original)
+
+class TestPersonAnalysis:
+    """Tests for person-side analysis reused across try-ons"""
+
+    def test_analysis_is_reused_across_garments(self, monkeypatch):
+        """Test try-ons from a stored analysis skip person decoding and pose detection"""
+        from ml_models import person_analysis
+        from ml_models.ar_tryon import apply_virtual_tryon
+        from ml_models.garment_assets import prepare_garment
+
+        rng = np.random.default_rng(2)
+        photo = rng.integers(0, 255, (1800, 1200, 3), dtype=np.uint8)
+        encoded = cv2.imencode('.png', photo)[1].tobytes()
+        person = person_analysis.PersonAnalysis.analyze(encoded)
+
+        assert max(person.image.shape[:2]) == 1280
+        assert person.to_dict()['image_size'] == [1200, 1800]
+        assert person.to_dict()['body_shape']
+        assert person.source is encoded
+
+        def no_pose(*args, **kwargs):
+            raise AssertionError('pose detected again')
+        monkeypatch.setattr(person_analysis, 'analyze_pose', no_pose)
+
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'analysed-shirt')
+        result = person.tryon(asset, return_image=True)
+        expected = apply_virtual_tryon(person.image, asset, person.keypoints, return_image=True)
+        np.testing.assert_array_equal(result, expected)
+
+        full = person.tryon(asset, full_resolution=True, return_image=True)
+        assert full.shape == photo.shape
+
+class TestProgressiveTryOn:
+    """Tests for preview-then-full try-on rendering"""
+
+    def test_full_render_reuses_preview_warp(self):
+        """Test the full render rescales the preview's warp and matches a direct render"""
+        from ml_models import ar_tryon
+        from ml_models.garment_assets import prepare_garment
+        from ml_models.progressive_tryon import ProgressiveTryOn
+
+        person = np.full((1200, 900, 3), 90, dtype=np.uint8)
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'progressive-shirt')
+        render = ProgressiveTryOn(person, asset, TestTpsWarping.landmarks(), full_resolution=True)
+
+        preview = render.preview()
+        assert max(preview.shape[:2]) == 384
+        solved = ar_tryon.warp_cache_stats()['misses']
+        image = render.render()
+        assert image.shape == person.shape
+        assert ar_tryon.warp_cache_stats()['misses'] == solved
+        assert render.render() is image
+        assert set(render.timings) == {'preview_ms', 'time_to_first_image_ms', 'render_ms', 'time_to_full_image_ms'}
+
+        expected = person.copy()
+        layer, (x1, y1, x2, y2) = ar_tryon.warp_garment_roi(asset, TestTpsWarping.landmarks(), (900, 1200))
+        ar_tryon.blend_garment(expected[y1:y2, x1:x2], layer)
+        assert np.abs(image.astype(int) - expected).mean() < 2
+
+    def test_preview_mode_renders_small(self):
+        """Test apply_virtual_tryon's preview mode renders at the preview resolution"""
+        from ml_models.ar_tryon import apply_virtual_tryon
+
+        person = np.full((1200, 900, 3), 90, dtype=np.uint8)
+        result = apply_virtual_tryon(person, TestGarmentAssets.product_photo(), TestTpsWarping.landmarks(),
+                                     return_image=True, preview=True)
+        assert result.shape == (384, 288, 3)
+
+class TestLiveTryOn:
+    """Tests for the live frame-stream try-on session"""
+    
+    class StaticTracker:
+        def __init__(self):
+            self.calls = 0
+        
+        def process(self, frame, timestamp):
+            self.calls += 1
+            return TestTpsWarping.landmarks()
+    
+    def test_one_euro_filter_smooths_jitter_and_follows_motion(self):
+        """Test jitter on a still point is damped while a real move is followed"""
+        from ml_models.live_tryon import OneEuroFilter
+        
+        rng = np.random.default_rng(0)
+        smoother = OneEuroFilter(min_cutoff=1.0, beta=0.05)
+        still = [smoother(0.5 + rng.normal(0, 0.01, 2), t / 30) for t in range(60)]
+        assert np.std(still[10:]) < 0.5 * 0.01
+        
+        moved = [smoother(np.full(2, 0.8), (60 + t) / 30) for t in range(30)]
+        assert np.abs(moved[-1] - 0.8).max() < 0.01
+    
+    def test_busy_renderer_drops_stale_frames(self):
+        """Test frames queued while rendering are dropped in favour of the latest"""
+        from ml_models.live_tryon import LiveTryOnSession
+        from ml_models.garment_assets import prepare_garment
+        
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'live-shirt')
+        tracker = self.StaticTracker()
+        session = LiveTryOnSession(asset, target_fps=30, tracker=tracker)
+        frames = [np.full((160, 120, 3), value, dtype=np.uint8) for value in (10, 20, 30)]
+        for frame in frames:
+            session.submit(frame)
+        
+        result = session.next_result(timeout=0.1)
+        assert result.shape == (160, 120, 3)
+        # The last frame was rendered: its background survives outside the garment
+        assert (result[2, 2] == 30).all()
+        
+        metrics = session.metrics()
+        assert (metrics['frames_received'], metrics['frames_processed'], metrics['frames_dropped']) == (3, 1, 2)
+        assert metrics['latency_ms']['last'] is not None
+    
+    def test_frames_faster_than_target_are_skipped(self):
+        """Test frames arriving within the frame budget of the last render are skipped"""
+        from ml_models.live_tryon import LiveTryOnSession
+        from ml_models.garment_assets import prepare_garment
+        
+        asset = prepare_garment(TestGarmentAssets.product_photo(), 'live-shirt')
+        session = LiveTryOnSession(asset, target_fps=2, tracker=self.StaticTracker())
+        frame = np.zeros((160, 120, 3), dtype=np.uint8)
+        
+        session.submit(frame)
+        assert session.next_result(timeout=0.1) is not None
+        session.submit(frame)
+        assert session.next_result(timeout=0.1) is None
+        assert session.metrics()['frames_skipped'] == 1
+        
+        session.close()
+        assert session.next_result(timeout=0.1) is None
+
 class TestBodyMeasurements:
     """Tests for measurement extraction"""
     
@@ -222,6 +979,17 @@ class TestBackgroundRemoval:
         if Path(result_path).exists() and result_path != test_image:
             os.unlink(result_path)
     
+    def test_remove_background_in_memory_requires_output(self, test_image):
+        """Test in-memory background removal writes only to the given path"""
+        image = cv2.imread(test_image)
+        assert remove_background(image) is None
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = Path(tmp) / 'result.png'
+            result_path = remove_background(image, output_path)
+            assert result_path == str(output_path)
+            assert output_path.exists()
+    
     def test_remove_background_invalid_image(self):
         """Test background removal with invalid image"""
         result = remove_background('nonexistent.jpg')
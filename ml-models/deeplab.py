@@ -0,0 +1,356 @@
+"""Shared person segmentation models (DeepLabV3, LR-ASPP) with micro-batched inference"""
+import logging
+import threading
+from pathlib import Path
+import cv2
+import numpy as np
+
+from .batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+try:
+    import torch
+    import torchvision.models.segmentation as segmentation
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# Default model input size. Images are scaled to fit an INPUT_SIZE square
+# keeping their aspect ratio and padded, so requests of any size can share a
+# batch.
+INPUT_SIZE = 520
+MEAN = np.float32([0.485, 0.456, 0.406])
+STD = np.float32([0.229, 0.224, 0.225])
+
+# COCO/VOC class index of 'person' in the DeepLabV3 output
+PERSON_CLASS = 15
+
+# Segmentation models by backbone name (torchvision constructors). All are
+# trained on the 21 COCO/VOC classes.
+MODELS = {
+    'resnet101': 'deeplabv3_resnet101',
+    'resnet50': 'deeplabv3_resnet50',
+    'mobilenet_v3_large': 'deeplabv3_mobilenet_v3_large',
+    'lraspp_mobilenet_v3_large': 'lraspp_mobilenet_v3_large',
+}
+
+# Latency/quality profiles: the backbone used for clothing segmentation and
+# for background removal, and the model input size
+PROFILES = {
+    'quality': {'segmentation': 'resnet50', 'background': 'resnet101', 'input_size': 520},
+    'balanced': {'segmentation': 'mobilenet_v3_large', 'background': 'mobilenet_v3_large', 'input_size': 520},
+    'fast': {'segmentation': 'lraspp_mobilenet_v3_large', 'background': 'lraspp_mobilenet_v3_large',
+             'input_size': 384},
+}
+
+# Active profile. Overridden from the backend Config at startup.
+PROFILE = {'name': 'quality'}
+
+# Batching limits shared by all DeepLabV3 schedulers. Overridden from the
+# backend Config at startup.
+BATCHING = {
+    'max_batch_size': 8,
+    'max_wait_ms': 5.0,
+}
+
+# Inference runtime. With 'onnx' each backbone is exported once to an ONNX
+# file under model_dir (with int8 weights if quantize is set) and run by ONNX
+# Runtime; eager PyTorch is used when that is not possible. Overridden from
+# the backend Config at startup.
+RUNTIME = {
+    'runtime': 'torch',
+    'quantize': False,
+    'model_dir': Path(__file__).parent / 'cache' / 'onnx',
+    'threads': 0,
+}
+
+# Bump when the exported graph changes so stale ONNX files are not loaded
+ONNX_EXPORT_VERSION = 2
+
+_models = {}
+_schedulers = {}
+_lock = threading.Lock()
+_sessions = {}
+_onnx_failed = set()
+_session_lock = threading.Lock()
+
+def configure_batching(max_batch_size=None, max_wait_ms=None):
+    """
+    Set the micro-batching limits for DeepLabV3 inference.
+
+    Example:
+        configure_batching(max_batch_size=4, max_wait_ms=10)
+    """
+    with _lock:
+        if max_batch_size is not None:
+            BATCHING['max_batch_size'] = int(max_batch_size)
+        if max_wait_ms is not None:
+            BATCHING['max_wait_ms'] = float(max_wait_ms)
+        for scheduler in _schedulers.values():
+            scheduler.configure(**BATCHING)
+
+def configure_runtime(runtime=None, quantize=None, model_dir=None, threads=None):
+    """
+    Select the DeepLabV3 inference runtime.
+
+    Args:
+        runtime: 'torch' (eager PyTorch) or 'onnx' (ONNX Runtime)
+        quantize: Use dynamically int8-quantized weights with 'onnx'
+        model_dir: Where exported ONNX files are kept
+        threads: ONNX Runtime intra-op threads (0 = one per core)
+
+    Example:
+        configure_runtime(runtime='onnx', quantize=True)
+    """
+    if runtime is not None and runtime not in ('torch', 'onnx'):
+        raise ValueError(f"Unknown DeepLabV3 runtime: {runtime}")
+    with _session_lock:
+        if runtime is not None:
+            RUNTIME['runtime'] = runtime
+        if quantize is not None:
+            RUNTIME['quantize'] = bool(quantize)
+        if model_dir is not None:
+            RUNTIME['model_dir'] = Path(model_dir)
+        if threads is not None:
+            RUNTIME['threads'] = int(threads)
+        _sessions.clear()
+        _onnx_failed.clear()
+
+def configure_profile(name):
+    """
+    Select the latency/quality profile (a key of PROFILES).
+
+    Example:
+        configure_profile('fast')
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown segmentation profile: {name}")
+    PROFILE['name'] = name
+
+def profile_model(task):
+    """
+    Backbone and input size of the active profile for a task.
+
+    Args:
+        task: 'segmentation' or 'background'
+
+    Returns:
+        tuple: (backbone, input_size)
+    """
+    profile = PROFILES[PROFILE['name']]
+    return profile[task], profile['input_size']
+
+def model_tag(task):
+    """
+    Backbone, input size and runtime serving a task, e.g.
+    'resnet101-520-onnx'. Each changes the masks, so this is part of the
+    model version used in result cache keys.
+    """
+    backbone, input_size = profile_model(task)
+    return f"{backbone}-{input_size}-{runtime_name(backbone)}"
+
+def runtime_name(backbone='resnet101'):
+    """
+    Runtime that serves a backbone: 'torch', 'onnx' or 'onnx-int8'.
+
+    Results differ slightly between runtimes, so this is part of the model
+    version used in result cache keys.
+    """
+    if RUNTIME['runtime'] != 'onnx' or not ONNXRUNTIME_AVAILABLE or backbone in _onnx_failed:
+        return 'torch'
+    return 'onnx-int8' if RUNTIME['quantize'] else 'onnx'
+
+def onnx_model_path(backbone='resnet101', quantize=False, input_size=INPUT_SIZE):
+    """File an exported backbone is kept in"""
+    suffix = '-int8' if quantize else ''
+    return Path(RUNTIME['model_dir']) / f"{MODELS[backbone]}-{input_size}-v{ONNX_EXPORT_VERSION}{suffix}.onnx"
+
+def export_onnx(backbone='resnet101', quantize=False, input_size=INPUT_SIZE):
+    """
+    Export a pretrained backbone to ONNX, unless already exported.
+
+    The graph takes a (batch, 3, input_size, input_size) float32 input with a
+    dynamic batch axis and returns the person margin at the model's output
+    stride (see person_logit). With quantize, weights are then converted to
+    int8 (dynamic quantization: activations stay float and are quantized on
+    the fly, so no calibration data is needed).
+
+    Returns:
+        Path: The ONNX file
+    """
+    if not TORCH_AVAILABLE:
+        raise RuntimeError("Exporting DeepLabV3 to ONNX requires PyTorch")
+    float_path = onnx_model_path(backbone, input_size=input_size)
+    float_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if not float_path.exists():
+        class PersonLogit(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, x):
+                return person_logit(self.model, x)
+
+        temp_path = float_path.with_name(f".tmp_{float_path.name}")
+        with torch.no_grad():
+            torch.onnx.export(
+                PersonLogit(get_model(backbone)), torch.zeros(1, 3, input_size, input_size), str(temp_path),
+                input_names=['input'], output_names=['out'],
+                dynamic_axes={'input': {0: 'batch'}, 'out': {0: 'batch'}}, opset_version=17
+            )
+        temp_path.replace(float_path)
+        logger.info(f"Exported DeepLabV3 ({backbone}) to {float_path}")
+
+    if not quantize:
+        return float_path
+
+    path = onnx_model_path(backbone, quantize=True, input_size=input_size)
+    if not path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        temp_path = path.with_name(f".tmp_{path.name}")
+        quantize_dynamic(str(float_path), str(temp_path), weight_type=QuantType.QInt8)
+        temp_path.replace(path)
+        logger.info(f"Quantized DeepLabV3 ({backbone}) to int8: {path}")
+    return path
+
+def get_onnx_session(backbone='resnet101', input_size=INPUT_SIZE):
+    """ONNX Runtime session for a backbone, exporting the model on first use"""
+    with _session_lock:
+        session = _sessions.get((backbone, input_size))
+        if session is None:
+            path = onnx_model_path(backbone, RUNTIME['quantize'], input_size)
+            if not path.exists():
+                path = export_onnx(backbone, RUNTIME['quantize'], input_size)
+            options = ort.SessionOptions()
+            if RUNTIME['threads']:
+                options.intra_op_num_threads = RUNTIME['threads']
+            session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+            _sessions[(backbone, input_size)] = session
+            logger.info(f"Loaded DeepLabV3 ({backbone}) into ONNX Runtime from {path}")
+        return session
+
+def get_model(backbone='resnet101'):
+    """Load a pretrained segmentation model (a key of MODELS) once per process"""
+    if backbone not in MODELS:
+        raise ValueError(f"Unknown segmentation backbone: {backbone}")
+    with _lock:
+        model = _models.get(backbone)
+        if model is None:
+            model = getattr(segmentation, MODELS[backbone])(weights='DEFAULT')
+            model.eval()
+            _models[backbone] = model
+            logger.info(f"Loaded {MODELS[backbone]}")
+        return model
+
+def person_logit(model, batch):
+    """
+    Person-vs-rest margin of a batch at the model's output stride.
+
+    Runs the backbone and main classifier only (no auxiliary head, no
+    upsampling of all 21 classes) and returns logit[person] minus the
+    largest other logit, so > 0 exactly where argmax is 'person'.
+    """
+    features = model.backbone(batch)
+    if isinstance(model, segmentation.LRASPP):
+        logits = model.classifier(features)
+    else:
+        logits = model.classifier(features['out'])
+    others = torch.cat([logits[:, :PERSON_CLASS], logits[:, PERSON_CLASS + 1:]], dim=1)
+    return logits[:, PERSON_CLASS] - others.amax(dim=1)
+
+def letterbox_size(shape, input_size=INPUT_SIZE):
+    """(width, height) of an image of this shape scaled to fit an input_size square"""
+    h, w = shape[:2]
+    scale = input_size / max(h, w)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def preprocess(image, input_size=INPUT_SIZE):
+    """
+    BGR image -> normalized CHW float32 array of input_size x input_size.
+
+    The image is scaled keeping its aspect ratio into the top-left corner;
+    the padding is zero, i.e. the mean colour after normalization.
+    """
+    w, h = letterbox_size(image.shape, input_size)
+    interpolation = cv2.INTER_AREA if w < image.shape[1] else cv2.INTER_LINEAR
+    rgb = cv2.cvtColor(cv2.resize(image, (w, h), interpolation=interpolation), cv2.COLOR_BGR2RGB)
+    tensor = np.zeros((3, input_size, input_size), dtype=np.float32)
+    tensor[:, :h, :w] = ((rgb.astype(np.float32) / 255.0 - MEAN) / STD).transpose(2, 0, 1)
+    return tensor
+
+def mask_from_logit(margin, shape, input_size=INPUT_SIZE):
+    """
+    0/255 person mask at an image's size from its low-resolution margin.
+
+    Crops the image's part of the letterboxed output and upsamples that
+    single channel bilinearly straight to the image size.
+    """
+    h, w = shape[:2]
+    box_w, box_h = letterbox_size(shape, input_size)
+    scale_y, scale_x = margin.shape[0] / input_size, margin.shape[1] / input_size
+    crop = margin[:max(1, round(box_h * scale_y)), :max(1, round(box_w * scale_x))]
+    upsampled = cv2.resize(np.ascontiguousarray(crop, dtype=np.float32), (w, h), interpolation=cv2.INTER_LINEAR)
+    return (upsampled > 0).astype(np.uint8) * 255
+
+def _forward_onnx(backbone, batch):
+    return get_onnx_session(backbone, batch.shape[-1]).run(None, {'input': batch})[0]
+
+def _forward_torch(backbone, batch):
+    model = get_model(backbone)
+    with torch.no_grad():
+        margin = person_logit(model, torch.from_numpy(batch))
+    return margin.cpu().numpy()
+
+def _forward(backbone, inputs):
+    """One batched forward pass; returns a float32 person margin map per input"""
+    batch = np.ascontiguousarray(np.stack(inputs))
+    if runtime_name(backbone) != 'torch':
+        try:
+            return list(_forward_onnx(backbone, batch))
+        except Exception as e:
+            # Export or load failed (e.g. missing onnx package); stay on PyTorch
+            logger.warning(f"ONNX Runtime unavailable for {MODELS[backbone]}, using PyTorch: {e}")
+            with _session_lock:
+                _onnx_failed.add(backbone)
+    return list(_forward_torch(backbone, batch))
+
+def get_scheduler(backbone='resnet101', input_size=INPUT_SIZE):
+    """Micro-batching scheduler for one backbone and input size"""
+    with _lock:
+        scheduler = _schedulers.get((backbone, input_size))
+        if scheduler is None:
+            scheduler = MicroBatcher(
+                lambda inputs: _forward(backbone, inputs),
+                name=f"{MODELS[backbone]}-{input_size}",
+                **BATCHING
+            )
+            _schedulers[(backbone, input_size)] = scheduler
+        return scheduler
+
+def person_mask(image, task='background'):
+    """
+    0/255 person mask for a BGR image, at the image's own size.
+
+    Concurrent callers are served by one batched forward pass.
+
+    Args:
+        image: BGR ndarray
+        task: 'segmentation' or 'background'; picks the backbone and input
+            size from the active profile
+
+    Returns:
+        np.ndarray: uint8 mask
+    """
+    if not TORCH_AVAILABLE:
+        raise RuntimeError("PyTorch is not available")
+    backbone, input_size = profile_model(task)
+    margin = get_scheduler(backbone, input_size).infer(preprocess(image, input_size))
+    return mask_from_logit(margin, image.shape, input_size)
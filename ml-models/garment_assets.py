@@ -0,0 +1,259 @@
+"""Preprocessed garment assets for virtual try-on"""
+import json
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import cv2
+import numpy as np
+
+from .preprocessing import prepare_input
+
+logger = logging.getLogger(__name__)
+
+# Bump when asset preparation changes so stored assets are rebuilt
+ASSET_VERSION = 1
+
+# Garment control points as fractions of a front-view garment image, and the
+# MediaPipe landmark pair each one follows, per body region. The landmark of
+# a pair that lies further left in the photo is matched to the garment's
+# left-hand point, so mirrored (selfie) photos work too. Pairs run from the
+# top of the garment to its hem.
+GARMENT_REGIONS = {
+    # Tops, shirts, jackets
+    'upper': {
+        'shoulders': ((11, 12), (0.22, 0.08), (0.78, 0.08)),
+        'elbows': ((13, 14), (0.03, 0.45), (0.97, 0.45)),
+        'hips': ((23, 24), (0.25, 0.97), (0.75, 0.97)),
+    },
+    # Trousers, skirts, shorts
+    'lower': {
+        'hips': ((23, 24), (0.2, 0.03), (0.8, 0.03)),
+        'knees': ((25, 26), (0.27, 0.52), (0.73, 0.52)),
+        'ankles': ((27, 28), (0.27, 0.97), (0.73, 0.97)),
+    },
+    # Dresses, coats, jumpsuits
+    'full': {
+        'shoulders': ((11, 12), (0.25, 0.05), (0.75, 0.05)),
+        'hips': ((23, 24), (0.22, 0.5), (0.78, 0.5)),
+        'knees': ((25, 26), (0.2, 0.8), (0.8, 0.8)),
+    },
+}
+GARMENT_ANCHORS = GARMENT_REGIONS['upper']
+
+def garment_anchor_points(size, region='upper'):
+    """
+    Canonical control points of a garment image in pixels.
+
+    Args:
+        size: (width, height) of the garment image
+        region: Key into GARMENT_REGIONS
+
+    Returns:
+        dict: Anchor name -> [left (x, y), right (x, y)]
+    """
+    if region not in GARMENT_REGIONS:
+        raise ValueError(f"region must be one of: {', '.join(GARMENT_REGIONS)}")
+    w, h = size
+    return {
+        name: [[left[0] * w, left[1] * h], [right[0] * w, right[1] * h]]
+        for name, (_, left, right) in GARMENT_REGIONS[region].items()
+    }
+
+def garment_alpha(image, tolerance=12):
+    """
+    Foreground mask of a product photo.
+
+    The background colour is estimated from the image border, so garments
+    shot on white, grey or black backdrops all work. Small specks are
+    dropped and holes inside the garment outline are filled.
+
+    Returns:
+        np.ndarray: uint8 mask, 255 on the garment
+    """
+    border = np.concatenate([
+        image[:2].reshape(-1, 3), image[-2:].reshape(-1, 3),
+        image[:, :2].reshape(-1, 3), image[:, -2:].reshape(-1, 3)
+    ])
+    background = np.median(border, axis=0).astype(np.int16)
+    difference = np.abs(image.astype(np.int16) - background).max(axis=2)
+    mask = (difference > tolerance).astype(np.uint8) * 255
+
+    kernel = np.ones((5, 5), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return mask
+    largest = max(cv2.contourArea(c) for c in contours)
+    kept = [c for c in contours if cv2.contourArea(c) >= 0.05 * largest]
+    alpha = np.zeros_like(mask)
+    cv2.drawContours(alpha, kept, -1, 255, -1)
+    return alpha
+
+class GarmentAsset:
+    """A garment image with everything try-on needs precomputed"""
+
+    def __init__(self, key, image, alpha, bbox, source_size, control_points=None, region='upper'):
+        self.key = key
+        self.image = image              # BGR, trimmed to the garment, working resolution
+        self.alpha = alpha              # uint8 mask at the image size
+        self.bbox = tuple(bbox)         # (x, y, w, h) of the garment in the source image
+        self.source_size = tuple(source_size)
+        self.region = region            # Body region, key into GARMENT_REGIONS
+        self.control_points = control_points or garment_anchor_points((image.shape[1], image.shape[0]), region)
+        self._bgra = None
+
+    @property
+    def bgra(self):
+        """Image with the alpha mask as a fourth channel, warped in one pass"""
+        if self._bgra is None:
+            self._bgra = np.dstack([self.image, self.alpha])
+        return self._bgra
+
+    @property
+    def nbytes(self):
+        return self.image.nbytes + self.alpha.nbytes
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'version': ASSET_VERSION,
+            'size': [self.image.shape[1], self.image.shape[0]],
+            'bbox': list(self.bbox),
+            'source_size': list(self.source_size),
+            'region': self.region,
+            'control_points': self.control_points
+        }
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temp file per writer: processes preparing the same garment
+        # must not write into each other's file before the atomic rename
+        f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".tmp_{path.stem}_", suffix='.npz', delete=False)
+        temp_path = Path(f.name)
+        try:
+            with f:
+                np.savez(f, image=self.image, alpha=self.alpha, meta=np.array(json.dumps(self.to_dict())))
+            temp_path.replace(path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != ASSET_VERSION:
+                return None
+            return cls(meta['key'], data['image'], data['alpha'], meta['bbox'],
+                       meta['source_size'], meta['control_points'], meta.get('region', 'upper'))
+
+def prepare_garment(image, key, region='upper'):
+    """
+    Build a GarmentAsset from a decoded garment image.
+
+    The foreground is extracted once, the image is trimmed to it and capped
+    at the 'tryon' working resolution, and the canonical control points of
+    the garment's body region are computed for the trimmed size.
+    """
+    if image is None:
+        raise ValueError("Could not read garment image")
+    if region not in GARMENT_REGIONS:
+        raise ValueError(f"region must be one of: {', '.join(GARMENT_REGIONS)}")
+
+    alpha = garment_alpha(image)
+    if cv2.countNonZero(alpha):
+        x, y, w, h = cv2.boundingRect(alpha)
+    else:
+        h, w = image.shape[:2]
+        x = y = 0
+        alpha[:] = 255
+
+    trimmed, transform = prepare_input(image[y:y + h, x:x + w], 'tryon')
+    trimmed_alpha = alpha[y:y + h, x:x + w]
+    if not transform.is_identity:
+        trimmed_alpha = cv2.resize(trimmed_alpha, transform.working_size, interpolation=cv2.INTER_AREA)
+
+    return GarmentAsset(key, np.ascontiguousarray(trimmed), np.ascontiguousarray(trimmed_alpha),
+                        (x, y, w, h), (image.shape[1], image.shape[0]), region=region)
+
+class GarmentAssetStore:
+    """
+    Two-level store of prepared garments: an in-memory LRU backed by .npz
+    files on disk, so each garment is prepared once per deployment.
+    """
+
+    def __init__(self, directory=None, max_entries=64):
+        self.directory = Path(directory) if directory else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.npz"
+
+    def _remember(self, asset):
+        with self._lock:
+            self._entries[asset.key] = asset
+            self._entries.move_to_end(asset.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Prepared asset from memory or disk, or None"""
+        with self._lock:
+            asset = self._entries.get(key)
+            if asset is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return asset
+
+        if self.directory is not None and self._path(key).exists():
+            try:
+                asset = GarmentAsset.load(self._path(key))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Discarding unreadable garment asset {key}: {e}")
+                asset = None
+            if asset is not None:
+                self._remember(asset)
+                with self._lock:
+                    self.hits += 1
+                return asset
+        return None
+
+    def get_or_create(self, key, load_image, region='upper'):
+        """
+        Get a prepared asset, preparing it on first use.
+
+        Args:
+            key: Stable garment identity (e.g. product ID, image version and region)
+            load_image: Callable returning the decoded garment image
+            region: Body region the garment covers
+        """
+        asset = self.get(key)
+        if asset is not None:
+            return asset
+
+        asset = prepare_garment(load_image(), key, region)
+        if self.directory is not None:
+            asset.save(self._path(key))
+        self._remember(asset)
+        with self._lock:
+            self.misses += 1
+        logger.info(f"Prepared garment asset {key}")
+        return asset
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(asset.nbytes for asset in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,152 @@
+"""Coarse-to-fine GrabCut foreground segmentation"""
+import logging
+import cv2
+import numpy as np
+
+from .preprocessing import prepare_input
+
+logger = logging.getLogger(__name__)
+
+# GrabCut settings. The coarse pass runs at the 'grabcut' working resolution
+# for min_iterations to max_iterations, stopping early once no more than
+# tolerance (a fraction of the working pixels) change label in an iteration.
+# For larger images a band of refine_band working pixels either side of the
+# coarse boundary is then re-cut at full resolution (0 disables this).
+# Overridden from the backend Config at startup.
+GRABCUT = {
+    'max_iterations': 5,
+    'min_iterations': 2,
+    'tolerance': 0.001,
+    'refine_band': 2,
+}
+
+# Side of the full-resolution tiles the boundary band is re-cut in
+REFINE_TILE = 256
+
+def configure_grabcut(max_iterations=None, tolerance=None, refine_band=None, min_iterations=None):
+    """
+    Set the GrabCut iteration limits, convergence tolerance and refinement band.
+
+    Example:
+        configure_grabcut(max_iterations=3, refine_band=0)
+    """
+    if max_iterations is not None:
+        GRABCUT['max_iterations'] = max(1, int(max_iterations))
+    if min_iterations is not None:
+        GRABCUT['min_iterations'] = max(1, int(min_iterations))
+    if tolerance is not None:
+        GRABCUT['tolerance'] = float(tolerance)
+    if refine_band is not None:
+        GRABCUT['refine_band'] = max(0, int(refine_band))
+
+def settings_tag():
+    """GrabCut settings as a string, for result cache keys"""
+    return f"it{GRABCUT['min_iterations']}-{GRABCUT['max_iterations']}-tol{GRABCUT['tolerance']:g}-band{GRABCUT['refine_band']}"
+
+def _foreground(mask):
+    return (mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)
+
+def coarse_grabcut(image, rect, max_iterations, tolerance, min_iterations=1):
+    """
+    GrabCut from a rectangle, one iteration at a time until the mask converges.
+
+    Returns:
+        tuple: (GrabCut label mask, background model, foreground model,
+            iterations run)
+    """
+    mask = np.zeros(image.shape[:2], np.uint8)
+    bgd_model = np.zeros((1, 65), np.float64)
+    fgd_model = np.zeros((1, 65), np.float64)
+    cv2.grabCut(image, mask, rect, bgd_model, fgd_model, 1, cv2.GC_INIT_WITH_RECT)
+
+    iterations = 1
+    foreground = _foreground(mask)
+    while iterations < max_iterations:
+        # GC_EVAL continues from the current labels and colour models, so
+        # single steps are the same as one call with more iterations
+        cv2.grabCut(image, mask, None, bgd_model, fgd_model, 1, cv2.GC_EVAL)
+        iterations += 1
+        updated = _foreground(mask)
+        changed = np.count_nonzero(updated != foreground)
+        foreground = updated
+        if iterations >= min_iterations and changed <= tolerance * mask.size:
+            break
+    return mask, bgd_model, fgd_model, iterations
+
+def refine_boundary(image, foreground, transform, bgd_model, fgd_model, band):
+    """
+    Re-cut the pixels near the coarse boundary at full resolution.
+
+    Pixels more than band working pixels from the coarse boundary keep their
+    coarse label. The band is cut in tiles that contain it, with the colour
+    models learnt by the coarse pass held fixed.
+
+    Args:
+        image: Full-resolution BGR image
+        foreground: 0/255 coarse mask at working resolution
+        transform: ImageTransform from the full image to the working image
+        bgd_model, fgd_model: GrabCut colour models from the coarse pass
+        band: Band half-width in working pixels
+
+    Returns:
+        tuple: (0/255 mask at the image's size, number of tiles cut)
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * band + 1, 2 * band + 1))
+    sure = transform.to_original_mask(cv2.erode(foreground, kernel)) > 0
+    possible = transform.to_original_mask(cv2.dilate(foreground, kernel)) > 0
+    labels = np.full(sure.shape, cv2.GC_BGD, np.uint8)
+    labels[possible] = cv2.GC_PR_BGD
+    labels[transform.to_original_mask(foreground) > 0] = cv2.GC_PR_FGD
+    labels[sure] = cv2.GC_FGD
+    uncertain = possible & ~sure
+
+    # Tiles overlap their neighbours by pad so cuts are not cropped at seams
+    h, w = labels.shape
+    pad = int(np.ceil(band / min(transform.scale_x, transform.scale_y)))
+    refined, tiles = labels.copy(), 0
+    for y in range(0, h, REFINE_TILE):
+        for x in range(0, w, REFINE_TILE):
+            if not uncertain[y:y + REFINE_TILE, x:x + REFINE_TILE].any():
+                continue
+            y0, x0 = max(0, y - pad), max(0, x - pad)
+            y1, x1 = min(h, y + REFINE_TILE + pad), min(w, x + REFINE_TILE + pad)
+            tile = labels[y0:y1, x0:x1].copy()
+            cv2.grabCut(np.ascontiguousarray(image[y0:y1, x0:x1]), tile, None, bgd_model, fgd_model, 1,
+                        cv2.GC_EVAL_FREEZE_MODEL)
+            refined[y:y + REFINE_TILE, x:x + REFINE_TILE] = tile[y - y0:y - y0 + REFINE_TILE,
+                                                                 x - x0:x - x0 + REFINE_TILE]
+            tiles += 1
+    return np.where(_foreground(refined), 255, 0).astype(np.uint8), tiles
+
+def grabcut_mask(image):
+    """
+    Foreground mask of a BGR image, assuming a roughly centred subject.
+
+    GrabCut runs on a copy downsized to the 'grabcut' working resolution with
+    an adaptive iteration count; its boundary is then refined at full
+    resolution (see GRABCUT).
+
+    Returns:
+        tuple: (0/255 uint8 mask at the image's size, dict with the
+            iterations run and refined tiles)
+    """
+    # Nearest-neighbour sampling keeps the colour statistics of the full
+    # image; area averaging adds blended edge colours that can pull whole
+    # body parts into the background model
+    working, transform = prepare_input(image, 'grabcut', interpolation=cv2.INTER_NEAREST)
+    h, w = working.shape[:2]
+    rect = (int(w * 0.1), int(h * 0.1), int(w * 0.8), int(h * 0.8))
+
+    labels, bgd_model, fgd_model, iterations = coarse_grabcut(
+        working, rect, GRABCUT['max_iterations'], GRABCUT['tolerance'], GRABCUT['min_iterations']
+    )
+    mask = np.where(_foreground(labels), 255, 0).astype(np.uint8)
+
+    tiles = 0
+    if not transform.is_identity:
+        if GRABCUT['refine_band']:
+            mask, tiles = refine_boundary(image, mask, transform, bgd_model, fgd_model, GRABCUT['refine_band'])
+        else:
+            mask = transform.to_original_mask(mask)
+    logger.debug(f"GrabCut converged after {iterations} iterations, refined {tiles} boundary tiles")
+    return mask, {'iterations': iterations, 'refined_tiles': tiles}
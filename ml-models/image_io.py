@@ -0,0 +1,84 @@
+"""Image loading helpers shared by the ML pipelines"""
+import os
+from pathlib import Path
+import cv2
+import numpy as np
+
+def is_image_path(source):
+    """Check whether an image source refers to a file on disk"""
+    return isinstance(source, (str, os.PathLike))
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """
+    Decode an encoded image (PNG, JPEG, WebP, ...) held in memory.
+    The buffer is wrapped with np.frombuffer, so no copy is made before decoding.
+
+    Args:
+        data: bytes, bytearray, memoryview or any object exposing the buffer protocol
+        flags: OpenCV imread flags
+
+    Returns:
+        np.ndarray: Decoded image, or None if the data is not a valid image
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, flags)
+
+def load_image(source, flags=cv2.IMREAD_COLOR):
+    """
+    Load an image from any of the sources accepted by the ML entry points.
+
+    Args:
+        source: Path to an image file, encoded image bytes/buffer,
+            a file-like object, or an already decoded BGR ndarray
+        flags: OpenCV imread flags used when decoding
+
+    Returns:
+        np.ndarray: Decoded image, or None if it could not be read
+    """
+    if source is None:
+        return None
+
+    if isinstance(source, np.ndarray):
+        # Already decoded
+        return source
+
+    if is_image_path(source):
+        if not str(source):
+            return None
+        return cv2.imread(str(source), flags)
+
+    if hasattr(source, 'getbuffer'):
+        # BytesIO: decode from its internal buffer without copying
+        return decode_image(source.getbuffer(), flags)
+
+    if hasattr(source, 'read'):
+        return decode_image(source.read(), flags)
+
+    return decode_image(source, flags)
+
+def resolve_output_path(source, output_path, suffix):
+    """
+    Work out where a derived image should be written.
+
+    Path inputs keep the legacy behaviour of writing next to the input file.
+    In-memory inputs have no location on disk, so the caller must say where
+    the artifact should persist.
+
+    Args:
+        source: The image source passed to the ML entry point
+        output_path: Explicit output path (may be None)
+        suffix: Callable taking the input Path and returning the output file name
+
+    Returns:
+        Path: Output path
+    """
+    if output_path is not None:
+        return Path(output_path)
+
+    if is_image_path(source) and str(source):
+        input_path = Path(source)
+        return input_path.parent / suffix(input_path)
+
+    raise ValueError("output_path is required when the image is not a file path")
@@ -0,0 +1,97 @@
+"""Array-backed pose keypoints"""
+import numpy as np
+
+# MediaPipe Pose landmarks per pose
+NUM_LANDMARKS = 33
+
+# Keypoint fields stored per landmark, in array column order
+KEYPOINT_FIELDS = ('x', 'y', 'z', 'visibility')
+
+def keypoint_array(keypoints, dtype=np.float32):
+    """
+    (33, 4) array of x, y, z, visibility by landmark id; rows of landmarks
+    that are not present are NaN.
+
+    Args:
+        keypoints: Keypoints, a (33, 4) array or detect_body_pose landmark
+            dicts (ids outside 0-32 are ignored)
+        dtype: Array dtype (float64 keeps JSON values exact)
+    """
+    if isinstance(keypoints, Keypoints):
+        return keypoints.array.astype(dtype)
+    if isinstance(keypoints, np.ndarray):
+        array = np.asarray(keypoints, dtype=dtype)
+        if array.shape != (NUM_LANDMARKS, len(KEYPOINT_FIELDS)):
+            raise ValueError(f"Keypoint array must be {NUM_LANDMARKS}x{len(KEYPOINT_FIELDS)}: {array.shape}")
+        return array
+    array = np.full((NUM_LANDMARKS, len(KEYPOINT_FIELDS)), np.nan, dtype=dtype)
+    for kp in keypoints or ():
+        if 0 <= kp['id'] < NUM_LANDMARKS:
+            array[kp['id']] = (kp['x'], kp['y'], kp.get('z', 0.0), kp.get('visibility', 1.0))
+    return array
+
+def stack_keypoints(poses):
+    """
+    (N, 33, 4) float32 batch of poses for batch_body_measurements.
+
+    Args:
+        poses: Keypoints, (33, 4) arrays or landmark dict lists; None (no
+            person found) gives an all-NaN pose
+    """
+    batch = np.full((len(poses), NUM_LANDMARKS, len(KEYPOINT_FIELDS)), np.nan, dtype=np.float32)
+    for i, pose in enumerate(poses):
+        if pose is not None:
+            batch[i] = keypoint_array(pose)
+    return batch
+
+class Keypoints:
+    """
+    The landmarks of one pose as a float32 (33, 4) array of x, y, z,
+    visibility (NaN rows for landmarks that were not detected).
+
+    Landmark dicts are only built by to_dicts(), for JSON responses and
+    callers that index keypoints by name.
+
+    Example:
+        keypoints = Keypoints.from_landmarks(results.pose_landmarks.landmark)
+        shoulders = keypoints.array[[11, 12], :2]
+    """
+
+    __slots__ = ('array',)
+
+    def __init__(self, array):
+        self.array = keypoint_array(array)
+
+    @classmethod
+    def from_dicts(cls, keypoints):
+        """Keypoints from detect_body_pose landmark dicts"""
+        return cls(keypoint_array(keypoints))
+
+    @classmethod
+    def from_landmarks(cls, landmarks):
+        """Keypoints from a MediaPipe NormalizedLandmarkList's landmarks"""
+        array = np.full((NUM_LANDMARKS, len(KEYPOINT_FIELDS)), np.nan, dtype=np.float32)
+        values = [(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks][:NUM_LANDMARKS]
+        if values:
+            array[:len(values)] = values
+        return cls(array)
+
+    @property
+    def present(self):
+        """(33,) bool array of the landmarks that were detected"""
+        return ~np.isnan(self.array[:, 0])
+
+    def to_dicts(self):
+        """detect_body_pose landmark dicts of the present landmarks, by id"""
+        ids = np.flatnonzero(self.present)
+        return [
+            {'id': int(idx), **dict(zip(KEYPOINT_FIELDS, row))}
+            for idx, row in zip(ids.tolist(), self.array[ids].tolist())
+        ]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.present))
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
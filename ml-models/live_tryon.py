@@ -0,0 +1,317 @@
+"""Live virtual try-on over a camera frame stream"""
+import logging
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+from .ar_tryon import apply_virtual_tryon_opencv
+from .body_detection import MEDIAPIPE_AVAILABLE, detect_body_pose_fallback
+from .image_io import load_image
+from .preprocessing import prepare_input
+
+logger = logging.getLogger(__name__)
+
+if MEDIAPIPE_AVAILABLE:
+    import mediapipe as mp
+
+# Pose detection is run on every pose_stride-th frame at most this many
+# frames apart; in between the tracked, smoothed keypoints are reused
+MAX_POSE_STRIDE = 3
+
+# Number of recent frames kept for latency and FPS figures
+METRICS_WINDOW = 120
+
+class OneEuroFilter:
+    """
+    Speed-adaptive low-pass filter for keypoint jitter (Casiez et al., 2012).
+
+    Slow movements are smoothed heavily to remove jitter; fast movements
+    raise the cutoff so the overlay does not lag behind the body.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, derivative_cutoff=1.0):
+        """
+        Args:
+            min_cutoff: Cutoff frequency (Hz) when still; lower is smoother
+            beta: How quickly the cutoff rises with speed; higher lags less
+            derivative_cutoff: Cutoff used when estimating speed
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.reset()
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def reset(self):
+        self._value = None
+        self._derivative = None
+        self._timestamp = None
+
+    def __call__(self, values, timestamp):
+        """Filter an array of values observed at timestamp (seconds)"""
+        values = np.asarray(values, dtype=np.float64)
+        if self._value is None or values.shape != self._value.shape:
+            self._value = values
+            self._derivative = np.zeros_like(values)
+            self._timestamp = timestamp
+            return values
+
+        dt = max(timestamp - self._timestamp, 1e-3)
+        self._timestamp = timestamp
+
+        derivative = (values - self._value) / dt
+        a_d = self._alpha(self.derivative_cutoff, dt)
+        self._derivative = a_d * derivative + (1 - a_d) * self._derivative
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self._derivative)
+        a = self._alpha(cutoff, dt)
+        self._value = a * values + (1 - a) * self._value
+        return self._value
+
+class PoseTracker:
+    """
+    MediaPipe Pose in tracking mode for one video stream.
+
+    Unlike detect_body_pose, the Pose instance persists between frames, so
+    after the first detection MediaPipe only tracks the person's region.
+    Keypoints are smoothed with a One Euro filter.
+    """
+
+    def __init__(self, model_complexity=1, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5, smoothing=None):
+        self.filter = OneEuroFilter(**(smoothing or {}))
+        self._pose = None
+        if MEDIAPIPE_AVAILABLE:
+            self._pose = mp.solutions.pose.Pose(
+                static_image_mode=False,
+                model_complexity=model_complexity,
+                smooth_landmarks=True,
+                min_detection_confidence=min_detection_confidence,
+                min_tracking_confidence=min_tracking_confidence
+            )
+
+    def _detect(self, frame):
+        if self._pose is None:
+            pose = detect_body_pose_fallback(frame)
+            return pose['keypoints'] if pose else None
+
+        working, _ = prepare_input(frame, 'pose')
+        results = self._pose.process(cv2.cvtColor(working, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None
+        return [
+            {'id': idx, 'x': lm.x, 'y': lm.y, 'z': lm.z, 'visibility': lm.visibility}
+            for idx, lm in enumerate(results.pose_landmarks.landmark)
+        ]
+
+    def process(self, frame, timestamp):
+        """
+        Track the pose in the next frame.
+
+        Returns:
+            list: Smoothed landmark dicts, or None if nobody is in view
+        """
+        keypoints = self._detect(frame)
+        if keypoints is None:
+            # Tracking lost; start smoothing afresh when the person returns
+            self.filter.reset()
+            return None
+
+        smoothed = self.filter([(kp['x'], kp['y']) for kp in keypoints], timestamp)
+        return [
+            {**kp, 'x': float(x), 'y': float(y)}
+            for kp, (x, y) in zip(keypoints, smoothed)
+        ]
+
+    def close(self):
+        if self._pose is not None:
+            self._pose.close()
+            self._pose = None
+
+class FrameSlot:
+    """
+    Single-frame mailbox between a network reader and the renderer.
+
+    A new frame replaces one that has not been picked up yet, so a slow
+    renderer always works on the latest frame and stale ones are dropped.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, frame, received_at):
+        """Store a frame; returns True if an unprocessed frame was dropped"""
+        with self._condition:
+            dropped = self._frame is not None
+            self._frame = (frame, received_at)
+            self._condition.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Wait for the next frame; returns (frame, received_at) or None on timeout/close"""
+        with self._condition:
+            if self._frame is None and not self._closed:
+                self._condition.wait(timeout)
+            item, self._frame = self._frame, None
+            return item
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+class LiveTryOnSession:
+    """
+    Render a garment onto a live frame stream at a target frame rate.
+
+    Frames are submitted from the network thread and rendered by the caller
+    of next_result(). Frames that arrive while the renderer is busy are
+    dropped, frames faster than target_fps are skipped, and under load pose
+    detection runs only on every few frames. Garment warps come from the
+    shared TPS grid cache, so a still user costs no new spline solves.
+
+    Example:
+        session = LiveTryOnSession(asset, target_fps=15)
+        session.submit(jpeg_bytes)          # reader thread
+        image = session.next_result()      # render thread
+    """
+
+    def __init__(self, garment, target_fps=15, tracker=None):
+        """
+        Args:
+            garment: Prepared GarmentAsset
+            target_fps: Highest rate at which results are rendered
+            tracker: Pose tracker (a PoseTracker by default)
+        """
+        self.garment = garment
+        self.target_fps = max(1.0, float(target_fps))
+        self.tracker = tracker or PoseTracker()
+        self.pose_stride = 1
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._slot = FrameSlot()
+        self._keypoints = None
+        self._since_pose = 0
+        self._last_rendered = None
+        self._latencies = deque(maxlen=METRICS_WINDOW)
+        self._render_times = deque(maxlen=METRICS_WINDOW)
+        self._completed = deque(maxlen=METRICS_WINDOW)
+        self._lock = threading.Lock()
+
+    @property
+    def frame_budget(self):
+        return 1.0 / self.target_fps
+
+    def submit(self, frame, received_at=None):
+        """Queue an encoded or decoded frame; decoding is deferred to the renderer"""
+        received_at = time.perf_counter() if received_at is None else received_at
+        dropped = self._slot.put(frame, received_at)
+        with self._lock:
+            self.received += 1
+            if dropped:
+                self.dropped += 1
+
+    def close(self):
+        """Stop accepting frames and wake up the renderer"""
+        self._slot.close()
+
+    @property
+    def closed(self):
+        return self._slot.closed
+
+    def next_result(self, timeout=1.0):
+        """
+        Render the latest frame.
+
+        Returns:
+            np.ndarray: Composited BGR frame, or None if no frame was ready
+                (timeout, closed stream, rate-skipped or undecodable frame)
+        """
+        item = self._slot.get(timeout)
+        if item is None:
+            return None
+        frame, received_at = item
+
+        # Hold the target rate: frames arriving faster are skipped undecoded
+        now = time.perf_counter()
+        if self._last_rendered is not None and now - self._last_rendered < self.frame_budget * 0.9:
+            with self._lock:
+                self.skipped += 1
+            return None
+        self._last_rendered = now
+
+        image = load_image(frame)
+        if image is None:
+            with self._lock:
+                self.skipped += 1
+            return None
+        image, _ = prepare_input(image, 'live')
+
+        started = time.perf_counter()
+        self._since_pose += 1
+        if self._keypoints is None or self._since_pose >= self.pose_stride:
+            self._keypoints = self.tracker.process(image, started)
+            self._since_pose = 0
+
+        if self._keypoints is None:
+            result = image
+        else:
+            result = apply_virtual_tryon_opencv(image, self.garment, self._keypoints, return_image=True,
+                                                full_resolution=True)
+            if result is None:
+                result = image
+        finished = time.perf_counter()
+
+        self._adapt(finished - started)
+        with self._lock:
+            self.processed += 1
+            self._latencies.append(finished - received_at)
+            self._render_times.append(finished - started)
+            self._completed.append(finished)
+        return result
+
+    def _adapt(self, render_time):
+        """Detect the pose less often while rendering overruns the frame budget"""
+        if render_time > self.frame_budget and self.pose_stride < MAX_POSE_STRIDE:
+            self.pose_stride += 1
+        elif render_time < 0.5 * self.frame_budget and self.pose_stride > 1:
+            self.pose_stride -= 1
+
+    def metrics(self):
+        """Frame counters, achieved FPS and per-frame latency percentiles"""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+            render_times = np.array(self._render_times) * 1000.0
+            completed = list(self._completed)
+            fps = 0.0
+            if len(completed) > 1 and completed[-1] > completed[0]:
+                fps = (len(completed) - 1) / (completed[-1] - completed[0])
+            return {
+                'frames_received': self.received,
+                'frames_processed': self.processed,
+                'frames_dropped': self.dropped,
+                'frames_skipped': self.skipped,
+                'target_fps': self.target_fps,
+                'fps': round(fps, 2),
+                'pose_stride': self.pose_stride,
+                'latency_ms': {
+                    'last': round(float(latencies[-1]), 2) if latencies.size else None,
+                    'p50': round(float(np.percentile(latencies, 50)), 2) if latencies.size else None,
+                    'p95': round(float(np.percentile(latencies, 95)), 2) if latencies.size else None,
+                },
+                'render_ms_p50': round(float(np.percentile(render_times, 50)), 2) if render_times.size else None
+            }
@@ -0,0 +1,139 @@
+"""Compact binary mask encodings for API responses and storage"""
+import base64
+import cv2
+import numpy as np
+
+# 'rle': COCO run-length encoding with compressed string counts (what
+# pycocotools' mask.encode produces), 'png': 1-bit PNG as a base64 data URL
+MASK_ENCODINGS = ('rle', 'png')
+
+def rle_counts(mask):
+    """
+    Run lengths of a mask in column-major order, starting with a (possibly
+    empty) run of background, as in COCO RLE.
+
+    Args:
+        mask: 2-D array; non-zero pixels are foreground
+    """
+    # cv2.transpose is far faster than a column-major ravel of a large mask
+    pixels = cv2.transpose(np.ascontiguousarray(np.asarray(mask) != 0, dtype=np.uint8)).ravel()
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    boundaries = np.concatenate(([0], changes, [pixels.size]))
+    counts = np.diff(boundaries)
+    if pixels.size and pixels[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.astype(np.int64)
+
+def mask_from_counts(counts, size):
+    """0/255 uint8 mask of (height, width) size from column-major run lengths"""
+    h, w = size
+    counts = np.asarray(counts, dtype=np.int64)
+    if counts.sum() != h * w or (counts < 0).any():
+        raise ValueError("RLE counts do not match the mask size")
+    values = np.resize(np.uint8([0, 255]), counts.size)
+    return cv2.transpose(np.repeat(values, counts).reshape(w, h))
+
+def counts_to_string(counts):
+    """
+    COCO compressed counts: each count after the second is stored as the
+    difference from the count two before it, in 5-bit signed chunks (with a
+    continuation bit) offset into printable ASCII.
+    """
+    values = np.asarray(counts, dtype=np.int64).copy()
+    if values.size > 3:
+        values[3:] -= np.asarray(counts, dtype=np.int64)[1:-2]
+
+    # Chunks needed per value: the smallest k with -2^(5k-1) <= value < 2^(5k-1)
+    chunks = np.ones(values.size, dtype=np.int64)
+    limit = np.int64(16)
+    while True:
+        short = (values >= limit) | (values < -limit)
+        if not short.any():
+            break
+        chunks += short
+        limit <<= 5
+
+    width = int(chunks.max()) if values.size else 1
+    shifts = np.arange(width, dtype=np.int64) * 5
+    digits = (values[:, None] >> shifts) & 0x1f
+    digits |= np.where(shifts[None, :] < (chunks[:, None] - 1) * 5, 0x20, 0)
+    used = shifts[None, :] < chunks[:, None] * 5
+    return (digits[used] + 48).astype(np.uint8).tobytes().decode('ascii')
+
+def counts_from_string(text):
+    """Run lengths from COCO compressed counts (inverse of counts_to_string)"""
+    digits = np.frombuffer(text.encode('ascii'), dtype=np.uint8).astype(np.int64) - 48
+    if digits.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    if (digits < 0).any() or (digits > 63).any() or digits[-1] & 0x20:
+        raise ValueError("Invalid RLE counts string")
+
+    # Split into values at chunks without the continuation bit
+    ends = np.flatnonzero((digits & 0x20) == 0)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(digits.size) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((digits & 0x1f) << (5 * position), starts)
+    negative = (digits[ends] & 0x10) != 0
+    values[negative] -= np.int64(1) << (5 * (position[ends][negative] + 1))
+
+    # Undo the delta coding: count[i] += count[i - 2] for i > 2
+    counts = values.copy()
+    if counts.size > 3:
+        counts[3::2] = np.cumsum(values[3::2]) + values[1]
+        counts[4::2] = np.cumsum(values[4::2]) + values[2]
+    return counts
+
+def encode_mask(mask, encoding='rle'):
+    """
+    Encode a binary mask for JSON.
+
+    Args:
+        mask: 2-D array; non-zero pixels are foreground
+        encoding: 'rle' or 'png'
+
+    Returns:
+        dict: {'encoding', 'size': [height, width]} plus 'counts' (COCO RLE
+            string) or 'data' (PNG data URL)
+    """
+    mask = np.asarray(mask)
+    if mask.ndim != 2:
+        raise ValueError("Mask must be a 2-D array")
+    size = [int(mask.shape[0]), int(mask.shape[1])]
+    if encoding == 'rle':
+        return {'encoding': 'rle', 'size': size, 'counts': counts_to_string(rle_counts(mask))}
+    if encoding == 'png':
+        binary = np.where(mask != 0, 255, 0).astype(np.uint8)
+        ok, data = cv2.imencode('.png', binary, [cv2.IMWRITE_PNG_BILEVEL, 1, cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError("Could not encode mask as PNG")
+        return {'encoding': 'png', 'size': size,
+                'data': f"data:image/png;base64,{base64.b64encode(data.tobytes()).decode('ascii')}"}
+    raise ValueError(f"Unknown mask encoding: {encoding}")
+
+def decode_mask(encoded):
+    """
+    Decode an encode_mask result (or a plain COCO RLE dict) to a 0/255 uint8 mask.
+
+    Raises:
+        ValueError: The encoding is unknown or the data is invalid
+    """
+    try:
+        encoding = encoded.get('encoding', 'rle')
+        h, w = (int(v) for v in encoded['size'])
+        if encoding == 'rle':
+            counts = encoded['counts']
+            if not isinstance(counts, str):
+                return mask_from_counts(counts, (h, w))
+            return mask_from_counts(counts_from_string(counts), (h, w))
+        if encoding == 'png':
+            data = encoded['data'].split(',', 1)[-1]
+            mask = cv2.imdecode(np.frombuffer(base64.b64decode(data, validate=True), np.uint8),
+                                cv2.IMREAD_UNCHANGED)
+            if mask is not None and mask.ndim == 3:
+                mask = cv2.cvtColor(mask[:, :, :3], cv2.COLOR_BGR2GRAY)
+            if mask is None or mask.shape != (h, w):
+                raise ValueError("PNG mask does not match its size")
+            return cv2.threshold(mask.astype(np.uint8), 127, 255, cv2.THRESH_BINARY)[1]
+    except (AttributeError, KeyError, TypeError, UnicodeError, base64.binascii.Error) as e:
+        raise ValueError(f"Invalid encoded mask: {e}")
+    raise ValueError(f"Unknown mask encoding: {encoding}")
@@ -0,0 +1,120 @@
+"""Person-side analysis computed once and reused across garment try-ons"""
+import logging
+import cv2
+import numpy as np
+
+from .ar_tryon import apply_virtual_tryon
+from .body_detection import analyze_pose
+from .image_io import load_image
+from .mask_codec import decode_mask, encode_mask
+from .preprocessing import prepare_input
+
+logger = logging.getLogger(__name__)
+
+class PersonAnalysis:
+    """
+    Everything try-on needs from a person photo: the image downsized to the
+    'tryon' working resolution, pose landmarks, segmentation mask and body
+    measurements.
+
+    Users try many garments against one photo; with the analysis kept, each
+    further try-on only warps and blends the garment.
+
+    Example:
+        person = PersonAnalysis.analyze(photo_bytes)
+        result = person.tryon(asset, return_image=True)
+    """
+
+    def __init__(self, image, keypoints, mask=None, measurements=None, source=None,
+                 original_size=None, method=None):
+        """
+        Args:
+            image: BGR person image at working resolution
+            keypoints: Normalized detect_body_pose landmarks, or None
+            mask: uint8 person mask at the image size, or None
+            measurements: extract_body_measurements result
+            source: Encoded bytes, path or array of the original photo, kept
+                for full-resolution renders
+            original_size: (width, height) of the original photo
+            method: Pose detection method
+        """
+        self.image = image
+        self.keypoints = keypoints
+        # Kept run-length encoded; a person mask is a few KB instead of a full frame
+        self._mask = encode_mask(mask) if mask is not None else None
+        self.measurements = measurements or {}
+        self.source = source
+        self.original_size = tuple(original_size or (image.shape[1], image.shape[0]))
+        self.method = method
+
+    @classmethod
+    def analyze(cls, person_image):
+        """
+        Analyse a person photo.
+
+        Args:
+            person_image: Path, encoded image bytes or BGR ndarray
+
+        Raises:
+            ValueError: The image cannot be decoded
+        """
+        original = load_image(person_image)
+        if original is None:
+            raise ValueError("Could not read person image")
+
+        image, transform = prepare_input(original, 'tryon')
+        # A photo already seen by detect-pose or analyze needs no inference
+        pose, measurements = analyze_pose(original)
+        keypoints = pose['keypoints'] if pose else None
+
+        mask = pose.get('segmentation_mask') if pose else None
+        if mask is not None and mask.shape[:2] != image.shape[:2]:
+            mask = cv2.resize(mask, transform.working_size, interpolation=cv2.INTER_NEAREST)
+
+        # Encoded uploads are kept as they came, far smaller than decoded pixels
+        source = person_image if isinstance(person_image, (bytes, bytearray, str)) else original
+        return cls(np.ascontiguousarray(image), keypoints, mask, measurements or {}, source,
+                   transform.original_size, pose.get('method') if pose else None)
+
+    @property
+    def mask(self):
+        """uint8 person mask at the working image size, or None"""
+        return decode_mask(self._mask) if self._mask is not None else None
+
+    def original(self):
+        """The full-resolution photo, decoded on demand"""
+        return load_image(self.source) if self.source is not None else self.image
+
+    def person_image(self, full_resolution=False):
+        return self.original() if full_resolution else self.image
+
+    def tryon(self, garment_image, garment_key=None, full_resolution=False, output_path=None,
+              return_image=False):
+        """
+        Try a garment on using the stored analysis; only the garment is warped and blended.
+
+        Arguments as for ar_tryon.apply_virtual_tryon.
+        """
+        return apply_virtual_tryon(self.person_image(full_resolution), garment_image, self.keypoints,
+                                   output_path=output_path, full_resolution=full_resolution,
+                                   return_image=return_image, garment_key=garment_key)
+
+    @property
+    def nbytes(self):
+        size = self.image.nbytes + (len(self._mask['counts']) if self._mask is not None else 0)
+        if isinstance(self.source, (bytes, bytearray)):
+            size += len(self.source)
+        elif isinstance(self.source, np.ndarray) and self.source is not self.image:
+            size += self.source.nbytes
+        return size
+
+    def to_dict(self):
+        return {
+            'image_size': list(self.original_size),
+            'working_size': [self.image.shape[1], self.image.shape[0]],
+            'pose_detected': self.keypoints is not None,
+            'pose_method': self.method,
+            'has_mask': self._mask is not None,
+            'body_shape': self.measurements.get('body_shape'),
+            'measurements': self.measurements.get('measurements', {})
+        }
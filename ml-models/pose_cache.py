@@ -0,0 +1,143 @@
+"""Pose detection results and body measurements cached by image content"""
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from .image_io import is_image_path
+from .keypoints import Keypoints
+from .mask_codec import decode_mask, encode_mask
+
+def image_content_hash(image):
+    """
+    SHA-256 of an image's content, or None if it cannot be hashed cheaply.
+
+    Encoded bytes and files hash their encoded data; decoded arrays hash
+    their pixels (with the shape), so a photo is recognised in either form
+    it keeps arriving in.
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, np.ndarray):
+        digest.update(repr((image.shape, image.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(image).data)
+    elif isinstance(image, (bytes, bytearray, memoryview)):
+        digest.update(image)
+    elif is_image_path(image):
+        try:
+            with open(image, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            return None
+    elif hasattr(image, 'getbuffer'):
+        digest.update(image.getbuffer())
+    else:
+        return None
+    return digest.hexdigest()
+
+class PoseCacheEntry:
+    """
+    One detect_body_pose result with its extract_body_measurements output.
+
+    Keypoints are kept as a Keypoints array and the segmentation mask
+    run-length encoded; pose() rebuilds a fresh result dict, so callers may
+    modify it.
+    """
+
+    __slots__ = ('keypoints', 'fields', 'mask', 'measurements')
+
+    def __init__(self, pose, measurements=None):
+        """
+        Args:
+            pose: detect_body_pose result ('keypoints' as Keypoints or
+                landmark dicts), or None when no person was found
+            measurements: extract_body_measurements result for its keypoints
+        """
+        self.keypoints = self.fields = self.mask = None
+        self.measurements = measurements
+        if pose is None:
+            return
+        self.keypoints = Keypoints(pose.get('keypoints') or [])
+        mask = pose.get('segmentation_mask')
+        self.mask = encode_mask(mask) if mask is not None else None
+        self.fields = {k: v for k, v in pose.items() if k not in ('keypoints', 'segmentation_mask')}
+
+    @property
+    def found(self):
+        return self.fields is not None
+
+    def pose(self):
+        """A detect_body_pose result dict, or None"""
+        if not self.found:
+            return None
+        return {
+            **copy.deepcopy(self.fields),
+            'keypoints': self.keypoints.to_dicts(),
+            'segmentation_mask': decode_mask(self.mask) if self.mask is not None else None,
+        }
+
+    @property
+    def nbytes(self):
+        if not self.found:
+            return 0
+        return self.keypoints.nbytes + (len(self.mask['counts']) if self.mask else 0)
+
+class PoseCache:
+    """
+    Thread-safe LRU of PoseCacheEntry by (content hash, model complexity, ...) key.
+
+    Example:
+        cache = PoseCache(max_entries=256)
+        cache.put(key, PoseCacheEntry(pose, measurements))
+        entry = cache.get(key)
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resize(self, max_entries):
+        with self._lock:
+            self.max_entries = int(max_entries)
+            while len(self._entries) > max(self.max_entries, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes': sum(entry.nbytes for entry in self._entries.values())
+            }
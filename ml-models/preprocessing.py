@@ -0,0 +1,121 @@
+"""Resolution-capped input preprocessing shared by the ML pipelines"""
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Longest image side each model works at. Larger inputs are downsized first;
+# None disables the cap. Overridden from the backend Config at startup.
+WORKING_RESOLUTION = {
+    'pose': 1024,
+    'grabcut': 800,
+    'tryon': 1280,
+    'live': 640,
+    'preview': 384,
+}
+
+def configure_working_resolution(**max_sides):
+    """
+    Set the working resolution for one or more models.
+
+    Example:
+        configure_working_resolution(pose=960, grabcut=512)
+    """
+    for model, max_side in max_sides.items():
+        if model not in WORKING_RESOLUTION:
+            raise ValueError(f"Unknown model for working resolution: {model}")
+        WORKING_RESOLUTION[model] = int(max_side) if max_side else None
+
+class ImageTransform:
+    """Record of how a working image was derived from the original image"""
+
+    def __init__(self, original_size, working_size):
+        self.original_size = original_size  # (width, height)
+        self.working_size = working_size    # (width, height)
+        self.scale_x = working_size[0] / original_size[0]
+        self.scale_y = working_size[1] / original_size[1]
+
+    @property
+    def is_identity(self):
+        return self.original_size == self.working_size
+
+    def to_original_points(self, points):
+        """Map (N, 2) pixel coordinates from the working image to the original"""
+        points = np.asarray(points, dtype=np.float32)
+        if self.is_identity:
+            return points
+        return points / np.float32([self.scale_x, self.scale_y])
+
+    def to_working_points(self, points):
+        """Map (N, 2) pixel coordinates from the original image to the working image"""
+        points = np.asarray(points, dtype=np.float32)
+        if self.is_identity:
+            return points
+        return points * np.float32([self.scale_x, self.scale_y])
+
+    def to_original_bbox(self, bbox):
+        """Map an (x, y, w, h) box from the working image to the original"""
+        x, y, w, h = bbox
+        if self.is_identity:
+            return int(x), int(y), int(w), int(h)
+        x1, y1 = x / self.scale_x, y / self.scale_y
+        x2, y2 = (x + w) / self.scale_x, (y + h) / self.scale_y
+        ow, oh = self.original_size
+        x1, y1 = max(0, int(np.floor(x1))), max(0, int(np.floor(y1)))
+        x2, y2 = min(ow, int(np.ceil(x2))), min(oh, int(np.ceil(y2)))
+        return x1, y1, x2 - x1, y2 - y1
+
+    def to_original_mask(self, mask, binary=True):
+        """
+        Upsample a working-resolution mask to the original image size.
+        Only call this when full-resolution output is actually needed.
+
+        Args:
+            mask: uint8 mask at working resolution
+            binary: Threshold after bilinear upsampling for clean 0/255 edges
+        """
+        if self.is_identity:
+            return mask
+        upsampled = cv2.resize(mask, self.original_size, interpolation=cv2.INTER_LINEAR)
+        if binary:
+            _, upsampled = cv2.threshold(upsampled, 127, 255, cv2.THRESH_BINARY)
+        return upsampled
+
+    def to_dict(self):
+        return {
+            'original_size': list(self.original_size),
+            'working_size': list(self.working_size),
+            'scale': [self.scale_x, self.scale_y]
+        }
+
+def prepare_input(image, model=None, max_side=None, interpolation=cv2.INTER_AREA):
+    """
+    Downsize an image to a model's working resolution.
+
+    Aspect ratio is preserved, so normalized coordinates (e.g. MediaPipe
+    landmarks) are identical on the working and original images.
+
+    Args:
+        image: BGR ndarray
+        model: Key into WORKING_RESOLUTION
+        max_side: Explicit cap on the longest side (overrides model)
+        interpolation: OpenCV downsizing filter (INTER_NEAREST keeps the
+            original colours, without pixels blended across edges)
+
+    Returns:
+        tuple: (working_image, ImageTransform)
+    """
+    h, w = image.shape[:2]
+    if max_side is None and model is not None:
+        max_side = WORKING_RESOLUTION.get(model)
+
+    if not max_side or max(h, w) <= max_side:
+        return image, ImageTransform((w, h), (w, h))
+
+    scale = max_side / max(h, w)
+    working_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    working = cv2.resize(image, working_size, interpolation=interpolation)
+    logger.debug(f"Downsized {w}x{h} to {working_size[0]}x{working_size[1]} for {model}")
+
+    return working, ImageTransform((w, h), working_size)
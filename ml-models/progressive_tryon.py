@@ -0,0 +1,121 @@
+"""Progressive try-on: a fast low-resolution preview, then the full render"""
+import logging
+import threading
+import time
+
+from .ar_tryon import blend_garment, garment_roi_warp, is_landmark_list
+from .garment_assets import GarmentAsset, prepare_garment
+from .image_io import load_image
+from .preprocessing import prepare_input
+from .tps import image_key
+
+logger = logging.getLogger(__name__)
+
+# Preview renders slower than this are logged; lower the 'preview' working
+# resolution if it happens routinely
+PREVIEW_BUDGET_MS = 150
+
+class ProgressiveTryOn:
+    """
+    One try-on rendered twice: a preview at the 'preview' working resolution
+    that can be shown at once, and the full render afterwards.
+
+    The garment's warp is solved for the preview only; the full render
+    rescales the same warp to the larger image, so it costs a remap and a
+    blend. Times to the first and to the full image are recorded.
+
+    Example:
+        render = ProgressiveTryOn(person, asset, keypoints)
+        preview = render.preview()     # show immediately
+        image = render.render()        # full resolution, same fit
+        render.timings                 # {'preview_ms': ..., 'render_ms': ..., ...}
+    """
+
+    def __init__(self, person_image, garment_image, keypoints=None, garment_key=None,
+                 full_resolution=False, alpha=0.75):
+        """
+        Args:
+            person_image: Path, encoded bytes or BGR ndarray
+            garment_image: GarmentAsset, or a path/bytes/ndarray prepared on the fly
+            keypoints: The 'keypoints' list from detect_body_pose; without it
+                the garment is placed in its region's default box
+            garment_key: Stable garment ID for the warp cache
+            full_resolution: Render the final image at the person image's
+                original size instead of the 'tryon' working resolution
+        """
+        self.created = time.perf_counter()
+        self.person = load_image(person_image)
+        if self.person is None:
+            raise ValueError("Could not read person image")
+
+        if not isinstance(garment_image, GarmentAsset):
+            garment = load_image(garment_image)
+            if garment is None:
+                raise ValueError("Could not read garment image")
+            garment_image = prepare_garment(garment, garment_key or image_key(garment))
+        self.garment = garment_image
+        self.keypoints = keypoints if is_landmark_list(keypoints) else None
+        self.full_resolution = full_resolution
+        self.alpha = alpha
+        self.warp = None
+        self.timings = {}
+        self._result = None
+        self._lock = threading.Lock()
+
+    def _composite(self, person, canvas_size=None):
+        canvas = person.copy()
+        layer, (x1, y1, x2, y2) = self.warp.render(self.garment.bgra, canvas_size)
+        blend_garment(canvas[y1:y2, x1:x2], layer, self.alpha)
+        return canvas
+
+    def preview(self):
+        """
+        Render the preview and solve the warp the full render reuses.
+
+        Returns:
+            np.ndarray: BGR preview at the 'preview' working resolution
+        """
+        started = time.perf_counter()
+        person, _ = prepare_input(self.person, 'preview')
+        self.warp = garment_roi_warp(self.garment, self.keypoints, (person.shape[1], person.shape[0]))
+        image = person.copy() if self.warp is None else self._composite(person)
+        finished = time.perf_counter()
+
+        self.timings['preview_ms'] = round((finished - started) * 1000.0, 2)
+        self.timings['time_to_first_image_ms'] = round((finished - self.created) * 1000.0, 2)
+        if self.timings['preview_ms'] > PREVIEW_BUDGET_MS:
+            logger.warning(f"Try-on preview took {self.timings['preview_ms']} ms "
+                           f"(budget {PREVIEW_BUDGET_MS} ms)")
+        return image
+
+    def render(self):
+        """
+        Render the final image with the preview's warp; computed once.
+
+        Returns:
+            np.ndarray: BGR composite at the 'tryon' working resolution, or
+                the original size with full_resolution
+        """
+        with self._lock:
+            if self._result is not None:
+                return self._result
+            if self.warp is None and 'preview_ms' not in self.timings:
+                self.preview()
+
+            started = time.perf_counter()
+            person = self.person
+            if not self.full_resolution:
+                person, _ = prepare_input(person, 'tryon')
+            size = (person.shape[1], person.shape[0])
+            self._result = person.copy() if self.warp is None else self._composite(person, size)
+            finished = time.perf_counter()
+
+            self.timings['render_ms'] = round((finished - started) * 1000.0, 2)
+            self.timings['time_to_full_image_ms'] = round((finished - self.created) * 1000.0, 2)
+            logger.info(f"Progressive try-on: preview {self.timings['preview_ms']} ms, "
+                        f"full render {self.timings['render_ms']} ms")
+            return self._result
+
+    @property
+    def nbytes(self):
+        return self.person.nbytes + (self._result.nbytes if self._result is not None else 0)
@@ -3,73 +3,47 @@ import logging
 import cv2
 import numpy as np
 
+from .image_io import load_image
+from .mask_codec import encode_mask
+from . import deeplab
+
 logger = logging.getLogger(__name__)
 
-try:
-    import torch
-    import torchvision.models.segmentation as segmentation
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
+TORCH_AVAILABLE = deeplab.TORCH_AVAILABLE
+if not TORCH_AVAILABLE:
     logger.warning("PyTorch not available, using OpenCV fallback")
 
-def segment_clothing_deeplabv3(image_path):
+def segment_clothing_deeplabv3(image):
     """Segment clothing using DeepLabV3"""
     try:
         if not TORCH_AVAILABLE:
             return None
         
-        # Load pretrained DeepLabV3 model
-        model = segmentation.deeplabv3_resnet50(pretrained=True)
-        model.eval()
-        
-        # Read and preprocess image
-        image = cv2.imread(image_path)
+        # Read image
+        image = load_image(image)
         if image is None:
             raise ValueError("Could not read image")
         
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Resize for model input
-        input_image = cv2.resize(image_rgb, (520, 520))
-        input_tensor = torch.from_numpy(input_image).float()
-        input_tensor = input_tensor.permute(2, 0, 1).unsqueeze(0) / 255.0
-        
-        # Normalize
-        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
-        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
-        input_tensor = (input_tensor - mean) / std
-        
-        # Perform segmentation
-        with torch.no_grad():
-            output = model(input_tensor)['out'][0]
-        
-        # Get segmentation mask
-        output_predictions = output.argmax(0).byte().cpu().numpy()
-        
-        # Resize mask to original size
-        mask = cv2.resize(output_predictions, (image.shape[1], image.shape[0]))
-        
-        # Person class is typically 15 in COCO dataset
-        person_mask = (mask == 15).astype(np.uint8) * 255
+        # Shared model; concurrent requests are batched into one forward pass.
+        # Only the person logit is upsampled to the image size.
+        person_mask = deeplab.person_mask(image, 'segmentation')
         
         return {
             'mask': person_mask,
             'method': 'deeplabv3',
             'confidence': 0.85,
-            'classes_detected': len(np.unique(mask))
+            'backbone': deeplab.profile_model('segmentation')[0]
         }
         
     except Exception as e:
         logger.error(f"DeepLabV3 segmentation failed: {e}")
         return None
 
-def segment_clothing_opencv(image_path):
+def segment_clothing_opencv(image):
     """Fallback segmentation using OpenCV"""
     try:
         # Read image
-        image = cv2.imread(image_path)
+        image = load_image(image)
         if image is None:
             raise ValueError("Could not read image")
         
@@ -115,13 +89,21 @@ def segment_clothing_opencv(image_path):
             'error': str(e)
         }
 
-def segment_clothing(image_path):
-    """Main entry point for clothing segmentation"""
-    # Try DeepLabV3 first
-    result = segment_clothing_deeplabv3(image_path)
+def segment_clothing(image, mask_encoding=None):
+    """
+    Main entry point for clothing segmentation
+    
+    Args:
+        image: Path to the image file, encoded image bytes or a BGR ndarray
+        mask_encoding: 'rle' or 'png' to return the mask as an encode_mask
+            dict (JSON-serializable) instead of an ndarray
+    """
+    # Decode once for both strategies
+    image = load_image(image)
     
-    if result:
-        return result
+    # Try DeepLabV3 first, falling back to OpenCV
+    result = segment_clothing_deeplabv3(image) or segment_clothing_opencv(image)
     
-    # Fallback to OpenCV
-    return segment_clothing_opencv(image_path)
+    if mask_encoding:
+        result['mask'] = encode_mask(result['mask'], mask_encoding)
+    return result
@@ -0,0 +1,137 @@
+"""Thin-plate-spline warping with cached, reduced-resolution remap grids"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _kernel(r2):
+    """TPS radial basis U(r) = r^2 log r^2, with U(0) = 0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r2 > 0, r2 * np.log(r2), 0.0)
+
+def solve_tps(src_points, dst_points, regularization=0.0):
+    """
+    Solve the thin-plate spline that maps src_points onto dst_points.
+
+    Args:
+        src_points: (N, 2) control points in the input space
+        dst_points: (N, 2) where each control point must land
+        regularization: Smoothing; 0 interpolates the points exactly
+
+    Returns:
+        tuple: (control points, (N + 3, 2) parameters) for evaluate_tps
+    """
+    src = np.asarray(src_points, dtype=np.float64)
+    dst = np.asarray(dst_points, dtype=np.float64)
+    n = len(src)
+    if n < 3:
+        raise ValueError("TPS needs at least 3 control points")
+
+    d2 = ((src[:, None, :] - src[None, :, :]) ** 2).sum(-1)
+    K = _kernel(d2) + regularization * np.eye(n)
+    P = np.hstack([np.ones((n, 1)), src])
+
+    L = np.zeros((n + 3, n + 3))
+    L[:n, :n] = K
+    L[:n, n:] = P
+    L[n:, :n] = P.T
+    rhs = np.zeros((n + 3, 2))
+    rhs[:n] = dst
+
+    # lstsq copes with (near-)collinear control points
+    params = np.linalg.lstsq(L, rhs, rcond=None)[0]
+    return src, params
+
+def evaluate_tps(solution, points):
+    """Map (M, 2) points through a solved spline"""
+    control, params = solution
+    points = np.asarray(points, dtype=np.float64)
+    n = len(control)
+    d2 = ((points[:, None, :] - control[None, :, :]) ** 2).sum(-1)
+    return _kernel(d2) @ params[:n] + params[n] + points @ params[n + 1:]
+
+def tps_grid(solution, size, grid_step=4, origin=(0, 0)):
+    """
+    Evaluate an inverse-mapping spline on a coarse grid.
+
+    Args:
+        solution: Spline from output pixels to source pixels (solve_tps)
+        size: (width, height) of the output image
+        grid_step: Output pixels per grid cell; the grid is upsampled at
+            render time, so a step of 4 stores 1/16 of the full map
+        origin: Output pixel of the grid's top-left corner, for warping
+            into a region of a larger image
+
+    Returns:
+        tuple: (map_x, map_y) float32 arrays at reduced resolution
+    """
+    w, h = size
+    gw, gh = max(2, -(-w // grid_step)), max(2, -(-h // grid_step))
+    # Sample where cv2.resize puts the centres of the coarse pixels
+    xs = (np.arange(gw) + 0.5) * w / gw - 0.5 + origin[0]
+    ys = (np.arange(gh) + 0.5) * h / gh - 0.5 + origin[1]
+    gx, gy = np.meshgrid(xs, ys)
+    mapped = evaluate_tps(solution, np.column_stack([gx.ravel(), gy.ravel()]))
+    map_x = mapped[:, 0].reshape(gh, gw).astype(np.float32)
+    map_y = mapped[:, 1].reshape(gh, gw).astype(np.float32)
+    return map_x, map_y
+
+def remap_with_grid(image, grid, size, border_value=0):
+    """Warp an image with a coarse grid from tps_grid, upsampled to the output size"""
+    map_x, map_y = grid
+    map_x = cv2.resize(map_x, size, interpolation=cv2.INTER_LINEAR)
+    map_y = cv2.resize(map_y, size, interpolation=cv2.INTER_LINEAR)
+    return cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+
+def image_key(image):
+    """Stable key for an image's content (used when the caller has no ID)"""
+    digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16)
+    digest.update(str(image.shape).encode())
+    return digest.hexdigest()
+
+def pose_key(points, quantum=4):
+    """Key for a set of control points, quantized so small pose changes reuse a grid"""
+    return tuple(np.round(np.asarray(points, dtype=np.float64) / quantum).astype(int).ravel())
+
+class WarpCache:
+    """LRU cache of coarse warp grids keyed by (garment, pose, output size)"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, create):
+        with self._lock:
+            grid = self._entries.get(key)
+            if grid is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return grid
+        grid = create()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = grid
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return grid
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(x.nbytes + y.nbytes for x, y in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
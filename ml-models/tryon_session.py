@@ -0,0 +1,206 @@
+"""Layered try-on sessions for interactive garment adjustments"""
+import logging
+import threading
+import time
+import cv2
+import numpy as np
+
+from .ar_tryon import apply_tps_warping, blend_garment, garment_roi_warp, is_landmark_list, BLEND_KERNEL
+from .garment_assets import GarmentAsset, prepare_garment
+from .image_io import load_image
+from .preprocessing import prepare_input
+from .tps import image_key
+
+logger = logging.getLogger(__name__)
+
+def adjustment_matrix(center, position=(0, 0), scale=1.0, rotation=0.0):
+    """
+    One affine transform for a garment adjustment.
+
+    Scales and rotates about the garment centre, then translates.
+
+    Args:
+        center: (x, y) pivot in pixels
+        position: (dx, dy) offset in pixels
+        scale: Size factor
+        rotation: Degrees, counter-clockwise
+
+    Returns:
+        np.ndarray: 2x3 float64 matrix
+    """
+    matrix = cv2.getRotationMatrix2D((float(center[0]), float(center[1])), float(rotation), float(scale))
+    matrix[:, 2] += (float(position[0]), float(position[1]))
+    return matrix
+
+def transformed_bbox(matrix, bbox):
+    """Bounding box (x1, y1, x2, y2) of a (x, y, w, h) box after an affine transform"""
+    x, y, w, h = bbox
+    corners = np.float64([[x, y, 1], [x + w, y, 1], [x, y + h, 1], [x + w, y + h, 1]])
+    points = corners @ matrix.T
+    x1, y1 = np.floor(points.min(0)).astype(int).tolist()
+    x2, y2 = np.ceil(points.max(0)).astype(int).tolist()
+    return x1, y1, x2, y2
+
+class TryOnSession:
+    """
+    A try-on kept as separate person and garment layers.
+
+    The garment is warped to the body once. Adjustments (position, scale,
+    rotation) are then a single affine warp of the garment's bounding box,
+    and only the affected region of the composite is restored from the
+    person layer and re-blended, so an update costs a few milliseconds
+    instead of full-frame warps and a disk round trip.
+
+    Example:
+        session = TryOnSession.create(person, asset, keypoints)
+        image, region = session.adjust(position=(10, -5), scale=1.1, rotation=3)
+    """
+
+    def __init__(self, person, garment_layer, alpha=0.75, offset=(0, 0)):
+        """
+        Args:
+            person: BGR person image (the bottom layer, never modified)
+            garment_layer: BGRA garment warped onto the person, either the
+                person's size or a box of it placed at offset
+            alpha: Garment opacity
+            offset: (x, y) of the layer's top-left corner on the person
+        """
+        self.person = person
+        self.alpha = alpha
+        self.composite = person.copy()
+        self.adjustment = {'position': (0, 0), 'scale': 1.0, 'rotation': 0.0}
+        self.last_update_ms = None
+
+        # Only the garment's bounding box is kept; everything else is empty
+        mask = garment_layer[:, :, 3]
+        if cv2.countNonZero(mask):
+            x, y, w, h = cv2.boundingRect(mask)
+        else:
+            x, y, w, h = 0, 0, 0, 0
+        self.garment = garment_layer[y:y + h, x:x + w].copy()
+        x, y = x + int(offset[0]), y + int(offset[1])
+        self.garment_bbox = (x, y, w, h)
+        self.center = (x + w / 2.0, y + h / 2.0)
+        self._region = None
+        self._lock = threading.Lock()
+        self._render(adjustment_matrix(self.center))
+
+    @classmethod
+    def create(cls, person_image, garment_image, keypoints=None, garment_key=None,
+               full_resolution=False, alpha=0.75):
+        """
+        Warp a garment onto a person and keep the layers.
+
+        Args:
+            person_image: Path, encoded bytes or BGR ndarray
+            garment_image: GarmentAsset, or a path/bytes/ndarray prepared on the fly
+            keypoints: detect_body_pose landmarks, four corner points or None
+                (region box placement)
+            garment_key: Stable garment ID for the warp cache
+            full_resolution: Keep the person at full size instead of the
+                'tryon' working resolution
+        """
+        person = load_image(person_image)
+        if person is None:
+            raise ValueError("Could not read person image")
+        if not full_resolution:
+            person, transform = prepare_input(person, 'tryon')
+            if keypoints and not isinstance(keypoints[0], dict):
+                keypoints = transform.to_working_points(keypoints).tolist()
+
+        if not isinstance(garment_image, GarmentAsset):
+            garment = load_image(garment_image)
+            if garment is None:
+                raise ValueError("Could not read garment image")
+            garment_image = prepare_garment(garment, garment_key or image_key(garment))
+
+        if keypoints and not is_landmark_list(keypoints):
+            # Corner points: the perspective warp's quad bounds the garment
+            layer = apply_tps_warping(person, garment_image, keypoints, garment_key)
+            if layer is None:
+                raise ValueError("Could not warp garment")
+            return cls(person, layer, alpha)
+
+        # Landmarks or none: warp only the garment's footprint box
+        warp = garment_roi_warp(garment_image, keypoints, (person.shape[1], person.shape[0]))
+        if warp is None:
+            raise ValueError("Could not warp garment")
+        layer, (x1, y1, _, _) = warp.render(garment_image.bgra)
+        return cls(person, layer, alpha, offset=(x1, y1))
+
+    @property
+    def size(self):
+        return self.person.shape[1], self.person.shape[0]
+
+    def _render(self, matrix):
+        """Restore the previous garment region and blend the transformed garment"""
+        height, width = self.person.shape[:2]
+
+        if self._region is not None:
+            x1, y1, x2, y2 = self._region
+            self.composite[y1:y2, x1:x2] = self.person[y1:y2, x1:x2]
+            self._region = None
+
+        if not self.garment.size:
+            return None
+
+        # Destination box plus the feathering margin blend_garment needs
+        pad = BLEND_KERNEL
+        x1, y1, x2, y2 = transformed_bbox(matrix, self.garment_bbox)
+        x1, y1 = max(0, x1 - pad), max(0, y1 - pad)
+        x2, y2 = min(width, x2 + pad), min(height, y2 + pad)
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        # Map garment-crop pixels straight into the destination box
+        gx, gy = self.garment_bbox[:2]
+        local = matrix.copy()
+        local[:, 2] += matrix[:, :2] @ (gx, gy) - (x1, y1)
+        warped = cv2.warpAffine(self.garment, local, (x2 - x1, y2 - y1), flags=cv2.INTER_LINEAR,
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+        blend_garment(self.composite[y1:y2, x1:x2], warped, self.alpha)
+        self._region = (x1, y1, x2, y2)
+        return self._region
+
+    def adjust(self, position=None, scale=None, rotation=None):
+        """
+        Set the garment adjustment; values are absolute, relative to the fitted garment.
+
+        Omitted values keep their current setting.
+
+        Returns:
+            tuple: (copy of the composite BGR image, (x, y, w, h) of the
+                union of the previous and new garment regions, or None if
+                nothing changed)
+        """
+        with self._lock:
+            started = time.perf_counter()
+            if position is not None:
+                self.adjustment['position'] = (float(position[0]), float(position[1]))
+            if scale is not None:
+                if not 0.1 <= float(scale) <= 10:
+                    raise ValueError("scale must be between 0.1 and 10")
+                self.adjustment['scale'] = float(scale)
+            if rotation is not None:
+                self.adjustment['rotation'] = float(rotation)
+
+            previous = self._region
+            current = self._render(adjustment_matrix(self.center, **self.adjustment))
+            self.last_update_ms = (time.perf_counter() - started) * 1000.0
+            image = self.composite.copy()
+
+        regions = [r for r in (previous, current) if r is not None]
+        if not regions:
+            return image, None
+        x1, y1 = min(r[0] for r in regions), min(r[1] for r in regions)
+        x2, y2 = max(r[2] for r in regions), max(r[3] for r in regions)
+        return image, (x1, y1, x2 - x1, y2 - y1)
+
+    def reset(self):
+        """Undo all adjustments"""
+        return self.adjust(position=(0, 0), scale=1.0, rotation=0.0)
+
+    @property
+    def nbytes(self):
+        return self.person.nbytes + self.composite.nbytes + self.garment.nbytes